@@ -1,11 +1,19 @@
 import json
+import random
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, List, Optional
 import statistics
 
 from src.backend.ai.agent import CodeMentorAgent  # Baseline
 from src.backend.ai.optimized_agent import OptimizedCodeMentorAgent  # Optimized
+from src.backend.ai.gemini_backend import active_fake_backend, use_fake_backend
+from src.perf_history import PerfHistory, format_verdicts
+from src.perf_stats import compare_samples, describe, elapsed_ms, now_ns, quantile
+from src.tracing import StageStats, Trace, format_stages, trace_scope, write_chrome_trace, write_folded
 
 TEST_QUERIES = [
     "What problem should I practice next?",
@@ -26,17 +34,35 @@ def two_sum(nums, target):
     "Recommend something for arrays",
 ]
 
+
+def response_succeeded(response) -> bool:
+    """
+    Whether an agent reply is a success. ProductionAgent returns a dict with
+    a success flag; the other agents catch their errors and return them as
+    "Error..." strings.
+    """
+    if isinstance(response, dict):
+        return bool(response.get("success", False))
+    return not str(response).startswith("Error")
+
+
 class Benchmark:
     def __init__(self, name: str, agent):
         self.name = name
         self.agent = agent
         self.results = []
+        self.warmup_results = []
+        self.traces: List[Trace] = []
 
-    def run_query(self, query: str, query_id: int) -> Dict[str, Any]:
-        start_time = time.time()
+    def run_query(self, query: str, query_id: int, trace: Optional[Trace] = None) -> Dict[str, Any]:
+        start_ns = now_ns()
         try:
-            response = self.agent.send_message(query)
-            latency = time.time() - start_time
+            with trace_scope(trace):
+                response = self.agent.send_message(query)
+            latency = elapsed_ms(start_ns) / 1000
+            succeeded = response_succeeded(response)
+            if isinstance(response, dict):  # ProductionAgent returns a structured result
+                response = response.get("message", "")
             cost = 0.008  # Default
             if hasattr(self.agent, 'cost_tracker') and \
                hasattr(self.agent.cost_tracker, 'total_cost') and \
@@ -44,37 +70,57 @@ class Benchmark:
                self.agent.cost_tracker.call_count > 0:
                 cost = self.agent.cost_tracker.total_cost / self.agent.cost_tracker.call_count
 
-            return {
+            result = {
                 "query_id": query_id,
                 "query": query[:50] + "..." if len(query) > 50 else query,
-                "latency_seconds": round(latency, 2),
+                "latency_seconds": round(latency, 6),
                 "cost": round(cost, 6),
-                "success": True,
+                "success": succeeded,
                 "response_length": len(response) if isinstance(response, str) else 0
             }
+            if not succeeded:
+                result["error"] = str(response)[:200]
+            if trace is not None:
+                result["stages_ms"] = {name: round(ms, 3) for name, ms in trace.stage_totals().items()}
+            return result
         except Exception as e:
             return {
                 "query_id": query_id,
                 "query": query[:50] + "..." if len(query) > 50 else query,
-                "latency_seconds": round(time.time() - start_time, 2),
+                "latency_seconds": round(elapsed_ms(start_ns) / 1000, 6),
                 "cost": 0.0,
                 "success": False,
                 "error": str(e)
             }
 
-    def run_benchmark(self, queries: List[str], num_iterations: int = 5) -> Dict[str, Any]:
+    def run_benchmark(self, queries: List[str], num_iterations: int = 5,
+                      warmup_iterations: int = 1) -> Dict[str, Any]:
+        """
+        Run every query num_iterations times. The warm-up iterations run
+        first and are kept out of the statistics (cold connections and
+        caches would otherwise skew the first samples).
+        """
         print(f"\n{'='*60}")
         print(f"Running {self.name} Benchmark")
         print(f"{'='*60}\n")
         all_results = []
+        self.traces = []
+
+        self.warmup_results = []
+        for iteration in range(warmup_iterations):
+            print(f"Warm-up {iteration + 1}/{warmup_iterations}")
+            for idx, query in enumerate(queries):
+                self.warmup_results.append(self.run_query(query, -(iteration * len(queries) + idx + 1)))
 
         for iteration in range(num_iterations):
             print(f"Iteration {iteration + 1}/{num_iterations}")
             for idx, query in enumerate(queries):
                 query_id = iteration * len(queries) + idx + 1
-                result = self.run_query(query, query_id)
+                trace = Trace(query_id=query_id)
+                self.traces.append(trace)
+                result = self.run_query(query, query_id, trace)
                 all_results.append(result)
-                print(f"  Query {query_id}: {result['latency_seconds']:.2f}s | ${result['cost']:.6f}")
+                print(f"  Query {query_id}: {result['latency_seconds']:.3f}s | ${result['cost']:.6f}")
 
         self.results = all_results
         return self.compute_statistics()
@@ -84,9 +130,9 @@ class Benchmark:
         if not successful_results:
             return {"error": "No successful queries"}
 
-        latencies = [r['latency_seconds'] for r in successful_results]
+        latencies = self.latencies()
         costs = [r['cost'] for r in successful_results]
-        sorted_latencies = sorted(latencies)
+        latency = describe(latencies)
 
         stats = {
             "benchmark_name": self.name,
@@ -94,31 +140,60 @@ class Benchmark:
             "total_queries": len(self.results),
             "successful_queries": len(successful_results),
             "failed_queries": len(self.results) - len(successful_results),
+            "warmup_queries_excluded": len(self.warmup_results),
             "total_cost": round(sum(costs), 6),
             "average_cost": round(statistics.mean(costs), 6),
             "median_cost": round(statistics.median(costs), 6),
-            "average_latency": round(statistics.mean(latencies), 2),
-            "median_latency": round(statistics.median(latencies), 2),
-            "min_latency": round(min(latencies), 2),
-            "max_latency": round(max(latencies), 2),
-            "p95_latency": round(sorted_latencies[int(len(sorted_latencies) * 0.95) - 1], 2),
-            "p99_latency": round(sorted_latencies[int(len(sorted_latencies) * 0.99) - 1], 2),
-            "latency_std_dev": round(statistics.stdev(latencies), 2) if len(latencies) > 1 else 0,
+            "average_latency": round(latency["mean"], 4),
+            "median_latency": round(latency["median"], 4),
+            "min_latency": round(latency["min"], 4),
+            "max_latency": round(latency["max"], 4),
+            "p95_latency": round(latency["p95"], 4),
+            "p99_latency": round(latency["p99"], 4),
+            "latency_std_dev": round(latency["stdev"], 4),
+            "average_latency_ci95": _round_ci(latency["mean_ci95"]),
+            "p95_latency_ci95": _round_ci(latency["p95_ci95"]),
+            "latency_outliers": latency["outliers"],
+            "stages": self.stage_breakdown(),
         }
         return stats
 
+    def stage_breakdown(self) -> Dict[str, Dict[str, Any]]:
+        """Per-stage latency (LLM calls, tools, cache, serialization, logging) over the measured queries"""
+        stages = StageStats()
+        for trace in self.traces:
+            stages.add(trace)
+        return stages.summary()
+
+    def save_traces(self, path_prefix: str):
+        """Write the measured queries' spans as <prefix>.trace.json (Chrome) and <prefix>.folded (flamegraph)"""
+        write_chrome_trace(self.traces, f"{path_prefix}.trace.json")
+        write_folded(self.traces, f"{path_prefix}.folded")
+        print(f"Traces saved to {path_prefix}.trace.json and {path_prefix}.folded")
+
+    def latencies(self) -> List[float]:
+        """Latencies (seconds) of the successful measured queries"""
+        return [r['latency_seconds'] for r in self.results if r['success']]
+
     def save_results(self, filename: str):
         stats = self.compute_statistics()
         output = {
             "summary": stats,
-            "detailed_results": self.results
+            "detailed_results": self.results,
+            "warmup_results": self.warmup_results
         }
         with open(filename, 'w') as f:
             json.dump(output, f, indent=2)
         print(f"\nResults saved to {filename}")
 
 
-def compare_benchmarks(baseline_stats: Dict, optimized_stats: Dict) -> Dict[str, Any]:
+def _round_ci(ci: Optional[List[float]], digits: int = 4) -> Optional[List[float]]:
+    return [round(v, digits) for v in ci] if ci else None
+
+
+def compare_benchmarks(baseline_stats: Dict, optimized_stats: Dict,
+                       baseline_latencies: Optional[List[float]] = None,
+                       optimized_latencies: Optional[List[float]] = None) -> Dict[str, Any]:
     cost_reduction = ((baseline_stats['average_cost'] - optimized_stats['average_cost']) /
                      baseline_stats['average_cost'] * 100)
     latency_change = ((baseline_stats['average_latency'] - optimized_stats['average_latency']) /
@@ -144,30 +219,238 @@ def compare_benchmarks(baseline_stats: Dict, optimized_stats: Dict) -> Dict[str,
             "monthly_savings": round((baseline_stats['average_cost'] - optimized_stats['average_cost']) * 15000, 2)
         }
     }
+    if baseline_latencies and optimized_latencies:
+        # Is the latency change bigger than run-to-run noise?
+        change = compare_samples(baseline_latencies, optimized_latencies)
+        comparison["latency_change"] = {
+            "change_percent": round(change["change_percent"], 1),
+            "ci95_percent": _round_ci(change["ci95_percent"], 1),
+            "significant": change["significant"]
+        }
     return comparison
 
 
-def main():
+class LoadGenerator:
+    """
+    Open-loop load test: requests arrive at a target rate (Poisson arrivals)
+    whether or not earlier ones have finished, like real traffic.
+
+    Each of `num_users` virtual users owns its own agent session, created by
+    `session_factory(user_index)`; an arrival goes to the next user in turn
+    and waits if that user's previous request is still running. Latency is
+    measured from the scheduled arrival time, so time spent queued behind a
+    slow system counts (no coordinated omission).
+    """
+
+    def __init__(self, session_factory: Callable[[int], Any], num_users: int = 10,
+                 queries: List[str] = TEST_QUERIES, max_in_flight: int = 64, seed: int = 0):
+        self.session_factory = session_factory
+        self.num_users = num_users
+        self.new_sessions()
+        self.session_locks = [threading.Lock() for _ in range(num_users)]
+        self.queries = queries
+        self.max_in_flight = max_in_flight
+        self.seed = seed
+
+    def new_sessions(self):
+        """Give every virtual user a fresh session (empty chat history)"""
+        self.sessions = [self.session_factory(i) for i in range(self.num_users)]
+
+    def _call(self, user: int, query: str, scheduled: float) -> Dict[str, Any]:
+        with self.session_locks[user]:
+            try:
+                response = self.sessions[user].send_message(query)
+                success = response_succeeded(response)
+                error = None if success else "failed_response"
+            except Exception as e:
+                success, error = False, type(e).__name__
+        return {
+            "user": user,
+            "latency_seconds": time.perf_counter() - scheduled,
+            "success": success,
+            "error": error
+        }
+
+    def run_step(self, target_rps: float, duration_seconds: float) -> Dict[str, Any]:
+        """Offer target_rps for duration_seconds and report what the system sustained"""
+        rng = random.Random(self.seed)
+        futures = []
+        start = time.perf_counter()
+        next_arrival = start
+        arrival = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            while next_arrival - start < duration_seconds:
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                user = arrival % len(self.sessions)
+                query = self.queries[arrival % len(self.queries)]
+                futures.append(pool.submit(self._call, user, query, next_arrival))
+                arrival += 1
+                next_arrival += rng.expovariate(target_rps)
+            results = [f.result() for f in futures]
+
+        elapsed = time.perf_counter() - start
+        successes = [r for r in results if r["success"]]
+        latencies = sorted(r["latency_seconds"] for r in successes)
+
+        errors: Dict[str, int] = {}
+        for r in results:
+            if not r["success"]:
+                errors[r["error"]] = errors.get(r["error"], 0) + 1
+
+        return {
+            "target_rps": target_rps,
+            "offered_requests": len(results),
+            "offered_rps": round(len(results) / duration_seconds, 2),
+            "achieved_rps": round(len(successes) / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(1 - len(successes) / len(results), 4) if results else 0.0,
+            "errors": errors,
+            "p50_latency": round(quantile(latencies, 0.50, True), 4),
+            "p95_latency": round(quantile(latencies, 0.95, True), 4),
+            "p99_latency": round(quantile(latencies, 0.99, True), 4),
+            "elapsed_seconds": round(elapsed, 2)
+        }
+
+    def run_curve(self, rps_levels: List[float], duration_seconds: float = 10.0,
+                  max_error_rate: float = 0.05, p95_slo_seconds: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Step through increasing target rates. The saturation point is the
+        first level where the system no longer keeps up: achieved throughput
+        under 90% of the rate actually offered, error rate over max_error_rate, or p95 over the
+        SLO. max_sustainable_rps is the level before it.
+
+        Each level starts from fresh sessions, so later levels don't send
+        longer chat histories than earlier ones.
+        """
+        steps = []
+        saturation = None
+        for level, rps in enumerate(rps_levels):
+            if level:
+                self.new_sessions()
+            step = self.run_step(rps, duration_seconds)
+            steps.append(step)
+            print(f"  {rps:7.1f} rps offered -> {step['achieved_rps']:7.2f} rps ok | "
+                  f"p95 {step['p95_latency']:.3f}s | errors {step['error_rate']:.1%}")
+            saturated = (
+                step["achieved_rps"] < 0.9 * step["offered_rps"]
+                or step["error_rate"] > max_error_rate
+                or (p95_slo_seconds is not None and step["p95_latency"] > p95_slo_seconds)
+            )
+            if saturated:
+                saturation = rps
+                break
+
+        sustainable = [s["target_rps"] for s in steps if s["target_rps"] != saturation]
+        return {
+            "num_users": len(self.sessions),
+            "duration_seconds": duration_seconds,
+            "curve": steps,
+            "saturation_rps": saturation,
+            "max_sustainable_rps": max(sustainable) if sustainable else None
+        }
+
+
+GATED_METRICS = ["average_latency", "p95_latency", "average_cost", "error_rate"]
+MIN_MARGINS = {"error_rate": 0.02}
+
+
+def history_metrics(stats: Dict[str, Any]) -> Dict[str, float]:
+    """Numeric summary values plus per-stage mean times, flattened for PerfHistory"""
+    metrics = {k: v for k, v in stats.items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+    if stats.get("total_queries"):
+        metrics["error_rate"] = stats["failed_queries"] / stats["total_queries"]
+    for stage, stage_stats in stats.get("stages", {}).items():
+        metrics[f"stage.{stage}.mean_ms"] = stage_stats["mean_ms"]
+    return metrics
+
+
+def record_history(suite: str, metrics: Dict[str, float], backend: str,
+                   gated: Optional[List[str]] = GATED_METRICS) -> Dict[str, Dict[str, Any]]:
+    """Gate `metrics` against the suite's recent runs, then append them to the history"""
+    history = PerfHistory()
+    try:
+        verdicts = history.check(suite, metrics, backend, gated=gated, min_absolute=MIN_MARGINS) if gated else {}
+        history.record_run(suite, metrics, backend)
+    finally:
+        history.close()
+    if gated:
+        print(f"\nHISTORY GATE ({suite}):")
+        print(format_verdicts(verdicts) if verdicts else "  not enough history yet")
+    return verdicts
+
+
+def run_load_test(suffix: str = "", backend: str = "live", num_users: int = 10,
+                  rps_levels: List[float] = (1, 2, 5, 10, 20, 50), duration_seconds: float = 10.0):
+    """Throughput/latency curve for the optimized agent, one agent session per virtual user"""
+    def session(_user):
+        agent = OptimizedCodeMentorAgent()
+        agent.start_conversation()
+        return agent
+
+    print(f"\nLoad test: {num_users} virtual users, open-loop arrivals")
+    report = LoadGenerator(session, num_users=num_users).run_curve(list(rps_levels), duration_seconds)
+    with open(f"load_test{suffix}.json", 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saturation at {report['saturation_rps']} rps; max sustainable {report['max_sustainable_rps']} rps")
+    record_history("load_test", {
+        "max_sustainable_rps": report["max_sustainable_rps"],
+        "saturation_rps": report["saturation_rps"]
+    }, backend, gated=None)
+    return report
+
+
+def main(offline: bool = False, load: bool = False, trace: bool = False):
+    """
+    Run both benchmarks. offline=True (or --offline, or GEMINI_BACKEND=fake)
+    uses the scripted fake Gemini backend instead of the API, and writes
+    *.offline.json so the stored live results are not overwritten.
+    load=True (--load) runs the concurrent load test instead.
+    trace=True (--trace) also exports every measured request's spans as a
+    Chrome trace and a folded-stack file for flame graphs.
+
+    Both runs are appended to the performance history (src/perf_history.py)
+    and gated against its recent runs; returns 1 if a gated metric regressed.
+    """
     print("CodeMentor Optimization Benchmark")
     print("=" * 60)
 
+    suffix = ""
+    backend_kind = "live"
+    if offline or active_fake_backend() is not None:
+        backend = active_fake_backend() or use_fake_backend()
+        suffix = ".offline"
+        backend_kind = "fake"
+        print(f"Offline mode: fake Gemini backend (latency {backend.latency_ms:.0f}ms, "
+              f"error rate {backend.error_rate:.0%})")
+
+    if load:
+        run_load_test(suffix, backend_kind)
+        return
+
     print("\nStep 1: Running BASELINE benchmark...")
     baseline_agent = CodeMentorAgent()
     baseline_agent.start_conversation()
     baseline = Benchmark("Baseline (Gemini 2.0 Flash)", baseline_agent)
     baseline_stats = baseline.run_benchmark(TEST_QUERIES, num_iterations=5)
-    baseline.save_results("baseline.json")
+    baseline.save_results(f"baseline{suffix}.json")
+    if trace:
+        baseline.save_traces(f"baseline{suffix}")
 
     print("\nStep 2: Running OPTIMIZED benchmark...")
     optimized_agent = OptimizedCodeMentorAgent()
     optimized_agent.start_conversation()
     optimized = Benchmark("Optimized (Caching + Token Reduction + Routing)", optimized_agent)
     optimized_stats = optimized.run_benchmark(TEST_QUERIES, num_iterations=5)
-    optimized.save_results("optimized.json")
+    optimized.save_results(f"optimized{suffix}.json")
+    if trace:
+        optimized.save_traces(f"optimized{suffix}")
 
     print("\nStep 3: Computing comparison...")
-    comparison = compare_benchmarks(baseline_stats, optimized_stats)
-    with open("comparison.json", 'w') as f:
+    comparison = compare_benchmarks(baseline_stats, optimized_stats,
+                                    baseline.latencies(), optimized.latencies())
+    with open(f"comparison{suffix}.json", 'w') as f:
         json.dump(comparison, f, indent=2)
 
     print("\n" + "=" * 60)
@@ -181,13 +464,28 @@ def main():
     print(f"  Baseline:  {baseline_stats['average_latency']:.2f}s")
     print(f"  Optimized: {optimized_stats['average_latency']:.2f}s")
     print(f"  Improvement: {comparison['latency_improvement_percent']:.1f}%")
+    if "latency_change" in comparison:
+        change = comparison["latency_change"]
+        verdict = "significant" if change["significant"] else "NOT significant (within noise)"
+        print(f"  Change 95% CI: {change['ci95_percent']} % -> {verdict}")
+    for label, stats in (("Baseline", baseline_stats), ("Optimized", optimized_stats)):
+        print(f"\nSTAGES ({label}):")
+        print(format_stages(stats["stages"]))
     print(f"\nMONTHLY PROJECTION:")
     print(f"  Baseline:  ${comparison['monthly_projection']['baseline_cost']:.2f}/month")
     print(f"  Optimized: ${comparison['monthly_projection']['optimized_cost']:.2f}/month")
     print(f"  Savings:   ${comparison['monthly_projection']['monthly_savings']:.2f}/month")
 
-    print(f"\nBenchmark complete! Check baseline.json, optimized.json, and comparison.json for details.")
+    regressed = False
+    for suite, stats in (("benchmark.baseline", baseline_stats), ("benchmark.optimized", optimized_stats)):
+        verdicts = record_history(suite, history_metrics(stats), backend_kind)
+        regressed = regressed or any(v["regressed"] for v in verdicts.values())
+    if regressed:
+        print("\nPERFORMANCE REGRESSION against recent runs (see the history gates above)")
+
+    print(f"\nBenchmark complete! Check baseline{suffix}.json, optimized{suffix}.json, and comparison{suffix}.json for details.")
+    return 1 if regressed else 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main(offline="--offline" in sys.argv, load="--load" in sys.argv, trace="--trace" in sys.argv))
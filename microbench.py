@@ -0,0 +1,416 @@
+"""
+Microbenchmarks for the tool functions, independent of the LLM.
+
+Each case calls one tool on generated input: submissions from 10 lines up
+to the 10k-character cap for analyze_code_submission, and weakness profiles
+and problem catalogs of increasing size for get_recommended_problem and
+track_user_progress. A case reports ops/sec (best of several timed
+rounds) and, measured separately under tracemalloc, the peak and retained
+bytes of one call.
+
+Usage:
+    python microbench.py                  # run and compare with tests/microbench_baseline.json
+    python microbench.py --save-baseline  # run and store the results as the new baseline
+    python microbench.py -k analyze       # only cases whose name contains "analyze"
+    python microbench.py --imports        # cold import time of src and the agent modules
+
+Every comparison run is also recorded in the performance history
+(src/perf_history.py). Exits with status 1 if a case is slower or
+allocates more than the baseline allows (see compare()). ops/sec depend
+on the machine, so refresh the baseline with --save-baseline when moving
+to new hardware.
+
+--imports times `import <module>` in a fresh interpreter for each of
+IMPORT_MODULES and fails if one of them loads an LLM SDK or tokenizer
+(HEAVY_MODULES) or creates files; those belong behind lazy imports.
+Import times are gated against the "import_time" suite of the
+performance history.
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from src.backend.functions import tools
+from src.perf_history import PerfHistory, format_verdicts
+from src.backend.functions.tools import analyze_code_submission, get_recommended_problem, track_user_progress
+from src.backend.models.function_models import CodeSubmissionRequest
+
+BASELINE_PATH = Path(__file__).parent / "tests" / "microbench_baseline.json"
+# The largest submission the agents accept (CodeSubmissionRequest.user_code max_length)
+CODE_SIZE_CAP = next(
+    constraint.max_length for constraint in CodeSubmissionRequest.model_fields["user_code"].metadata
+    if getattr(constraint, "max_length", None) is not None
+)
+BENCH_USER = "bench_user"
+
+IMPORT_MODULES = [
+    "src",
+    "src.backend.functions.tools",
+    "src.backend.ai.agent",
+    "src.backend.ai.optimized_agent",
+    "src.backend.ai.production_agent",
+]
+HEAVY_MODULES = ["google.generativeai", "openai", "anthropic", "tiktoken"]
+IMPORT_SCRIPT = (
+    "import json, sys, time\n"
+    "start = time.perf_counter()\n"
+    "import {module}\n"
+    "elapsed = time.perf_counter() - start\n"
+    "print(json.dumps({{'ms': elapsed * 1000, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))\n"
+)
+
+CODE_LINES = [
+    "    for i in range(len(nums)):",
+    "        for j in range(i + 1, len(nums)):",
+    "            if nums[i] + nums[j] == target:",
+    "                return [i, j]",
+    "    seen = {}",
+    "    if not nums:",
+    "        return []",
+    "    while left < right:",
+    "        left += 1",
+    "    result.append(value)",
+]
+
+
+# ==================== INPUT GENERATORS ====================
+
+def generate_code(num_lines: int, max_chars: int = CODE_SIZE_CAP) -> str:
+    """A Python submission of num_lines lines, cut at a line boundary to stay within max_chars"""
+    lines = ["def two_sum(nums, target):"]
+    for i in range(num_lines - 1):
+        lines.append(CODE_LINES[i % len(CODE_LINES)])
+    code = "\n".join(lines)
+    if len(code) > max_chars:
+        code = code[:code.rfind("\n", 0, max_chars)]
+    return code
+
+
+def generate_profile(num_patterns: int, seed: int = 0) -> Dict[str, float]:
+    """Weakness profile with num_patterns pattern scores"""
+    rng = random.Random(seed)
+    return {f"pattern_{i:04d}": round(rng.uniform(0, 100), 1) for i in range(num_patterns)}
+
+
+def generate_catalog(num_problems: int) -> Dict[str, Dict[str, Any]]:
+    """Problem catalog: the real problems plus synthetic ones up to num_problems"""
+    catalog = dict(tools.MOCK_PROBLEMS)
+    template = tools.MOCK_PROBLEMS["two-sum"]
+    for i in range(len(catalog), num_problems):
+        catalog[f"problem-{i:05d}"] = dict(template, title=f"Problem {i}")
+    return catalog
+
+
+@contextmanager
+def tool_data(profile: Optional[Dict[str, float]] = None, catalog: Optional[Dict[str, Any]] = None):
+    """Install a generated profile (for BENCH_USER) and/or catalog in tools for the enclosed block"""
+    saved_catalog = tools.MOCK_PROBLEMS
+    if profile is not None:
+        tools.USER_WEAKNESS_PROFILES[BENCH_USER] = profile
+    if catalog is not None:
+        tools.MOCK_PROBLEMS = catalog
+    try:
+        yield
+    finally:
+        tools.USER_WEAKNESS_PROFILES.pop(BENCH_USER, None)
+        tools.MOCK_PROBLEMS = saved_catalog
+
+
+# ==================== CASES ====================
+
+class Case:
+    """One benchmarked call: func(**kwargs) with generated tool data installed"""
+
+    def __init__(self, name: str, func: Callable, kwargs: Dict[str, Any],
+                 profile: Optional[Dict[str, float]] = None, catalog: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.func = func
+        self.kwargs = kwargs
+        self.profile = profile
+        self.catalog = catalog
+
+    def __call__(self):
+        return self.func(**self.kwargs)
+
+
+def build_cases() -> List[Case]:
+    cases = []
+    for num_lines in (10, 100, 1000):
+        code = generate_code(num_lines)
+        cases.append(Case(f"analyze_code_submission[lines={num_lines}]", analyze_code_submission,
+                          {"problem_id": "two-sum", "user_code": code}))
+    cases.append(Case(f"analyze_code_submission[chars={CODE_SIZE_CAP}]", analyze_code_submission,
+                      {"problem_id": "two-sum", "user_code": generate_code(10 ** 6)}))
+
+    for num_patterns in (6, 100, 1000):
+        for num_problems in (3, 1000):
+            cases.append(Case(
+                f"get_recommended_problem[patterns={num_patterns},problems={num_problems}]",
+                get_recommended_problem,
+                {"user_id": BENCH_USER, "difficulty_level": "medium"},
+                profile=generate_profile(num_patterns),
+                catalog=generate_catalog(num_problems)
+            ))
+
+    for num_patterns in (6, 100, 1000):
+        profile = generate_profile(num_patterns)
+        detected = sorted(profile)[::3]
+        cases.append(Case(
+            f"track_user_progress[patterns={num_patterns}]",
+            track_user_progress,
+            {"user_id": BENCH_USER, "problem_id": "two-sum", "detected_patterns": detected,
+             "time_taken_minutes": 20.0, "attempts_count": 2, "solved_correctly": True},
+            profile=profile
+        ))
+    return cases
+
+
+# ==================== MEASUREMENT ====================
+
+def measure(case: Case, min_time: float = 0.5, rounds: int = 7) -> Dict[str, Any]:
+    """Time `case` over `rounds` rounds of at least min_time/rounds seconds each, then trace its allocations"""
+    with tool_data(case.profile, case.catalog):
+        case()  # warm-up: imports, pydantic schema caches
+
+        # Calibrate the loop count so one round is long enough for the clock
+        loops = 1
+        while True:
+            start = time.perf_counter_ns()
+            for _ in range(loops):
+                case()
+            elapsed = (time.perf_counter_ns() - start) / 1e9
+            if elapsed >= min_time / rounds or loops >= 10 ** 6:
+                break
+            loops *= 2 if elapsed == 0 else max(2, min(10, int(min_time / rounds / elapsed) + 1))
+
+        # Like timeit, keep the cyclic GC out of the timed rounds: when it
+        # runs depends on everything else alive in the process
+        per_op_us = []
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for _ in range(rounds):
+                start = time.perf_counter_ns()
+                for _ in range(loops):
+                    case()
+                per_op_us.append((time.perf_counter_ns() - start) / 1e3 / loops)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+        peaks, retained = [], []
+        tracemalloc.start()
+        try:
+            for _ in range(rounds):
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                result = case()
+                current, peak = tracemalloc.get_traced_memory()
+                peaks.append(peak - before)
+                del result
+                retained.append(tracemalloc.get_traced_memory()[0] - before)
+        finally:
+            tracemalloc.stop()
+
+    # Noise only ever adds time, so the best round is the most repeatable
+    # estimate (the same reasoning as timeit's min-of-repeats)
+    best_us = min(per_op_us)
+    return {
+        "ops_per_sec": round(1e6 / best_us, 1),
+        "min_us": round(best_us, 3),
+        "median_us": round(statistics.median(per_op_us), 3),
+        "stdev_us": round(statistics.stdev(per_op_us), 3) if rounds > 1 else 0.0,
+        "loops": loops,
+        "rounds": rounds,
+        "peak_alloc_bytes": int(statistics.median(peaks)),
+        "retained_bytes": int(statistics.median(retained))
+    }
+
+
+def measure_import(module: str, runs: int = 5) -> Dict[str, Any]:
+    """Import `module` in `runs` fresh interpreters (in an empty working directory) and time it"""
+    root = str(Path(__file__).resolve().parent)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.getenv("PYTHONPATH")])))
+    script = IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+    timings, heavy = [], set()
+    with tempfile.TemporaryDirectory() as cwd:
+        for _ in range(runs):
+            out = subprocess.run([sys.executable, "-c", script], cwd=cwd, env=env,
+                                 capture_output=True, text=True, timeout=120, check=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            timings.append(result["ms"])
+            heavy.update(result["heavy"])
+        created = sorted(os.listdir(cwd))
+    return {
+        "import_ms": round(min(timings), 2),
+        "median_ms": round(statistics.median(timings), 2),
+        "heavy_modules": sorted(heavy),
+        "created_files": created
+    }
+
+
+def run_imports(modules: Optional[List[str]] = None, runs: int = 5,
+                verbose: bool = True) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for module in modules or IMPORT_MODULES:
+        results[module] = measure_import(module, runs)
+        if verbose:
+            r = results[module]
+            print(f"  {module:<40} {r['import_ms']:>8.1f} ms  (median {r['median_ms']:.1f} ms)")
+    return results
+
+
+def import_problems(results: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Side effects that must not happen on import: SDKs loaded, files created"""
+    problems = []
+    for module, result in results.items():
+        if result["heavy_modules"]:
+            problems.append(f"{module}: imports {', '.join(result['heavy_modules'])}")
+        if result["created_files"]:
+            problems.append(f"{module}: creates {', '.join(result['created_files'])}")
+    return problems
+
+
+def run_suite(cases: Optional[List[Case]] = None, pattern: str = "", min_time: float = 0.5,
+              verbose: bool = True) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for case in cases if cases is not None else build_cases():
+        if pattern and pattern not in case.name:
+            continue
+        results[case.name] = measure(case, min_time)
+        if verbose:
+            r = results[case.name]
+            print(f"  {case.name:<58} {r['ops_per_sec']:>11,.0f} ops/s  {r['min_us']:>9.1f} us  "
+                  f"peak {r['peak_alloc_bytes']:>8,} B")
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            time_tolerance: float = 0.30, alloc_tolerance: float = 0.10,
+            alloc_slack_bytes: int = 2048) -> List[str]:
+    """
+    Regressions of `results` against `baseline`: ops/sec down by more than
+    time_tolerance, or peak allocation up by more than alloc_tolerance (plus
+    alloc_slack_bytes, so tiny cases don't trip on allocator noise). Cases
+    missing from either side are skipped.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["ops_per_sec"] < base["ops_per_sec"] * (1 - time_tolerance):
+            regressions.append(
+                f"{name}: {result['ops_per_sec']:,.0f} ops/s vs baseline {base['ops_per_sec']:,.0f} "
+                f"({(result['ops_per_sec'] / base['ops_per_sec'] - 1) * 100:+.0f}%)"
+            )
+        alloc_limit = base["peak_alloc_bytes"] * (1 + alloc_tolerance) + alloc_slack_bytes
+        if result["peak_alloc_bytes"] > alloc_limit:
+            regressions.append(
+                f"{name}: peak allocation {result['peak_alloc_bytes']:,} B vs baseline "
+                f"{base['peak_alloc_bytes']:,} B"
+            )
+    return regressions
+
+
+def load_baseline(path: Optional[Path] = None) -> Dict[str, Dict[str, Any]]:
+    path = path or BASELINE_PATH
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)["cases"]
+
+
+def save_baseline(results: Dict[str, Dict[str, Any]], path: Optional[Path] = None):
+    data = {
+        "python": sys.version.split()[0],
+        "measured_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cases": results
+    }
+    with open(path or BASELINE_PATH, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Tool microbenchmarks")
+    parser.add_argument("-k", dest="pattern", default="", help="only run cases whose name contains this")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds of timing per case")
+    parser.add_argument("--time-tolerance", type=float, default=0.30)
+    parser.add_argument("--alloc-tolerance", type=float, default=0.10)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--imports", action="store_true", help="measure module import time instead")
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        return main_imports()
+
+    print("Tool microbenchmarks")
+    results = run_suite(pattern=args.pattern, min_time=args.min_time)
+
+    if args.save_baseline:
+        baseline = load_baseline() if args.pattern else {}
+        baseline.update(results)
+        save_baseline(baseline)
+        print(f"\nBaseline saved to {BASELINE_PATH}")
+        return 0
+
+    history = PerfHistory()
+    try:
+        history.record_run("microbench", {
+            f"{name}.{metric}": result[metric]
+            for name, result in results.items()
+            for metric in ("ops_per_sec", "peak_alloc_bytes")
+        })
+    finally:
+        history.close()
+
+    baseline = load_baseline()
+    if not baseline:
+        print(f"\nNo baseline at {BASELINE_PATH}; run with --save-baseline first")
+        return 0
+    regressions = compare(results, baseline, args.time_tolerance, args.alloc_tolerance)
+    if regressions:
+        print("\nREGRESSIONS:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\nNo regressions against {BASELINE_PATH.name}")
+    return 0
+
+
+def main_imports() -> int:
+    print("Cold import time (best of 5 fresh interpreters)")
+    results = run_imports()
+    metrics = {f"{module}.import_ms": result["import_ms"] for module, result in results.items()}
+
+    history = PerfHistory()
+    try:
+        verdicts = history.check("import_time", metrics, min_relative=0.25)
+        history.record_run("import_time", metrics)
+    finally:
+        history.close()
+    print("\nHISTORY GATE (import_time):")
+    print(format_verdicts(verdicts) if verdicts else "  not enough history yet")
+
+    problems = import_problems(results)
+    if problems:
+        print("\nIMPORT SIDE EFFECTS:")
+        for line in problems:
+            print(f"  {line}")
+    return 1 if problems or any(v["regressed"] for v in verdicts.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
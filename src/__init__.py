@@ -1,12 +1,22 @@
 """
 Multi-Vendor LLM Providers
 Implements automatic fallback chain for reliability
+
+The provider classes are imported on first use, so `import src.<module>`
+does not pull in the OpenAI and Anthropic SDKs.
 """
 
-from .base_provider import LLMProvider, ProviderResponse, ProviderError
-from .openai_provider import OpenAIProvider
-from .anthropic_provider import AnthropicProvider
-from .router import SimpleRouter, AdvancedRouter
+import importlib
+
+_LAZY = {
+    'LLMProvider': '.providers.base_provider',
+    'ProviderResponse': '.providers.base_provider',
+    'ProviderError': '.providers.base_provider',
+    'OpenAIProvider': '.providers.openai_provider',
+    'AnthropicProvider': '.providers.anthropic_provider',
+    'OllamaProvider': '.providers.ollama_provider',
+    'LLMRouter': '.providers.router',
+}
 
 __all__ = [
     'LLMProvider',
@@ -14,6 +24,19 @@ __all__ = [
     'ProviderError',
     'OpenAIProvider',
     'AnthropicProvider',
-    'SimpleRouter',
-    'AdvancedRouter',
+    'OllamaProvider',
+    'LLMRouter',
 ]
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,109 +1,12 @@
-import os
+import logging
 from typing import Dict, Any
-import google.generativeai as genai
-from google.generativeai.types import FunctionDeclaration, Tool, content_types
-from dotenv import load_dotenv
-from src.backend.functions.tools import (
-    analyze_code_submission,
-    get_recommended_problem,
-    track_user_progress
-)
+from src.backend.ai.gemini_backend import shared_model
+from src.backend.functions.registry import dispatch, gemini_tool, get_tool
+from src.deadline import Deadline, deadline_scope
+from src.log_utils import get_logger
+from src.tracing import span
 
-# Load environment variables
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-
-
-# Define function declarations properly for Gemini
-analyze_function = FunctionDeclaration(
-    name="analyze_code_submission",
-    description="Analyze user's code submission, run tests, detect error patterns, and provide feedback",
-    parameters={
-        "type": "object",
-        "properties": {
-            "problem_id": {
-                "type": "string",
-                "description": "Problem ID (e.g., 'two-sum', 'reverse-string')"
-            },
-            "user_code": {
-                "type": "string",
-                "description": "User's submitted code as a string"
-            },
-            "language": {
-                "type": "string",
-                "description": "Programming language (python or javascript)"
-            },
-            "user_id": {
-                "type": "string",
-                "description": "User identifier (default: 'user_001')"
-            }
-        },
-        "required": ["problem_id", "user_code"]
-    }
-)
-
-recommend_function = FunctionDeclaration(
-    name="get_recommended_problem",
-    description="Get next recommended problem based on user's weakness profile. Call this when user asks what to practice next.",
-    parameters={
-        "type": "object",
-        "properties": {
-            "user_id": {
-                "type": "string",
-                "description": "User identifier (default: 'user_001')"
-            },
-            "difficulty_level": {
-                "type": "string",
-                "description": "Desired difficulty level (easy, medium, or hard)"
-            }
-        }
-    }
-)
-
-progress_function = FunctionDeclaration(
-    name="track_user_progress",
-    description="Update user's weakness profile after a problem submission",
-    parameters={
-        "type": "object",
-        "properties": {
-            "user_id": {
-                "type": "string",
-                "description": "User identifier"
-            },
-            "problem_id": {
-                "type": "string",
-                "description": "Problem that was attempted"
-            },
-            "detected_patterns": {
-                "type": "array",
-                "items": {"type": "string"},
-                "description": "List of error pattern types detected"
-            },
-            "time_taken_minutes": {
-                "type": "number",
-                "description": "Time spent on problem in minutes"
-            },
-            "attempts_count": {
-                "type": "integer",
-                "description": "Number of attempts made"
-            },
-            "solved_correctly": {
-                "type": "boolean",
-                "description": "Whether problem was solved correctly"
-            }
-        },
-        "required": ["user_id", "problem_id", "detected_patterns", "time_taken_minutes", "attempts_count", "solved_correctly"]
-    }
-)
-
-# Create Tool object with all functions
-codementor_tool = Tool(
-    function_declarations=[
-        analyze_function,
-        recommend_function,
-        progress_function
-    ]
-)
+logger = get_logger(__name__)
 
 
 class CodeMentorAgent:
@@ -112,9 +15,9 @@ class CodeMentorAgent:
     def __init__(self):
         """Initialize the agent with Gemini model"""
         # Create model with tools
-        self.model = genai.GenerativeModel(
+        self.model = shared_model(
             model_name="models/gemini-2.5-flash",
-            tools=[codementor_tool]
+            tools=[gemini_tool()]
         )
         self.chat = None
         
@@ -125,27 +28,25 @@ class CodeMentorAgent:
     
     def _execute_function_call(self, function_call) -> Any:
         """Execute a function call and return the result"""
-        function_name = function_call.name
-        function_args = dict(function_call.args)
+        try:
+            tool = get_tool(function_call.name)
+            with span("validation"):
+                request = tool.validate(dict(function_call.args))
+        except ValueError as e:  # unknown tool, or pydantic's ValidationError
+            return {"error": str(e)}
         
-        if function_name == "analyze_code_submission":
-            result = analyze_code_submission(**function_args)
-            return result.model_dump()
-        elif function_name == "get_recommended_problem":
-            result = get_recommended_problem(**function_args)
+        result = tool.invoke(request)
+        with span("serialize"):
             return result.model_dump()
-        elif function_name == "track_user_progress":
-            result = track_user_progress(**function_args)
-            return result.model_dump()
-        else:
-            return {"error": f"Unknown function: {function_name}"}
     
-    def send_message(self, user_message: str) -> str:
+    def send_message(self, user_message: str, timeout_seconds: float = 30.0) -> str:
         """
         Send a message and handle function calling manually.
         
         Args:
             user_message: User's input message
+            timeout_seconds: Deadline for the whole request, including
+                function calls and follow-up model calls
             
         Returns:
             AI's response as a string
@@ -153,35 +54,44 @@ class CodeMentorAgent:
         if not self.chat:
             self.start_conversation()
         
+        deadline = Deadline(timeout_seconds)
+        
         try:
-            response = self.chat.send_message(user_message)
-            
-            # Check if the model wants to call a function
-            while response.candidates[0].content.parts[0].function_call:
-                function_call = response.candidates[0].content.parts[0].function_call
-                
-                print(f"🔧 Calling function: {function_call.name}")
-                
-                # Execute the function
-                function_result = self._execute_function_call(function_call)
-                
-                # Send the function result back to the model
-                response = self.chat.send_message(
-                    content_types.to_content({
-                        "function_response": {
-                            "name": function_call.name,
-                            "response": function_result
-                        }
-                    })
-                )
-            
-            return response.text
+            with deadline_scope(deadline):
+                return self._send_message(user_message, deadline)
         
         except Exception as e:
-            import traceback
-            print(f"Full error: {traceback.format_exc()}")
+            logger.exception("send_message failed")
             return f"Error processing message: {str(e)}"
     
+    def _send_message(self, user_message: str, deadline: Deadline) -> str:
+        with span("llm.initial"):
+            response = self.chat.send_message(user_message, request_options={"timeout": deadline.timeout()})
+        
+        # Check if the model wants to call a function
+        while response.candidates[0].content.parts[0].function_call:
+            function_call = response.candidates[0].content.parts[0].function_call
+            
+            logger.debug("Calling function: %s", function_call.name)
+            
+            # Execute the function
+            function_result = self._execute_function_call(function_call)
+            
+            # Send the function result back to the model
+            deadline.check("function response")
+            with span("serialize"):
+                from google.generativeai.types import content_types
+                content = content_types.to_content({
+                    "function_response": {
+                        "name": function_call.name,
+                        "response": function_result
+                    }
+                })
+            with span("llm.function_response"):
+                response = self.chat.send_message(content, request_options={"timeout": deadline.timeout()})
+        
+        return response.text
+    
     def execute_function(self, function_name: str, arguments: Dict[str, Any]) -> Any:
         """
         Manually execute a function (for testing).
@@ -192,15 +102,11 @@ class CodeMentorAgent:
             
         Returns:
             Function result
+        
+        Raises:
+            ValueError: Unknown function or invalid arguments
         """
-        if function_name == "analyze_code_submission":
-            return analyze_code_submission(**arguments)
-        elif function_name == "get_recommended_problem":
-            return get_recommended_problem(**arguments)
-        elif function_name == "track_user_progress":
-            return track_user_progress(**arguments)
-        else:
-            raise ValueError(f"Unknown function: {function_name}")
+        return dispatch(function_name, arguments)
 
 
 # Convenience function for simple usage
@@ -224,6 +130,7 @@ def chat_with_codementor(message: str, agent: CodeMentorAgent = None) -> tuple[s
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format="%(message)s")
     # Quick test
     print("CodeMentor AI Test\n")
     
@@ -0,0 +1,334 @@
+"""
+Offline stand-in for the Gemini SDK, for benchmarks and CI without network.
+
+FakeGeminiBackend replays scripted turns. Each user message gets either a
+function_call (name + args) or a text reply, and a function_response gets a
+short text reply built from the tool result. The turn for a message comes
+from, in order:
+
+1. an explicit `script` ({message: turn})
+2. tests/golden_set.json, for cases with an expected_function
+3. keyword routing, which covers benchmark.TEST_QUERIES and everything else
+
+Latency (mean + uniform jitter) and errors are injected from a seeded RNG,
+so a run is reproducible. A call whose latency exceeds its request_options
+timeout raises TimeoutError after waiting the timeout out, like a real
+deadline would.
+
+Response objects expose only what the agents read:
+candidates[0].content.parts[0].function_call / .text, response.text and
+usage_metadata.
+"""
+
+import json
+import os
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from src.cost_model import estimate_tokens
+
+GOLDEN_SET_PATH = Path(__file__).resolve().parents[3] / "tests" / "golden_set.json"
+
+KNOWN_PROBLEMS = ("two-sum", "reverse-string", "valid-parentheses")
+
+
+# ==================== RESPONSE OBJECTS ====================
+
+class FakeFunctionCall:
+    def __init__(self, name: str, args: Dict[str, Any]):
+        self.name = name
+        self.args = args
+    
+    def __bool__(self):
+        return bool(self.name)
+
+
+class FakePart:
+    def __init__(self, text: Optional[str] = None, function_call: Optional[FakeFunctionCall] = None):
+        self.text = text
+        self.function_call = function_call
+
+
+class FakeContent:
+    def __init__(self, parts: List[FakePart], role: str = "model"):
+        self.parts = parts
+        self.role = role
+
+
+class FakeCandidate:
+    def __init__(self, content: FakeContent):
+        self.content = content
+        self.finish_reason = "STOP"
+
+
+class FakeUsageMetadata:
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class FakeResponse:
+    def __init__(self, part: FakePart, prompt_tokens: int):
+        self.candidates = [FakeCandidate(FakeContent([part]))]
+        output = part.text if part.text is not None else json.dumps(
+            {"name": part.function_call.name, "args": part.function_call.args}
+        )
+        self.usage_metadata = FakeUsageMetadata(prompt_tokens, estimate_tokens(output))
+    
+    @property
+    def text(self) -> str:
+        part = self.candidates[0].content.parts[0]
+        if part.text is None:
+            # Same contract as the SDK: function-call responses have no text
+            raise ValueError("response has no text part (function_call)")
+        return part.text
+
+
+# ==================== SCRIPTED TURNS ====================
+
+def _find_problem(text: str, default: str = "two-sum") -> str:
+    lowered = text.lower().replace("_", "-")
+    for problem_id in KNOWN_PROBLEMS:
+        if problem_id in lowered:
+            return problem_id
+    return default
+
+
+def _extract_code(text: str) -> str:
+    match = re.search(r"^(def |function |class )", text, re.MULTILINE)
+    return text[match.start():] if match else text
+
+
+def _difficulty(text: str) -> Optional[str]:
+    lowered = text.lower()
+    for level in ("easy", "medium", "hard"):
+        if level in lowered:
+            return level
+    return None
+
+
+def default_args(function_name: str, message: str) -> Dict[str, Any]:
+    """Arguments the model would plausibly extract from the message"""
+    if function_name == "analyze_code_submission":
+        code = _extract_code(message)
+        return {
+            "problem_id": _find_problem(message),
+            "user_code": code,
+            "language": "javascript" if "function " in code or "=>" in code else "python",
+            "user_id": "user_001"
+        }
+    
+    if function_name == "get_recommended_problem":
+        args = {"user_id": "user_001"}
+        level = _difficulty(message)
+        if level:
+            args["difficulty_level"] = level
+        return args
+    
+    if function_name == "track_user_progress":
+        lowered = message.lower()
+        minutes = re.search(r"(\d+)\s*min", lowered)
+        attempts = re.search(r"(\d+)\s*attempts?", lowered)
+        if attempts:
+            attempts_count = int(attempts.group(1))
+        elif "second" in lowered:
+            attempts_count = 2
+        else:
+            attempts_count = 1
+        return {
+            "user_id": "user_001",
+            "problem_id": _find_problem(message),
+            "detected_patterns": [],
+            "time_taken_minutes": float(minutes.group(1)) if minutes else 15.0,
+            "attempts_count": attempts_count,
+            "solved_correctly": not any(w in lowered for w in ("failed", "couldn't", "could not"))
+        }
+    
+    return {}
+
+
+def route(message: str) -> Optional[str]:
+    """Keyword routing for messages with no script: function name, or None for plain text"""
+    lowered = message.lower()
+    if re.search(r"^\s*(def |function |class )", message, re.MULTILINE):
+        return "analyze_code_submission"
+    if any(w in lowered for w in ("solved", "completed", "track my", "update my stats", "attempts")):
+        return "track_user_progress"
+    if any(w in lowered for w in ("recommend", "practice", "suggest", "problem", "work on")):
+        return "get_recommended_problem"
+    return None
+
+
+def load_golden_script(path: Path = GOLDEN_SET_PATH) -> Dict[str, Dict[str, Any]]:
+    """Turns for every golden-set case that names an expected_function"""
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        cases = json.load(f).get("golden_set", [])
+    return {
+        case["query"]: {"function_call": case["expected_function"]}
+        for case in cases
+        if case.get("expected_function")
+    }
+
+
+def _function_response(content: Any):
+    """(name, response) if content is a function_response turn, else None"""
+    if isinstance(content, dict):
+        fr = content.get("function_response")
+        return (fr["name"], fr.get("response")) if fr else None
+    
+    parts = getattr(content, "parts", None)
+    if parts:
+        fr = getattr(parts[0], "function_response", None)
+        if fr is not None and fr.name:
+            return fr.name, type(fr).to_dict(fr).get("response")
+    return None
+
+
+def _summarize(function_name: str, result: Any) -> str:
+    if not isinstance(result, dict):
+        return f"Here is the result of {function_name}: {result}"
+    if function_name == "get_recommended_problem":
+        problem = result.get("recommended_problem") or {}
+        return (f"I recommend {problem.get('title', 'this problem')} ({problem.get('problem_id', '')}, "
+                f"{problem.get('difficulty', '')}). {result.get('recommendation_reason', '')}").strip()
+    if function_name == "analyze_code_submission":
+        return (f"Your solution runs in {result.get('time_complexity', 'unknown')} time. "
+                f"{result.get('ai_feedback', '')}").strip()
+    if function_name == "track_user_progress":
+        return (f"Progress saved. Overall mastery is {result.get('overall_mastery', 0):.0f}%; "
+                f"focus next on {result.get('next_focus_area', 'your weakest area')}.")
+    return f"Here is the result of {function_name}: {json.dumps(result, default=str)[:300]}"
+
+
+# ==================== BACKEND ====================
+
+class FakeGeminiBackend:
+    """
+    Shared configuration and RNG for fake models.
+    
+    script: {user message: turn}. A turn is {"text": str} or
+        {"function_call": name, "args": {...}} (args default to what
+        default_args() extracts from the message).
+    latency_ms / jitter_ms: each call sleeps latency_ms +/- jitter_ms.
+    error_rate: probability that a call raises error_factory().
+    """
+    
+    def __init__(self, script: Optional[Dict[str, Dict[str, Any]]] = None, use_golden_set: bool = True,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 error_factory: Callable[[], Exception] = lambda: ConnectionError("injected fake Gemini error"),
+                 seed: int = 0):
+        self.script = dict(load_golden_script()) if use_golden_set else {}
+        self.script.update(script or {})
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_factory = error_factory
+        self.seed = seed
+        self.calls = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_env(cls) -> "FakeGeminiBackend":
+        """Configure from FAKE_GEMINI_LATENCY_MS, FAKE_GEMINI_JITTER_MS, FAKE_GEMINI_ERROR_RATE, FAKE_GEMINI_SEED"""
+        return cls(
+            latency_ms=float(os.getenv("FAKE_GEMINI_LATENCY_MS", 0)),
+            jitter_ms=float(os.getenv("FAKE_GEMINI_JITTER_MS", 0)),
+            error_rate=float(os.getenv("FAKE_GEMINI_ERROR_RATE", 0)),
+            seed=int(os.getenv("FAKE_GEMINI_SEED", 0))
+        )
+    
+    def GenerativeModel(self, model_name: str = "models/gemini-fake", **kwargs) -> "FakeGenerativeModel":
+        return FakeGenerativeModel(self, model_name, **kwargs)
+    
+    def plan(self, message: str) -> Dict[str, Any]:
+        """The scripted turn for a user message"""
+        turn = self.script.get(message)
+        if turn is None:
+            function_name = route(message)
+            turn = {"function_call": function_name} if function_name else {"text": self._chat_reply(message)}
+        if "function_call" in turn and "args" not in turn:
+            turn = dict(turn, args=default_args(turn["function_call"], message))
+        return turn
+    
+    def _chat_reply(self, message: str) -> str:
+        if not message.strip():
+            return "Could you tell me what you would like help with?"
+        return ("I'm CodeMentor, here to help you prepare for coding interviews. "
+                "Ask me for a practice problem, send code to analyze, or tell me how a problem went.")
+    
+    def before_call(self, request_options: Optional[Dict[str, Any]] = None):
+        """Inject latency and errors for one model call"""
+        with self._lock:
+            self.calls += 1
+            delay_ms = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms))
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        
+        timeout = (request_options or {}).get("timeout")
+        if timeout is not None and delay_ms / 1000 > timeout:
+            time.sleep(max(0.0, timeout))
+            raise TimeoutError(f"fake Gemini call exceeded its {timeout:.2f}s timeout")
+        if delay_ms:
+            time.sleep(delay_ms / 1000)
+        if fail:
+            raise self.error_factory()
+
+
+class FakeGenerativeModel:
+    """Drop-in for genai.GenerativeModel"""
+    
+    def __init__(self, backend: FakeGeminiBackend, model_name: str, tools=None,
+                 system_instruction: Optional[str] = None, **kwargs):
+        self.backend = backend
+        self.model_name = model_name
+        self.tools = tools
+        self.system_instruction = system_instruction
+    
+    def start_chat(self, history=None, **kwargs) -> "FakeChatSession":
+        return FakeChatSession(self, list(history or []))
+    
+    def generate_content(self, contents, request_options=None, **kwargs) -> FakeResponse:
+        return FakeChatSession(self).send_message(contents, request_options=request_options)
+
+
+class FakeChatSession:
+    """Drop-in for genai.ChatSession; keeps history so prompt tokens grow like the real thing"""
+    
+    def __init__(self, model: FakeGenerativeModel, history: Optional[List[str]] = None):
+        self.model = model
+        self.history = history or []
+    
+    def send_message(self, content, request_options=None, **kwargs) -> FakeResponse:
+        backend = self.model.backend
+        backend.before_call(request_options)
+        
+        function_response = _function_response(content)
+        if function_response is not None:
+            name, result = function_response
+            incoming = json.dumps(result, default=str)
+            part = FakePart(text=_summarize(name, result))
+        else:
+            incoming = content if isinstance(content, str) else str(content)
+            turn = backend.plan(incoming)
+            if "function_call" in turn:
+                part = FakePart(function_call=FakeFunctionCall(turn["function_call"], turn["args"]))
+            else:
+                part = FakePart(text=turn["text"])
+        
+        self.history.append(incoming)
+        prompt_tokens = estimate_tokens(self.model.system_instruction or "") + sum(
+            estimate_tokens(turn) for turn in self.history
+        )
+        response = FakeResponse(part, prompt_tokens)
+        self.history.append(part.text if part.text is not None else part.function_call.name)
+        return response
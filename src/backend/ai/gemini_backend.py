@@ -0,0 +1,109 @@
+"""
+Where the agents get their Gemini models from.
+
+create_model() returns a real genai.GenerativeModel, or a model from the
+offline FakeGeminiBackend when one is active: after use_fake_backend(), or
+when GEMINI_BACKEND=fake is set in the environment (configured through the
+FAKE_GEMINI_* variables, see FakeGeminiBackend.from_env). This lets
+benchmark.py and the regression suite run with no network and no API key.
+
+Nothing happens at import time: .env is read on first use, and the Gemini
+SDK is imported and configured by configure(), which create_model() calls
+before building the first live model.
+
+shared_model() is the process-wide model pool: models are stateless (the
+conversation lives in the chat session), so every agent with the same
+model name, tools and system instruction gets the same model object and
+building an agent or session does not construct new clients.
+"""
+
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from src.backend.ai.fake_gemini import FakeGeminiBackend
+
+_backend: Optional[FakeGeminiBackend] = None
+_lock = threading.Lock()
+_env_loaded = False
+_configured = False
+_pool: Dict[Tuple, Any] = {}
+
+
+def load_env():
+    """Read .env into the environment (once)"""
+    global _env_loaded
+    if _env_loaded:
+        return
+    from dotenv import load_dotenv
+    load_dotenv()
+    _env_loaded = True
+
+
+def configure(api_key: Optional[str] = None):
+    """Configure the Gemini SDK with api_key (default: GEMINI_API_KEY); later calls without a key are no-ops"""
+    global _configured
+    with _lock:
+        if _configured and api_key is None:
+            return
+        load_env()
+        import google.generativeai as genai
+        genai.configure(api_key=api_key or os.getenv("GEMINI_API_KEY"))
+        _configured = True
+
+
+def use_fake_backend(backend: Optional[FakeGeminiBackend] = None) -> FakeGeminiBackend:
+    """Route create_model() to a fake backend (a default one if none is given)"""
+    global _backend
+    with _lock:
+        _backend = backend or FakeGeminiBackend.from_env()
+        _pool.clear()
+        return _backend
+
+
+def use_live_backend():
+    """Route create_model() back to the real Gemini API"""
+    global _backend
+    with _lock:
+        _backend = None
+        _pool.clear()
+
+
+def active_fake_backend() -> Optional[FakeGeminiBackend]:
+    global _backend
+    load_env()
+    with _lock:
+        if _backend is None and os.getenv("GEMINI_BACKEND", "").lower() == "fake":
+            _backend = FakeGeminiBackend.from_env()
+        return _backend
+
+
+def create_model(**kwargs):
+    """genai.GenerativeModel(**kwargs), or its fake when the fake backend is active"""
+    backend = active_fake_backend()
+    if backend is not None:
+        return backend.GenerativeModel(**kwargs)
+    configure()
+    import google.generativeai as genai
+    return genai.GenerativeModel(**kwargs)
+
+
+def shared_model(model_name: str, tools=None, system_instruction: Optional[str] = None):
+    """
+    The pooled model for this configuration, created on first request.
+    `tools` must be shared objects (e.g. registry.gemini_tool()): they are
+    keyed by identity, which the pooled model keeps alive.
+    """
+    backend = active_fake_backend()
+    key = (id(backend), model_name, tuple(id(tool) for tool in tools or ()), system_instruction)
+    model = _pool.get(key)
+    if model is None:
+        model = create_model(model_name=model_name, tools=tools, system_instruction=system_instruction)
+        with _lock:
+            model = _pool.setdefault(key, model)
+    return model
+
+
+def clear_model_pool():
+    with _lock:
+        _pool.clear()
@@ -1,18 +1,15 @@
-import os
 import time
 import hashlib
+import logging
 from typing import Dict, Any
-import google.generativeai as genai
-from google.generativeai.types import FunctionDeclaration, Tool, content_types
-from dotenv import load_dotenv
-from src.backend.functions.tools import (
-    analyze_code_submission,
-    get_recommended_problem,
-    track_user_progress
-)
+from src.backend.ai.gemini_backend import shared_model
+from src.backend.functions.registry import gemini_tool, get_tool
+from src.cost_model import TokenUsage, calculate_cost, usage_from_gemini
+from src.deadline import Deadline, deadline_scope
+from src.log_utils import get_logger
+from src.tracing import span
 
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+logger = get_logger(__name__)
 
 # ==================== OPTIMIZATION 1: RESPONSE CACHE ====================
 
@@ -35,7 +32,7 @@ class ResponseCache:
         if key in self.cache:
             result, timestamp = self.cache[key]
             if time.time() - timestamp < self.ttl:
-                print(f"🎯 Cache HIT: {function_name}")
+                logger.debug("Cache HIT: %s", function_name)
                 return result
             else:
                 del self.cache[key]  # Expired
@@ -79,97 +76,54 @@ def choose_model(function_name: str) -> str:
 # ==================== COST TRACKING ====================
 
 class CostTracker:
-    """Track costs with model-specific pricing"""
-    
-    PRICING = {
-        "models/gemini-2.0-flash-exp": 0.00001,  # per token (estimate)
-        "models/gemini-1.5-flash": 0.000005      # 50% cheaper
-    }
+    """Track costs with model-specific pricing (see src/cost_model.py)"""
     
     def __init__(self):
         self.total_cost = 0.0
         self.call_count = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.estimated_calls = 0
         self.cache_hits = 0
         self.cache_misses = 0
         self.calls_by_model = {}
     
-    def add_call(self, model: str, tokens: int, cached: bool = False):
-        """Track API call cost"""
-        if cached:
-            self.cache_hits += 1
-            cost = 0  # Cached = free
-        else:
-            self.cache_misses += 1
-            cost = tokens * self.PRICING.get(model, 0.00001)
-            self.total_cost += cost
+    def add_call(self, model: str, usage: TokenUsage):
+        """Track one LLM call using its reported (or estimated) token usage"""
+        cost = calculate_cost(model, usage.input_tokens, usage.output_tokens)
         
+        self.total_cost += cost
         self.call_count += 1
+        self.input_tokens += usage.input_tokens
+        self.output_tokens += usage.output_tokens
+        if usage.estimated:
+            self.estimated_calls += 1
         self.calls_by_model[model] = self.calls_by_model.get(model, 0) + 1
         
-        print(f"Cost: ${cost:.6f} | Total: ${self.total_cost:.6f} | Model: {model.split('/')[-1]}")
+        logger.debug("Cost: $%.6f | Total: $%.6f | Tokens: %d | Model: %s",
+                     cost, self.total_cost, usage.total_tokens, model)
+    
+    def add_cache_lookup(self, hit: bool):
+        """Track a function-result cache lookup"""
+        if hit:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
     
     def get_summary(self) -> Dict[str, Any]:
-        cache_rate = (self.cache_hits / max(1, self.call_count)) * 100
+        cache_rate = (self.cache_hits / max(1, self.cache_hits + self.cache_misses)) * 100
         
         return {
             "total_cost": round(self.total_cost, 6),
             "calls": self.call_count,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "estimated_calls": self.estimated_calls,
             "cache_hit_rate": f"{cache_rate:.1f}%",
-            "savings_from_cache": round(self.cache_hits * 0.01, 4),
             "models_used": self.calls_by_model
         }
 
 
-# ==================== FUNCTION DECLARATIONS ====================
-
-# Compact function declarations (token optimized)
-analyze_function = FunctionDeclaration(
-    name="analyze_code_submission",
-    description="Analyze code, run tests, detect patterns, give feedback",
-    parameters={
-        "type": "object",
-        "properties": {
-            "problem_id": {"type": "string", "description": "Problem ID"},
-            "user_code": {"type": "string", "description": "User's code"},
-            "language": {"type": "string", "description": "python/javascript"},
-            "user_id": {"type": "string", "description": "User ID"}
-        },
-        "required": ["problem_id", "user_code"]
-    }
-)
-
-recommend_function = FunctionDeclaration(
-    name="get_recommended_problem",
-    description="Get next problem based on weaknesses",
-    parameters={
-        "type": "object",
-        "properties": {
-            "user_id": {"type": "string", "description": "User ID"},
-            "difficulty_level": {"type": "string", "description": "easy/medium/hard"}
-        }
-    }
-)
-
-progress_function = FunctionDeclaration(
-    name="track_user_progress",
-    description="Update weakness scores after submission",
-    parameters={
-        "type": "object",
-        "properties": {
-            "user_id": {"type": "string"},
-            "problem_id": {"type": "string"},
-            "detected_patterns": {"type": "array", "items": {"type": "string"}},
-            "time_taken_minutes": {"type": "number"},
-            "attempts_count": {"type": "integer"},
-            "solved_correctly": {"type": "boolean"}
-        },
-        "required": ["user_id", "problem_id", "detected_patterns", "time_taken_minutes", "attempts_count", "solved_correctly"]
-    }
-)
-
-codementor_tool = Tool(function_declarations=[analyze_function, recommend_function, progress_function])
-
-
 # ==================== OPTIMIZED AGENT ====================
 
 class OptimizedCodeMentorAgent:
@@ -179,14 +133,14 @@ class OptimizedCodeMentorAgent:
         self.cache = ResponseCache(ttl_seconds=300)
         self.cost_tracker = CostTracker()
         self.models = {
-            "models/gemini-2.0-flash-exp": genai.GenerativeModel(
+            "models/gemini-2.0-flash-exp": shared_model(
                 model_name="models/gemini-2.0-flash-exp",
-                tools=[codementor_tool],
+                tools=[gemini_tool(compact=True)],
                 system_instruction=OPTIMIZED_SYSTEM_PROMPT
             ),
-            "models/gemini-1.5-flash": genai.GenerativeModel(
+            "models/gemini-1.5-flash": shared_model(
                 model_name="models/gemini-1.5-flash",
-                tools=[codementor_tool],
+                tools=[gemini_tool(compact=True)],
                 system_instruction=OPTIMIZED_SYSTEM_PROMPT
             )
         }
@@ -198,89 +152,99 @@ class OptimizedCodeMentorAgent:
         return "CodeMentor AI ready! (Optimized for speed and cost)"
     
     def _execute_function_call(self, function_call) -> Any:
-        """Execute function with caching"""
+        """Execute function with caching (for tools registered as cacheable)"""
         function_name = function_call.name
-        function_args = dict(function_call.args)
+        try:
+            tool = get_tool(function_name)
+            with span("validation"):
+                request = tool.validate(dict(function_call.args))
+        except ValueError as e:  # unknown tool, or pydantic's ValidationError
+            return {"error": str(e)}
         
-        # Check cache first
-        cached_result = self.cache.get(function_name, function_args)
-        if cached_result:
-            self.cost_tracker.add_call(self.current_model, tokens=0, cached=True)
-            return cached_result
+        # Validated arguments have defaults filled in, so equivalent calls share a key
+        function_args = request.__dict__
+        if tool.cacheable:
+            with span("cache.get", function=function_name):
+                cached_result = self.cache.get(function_name, function_args)
+            self.cost_tracker.add_cache_lookup(hit=bool(cached_result))
+            if cached_result:
+                return cached_result
         
         # Cache miss - execute function
-        if function_name == "analyze_code_submission":
-            result = analyze_code_submission(**function_args)
-        elif function_name == "get_recommended_problem":
-            result = get_recommended_problem(**function_args)
-        elif function_name == "track_user_progress":
-            result = track_user_progress(**function_args)
-        else:
-            return {"error": f"Unknown function: {function_name}"}
-        
-        result_dict = result.model_dump()
+        result = tool.invoke(request)
+        with span("serialize"):
+            result_dict = result.model_dump()
         
-        # Cache the result
-        self.cache.set(function_name, function_args, result_dict)
-        
-        # Track cost (estimate 300 tokens avg with optimization)
-        self.cost_tracker.add_call(self.current_model, tokens=300, cached=False)
+        if tool.cacheable:
+            with span("cache.set", function=function_name):
+                self.cache.set(function_name, function_args, result_dict)
         
         return result_dict
     
-    def send_message(self, user_message: str) -> str:
-        """Send message with optimizations"""
+    def send_message(self, user_message: str, timeout_seconds: float = 30.0) -> str:
+        """Send message with optimizations (timeout_seconds bounds the whole request)"""
         if not self.chat:
             self.start_conversation()
         
         start_time = time.time()
+        deadline = Deadline(timeout_seconds)
         
         try:
-            # Initial API call
-            response = self.chat.send_message(user_message)
-            self.cost_tracker.add_call(self.current_model, tokens=200, cached=False)
-            
-            # Handle function calling
-            while response.candidates[0].content.parts[0].function_call:
-                function_call = response.candidates[0].content.parts[0].function_call
-                
-                # OPTIMIZATION 3: Route to appropriate model
-                optimal_model = choose_model(function_call.name)
-                if optimal_model != self.current_model:
-                    print(f"Switching to {optimal_model.split('/')[-1]}")
-                    self.current_model = optimal_model
-                    self.chat = self.models[optimal_model].start_chat()
-                
-                print(f"Calling: {function_call.name}")
-                
-                # Execute with caching
-                function_result = self._execute_function_call(function_call)
-                
-                # Send result back
-                response = self.chat.send_message(
-                    content_types.to_content({
-                        "function_response": {
-                            "name": function_call.name,
-                            "response": function_result
-                        }
-                    })
-                )
+            with deadline_scope(deadline):
+                text = self._send_message(user_message, deadline)
             
-            elapsed = time.time() - start_time
-            print(f" Response time: {elapsed:.2f}s")
-            print(f" {self.cost_tracker.get_summary()}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Response time: %.2fs | %s", time.time() - start_time, self.cost_tracker.get_summary())
             
-            return response.text
+            return text
         
         except Exception as e:
-            import traceback
-            print(f"Error: {traceback.format_exc()}")
+            logger.exception("send_message failed")
             return f"Error: {str(e)}"
+    
+    def _send_message(self, user_message: str, deadline: Deadline) -> str:
+        # Initial API call
+        with span("llm.initial", model=self.current_model):
+            response = self.chat.send_message(user_message, request_options={"timeout": deadline.timeout()})
+        self.cost_tracker.add_call(self.current_model, usage_from_gemini(response, user_message))
+        
+        # Handle function calling
+        while response.candidates[0].content.parts[0].function_call:
+            function_call = response.candidates[0].content.parts[0].function_call
+            
+            # OPTIMIZATION 3: Route to appropriate model
+            optimal_model = choose_model(function_call.name)
+            if optimal_model != self.current_model:
+                logger.debug("Switching to %s", optimal_model)
+                self.current_model = optimal_model
+                self.chat = self.models[optimal_model].start_chat()
+            
+            logger.debug("Calling: %s", function_call.name)
+            
+            # Execute with caching
+            function_result = self._execute_function_call(function_call)
+            
+            # Send result back
+            deadline.check("function response")
+            with span("serialize"):
+                from google.generativeai.types import content_types
+                content = content_types.to_content({
+                    "function_response": {
+                        "name": function_call.name,
+                        "response": function_result
+                    }
+                })
+            with span("llm.function_response", model=self.current_model):
+                response = self.chat.send_message(content, request_options={"timeout": deadline.timeout()})
+            self.cost_tracker.add_call(self.current_model, usage_from_gemini(response, str(function_result)))
+        
+        return response.text
 
 
 # ==================== DEMO ====================
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format="%(message)s")
     print("=== OPTIMIZED CodeMentor Agent ===\n")
     
     agent = OptimizedCodeMentorAgent()
@@ -1,36 +1,59 @@
 import os
+import asyncio
 import time
-import json
 import logging
 import uuid
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from typing import Dict, Any, Optional
 from functools import wraps
-import google.generativeai as genai
-from google.generativeai.types import FunctionDeclaration, Tool
-from dotenv import load_dotenv
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-from pydantic import BaseModel, Field, validator
-
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+from tenacity.stop import stop_base
+from src.backend.ai.gemini_backend import load_env, shared_model
+from src.backend.functions.registry import TOOLS, Permission, ToolSpec, get_tool
+from src.log_utils import get_stream_logger, rotated_files
+from src.telemetry_index import TelemetryIndex
+from src.tracing import span
+from src.cost_model import TokenUsage, calculate_cost, usage_from_gemini
+from src.deadline import (
+    Deadline, current_deadline, deadline_scope, timeout_for,
+    run_with_timeout, run_with_timeout_async
+)
 
 # ==================== ENHANCED TELEMETRY & LOGGING ====================
 
-os.makedirs("logs", exist_ok=True)
-
-# Configure structured JSON logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(message)s',
-    handlers=[
-        logging.FileHandler('logs/agent_audit.log'),
-        logging.FileHandler('logs/telemetry.log')  # Separate telemetry log
-    ]
-)
+# One non-propagating logger per stream: audit and telemetry records each go
+# only to their own rotating file (rotated files gzipped), and the root
+# logger is left for the application to configure. Telemetry is split into
+# time segments so analytics can skip whole periods (see telemetry_index).
+# The loggers (and logs/) are created by init_logging(), not at import.
+audit_logger: Optional[logging.Logger] = None
+telemetry_logger: Optional[logging.Logger] = None
+_logging_lock = threading.Lock()
+
+
+def init_logging():
+    """Create the audit and telemetry stream loggers (once); AGENT_LOG_* settings are read here"""
+    global audit_logger, telemetry_logger
+    with _logging_lock:
+        if audit_logger is not None:
+            return
+        load_env()
+        compress = os.getenv("AGENT_LOG_COMPRESS", "1") != "0"
+        telemetry_logger = get_stream_logger(
+            "telemetry", "logs/telemetry.log",
+            segment_seconds=int(os.getenv("AGENT_TELEMETRY_SEGMENT_SECONDS", 3600)),
+            backup_count=int(os.getenv("AGENT_TELEMETRY_SEGMENTS_KEPT", 24 * 14)),
+            compress=compress
+        )
+        audit_logger = get_stream_logger(
+            "audit", "logs/agent_audit.log",
+            max_bytes=int(os.getenv("AGENT_LOG_MAX_BYTES", 50 * 1024 * 1024)),
+            backup_count=int(os.getenv("AGENT_LOG_BACKUP_COUNT", 5)),
+            compress=compress
+        )
 
-logger = logging.getLogger(__name__)
-telemetry_logger = logging.getLogger('telemetry')
 
 def log_audit(event_type: str, details: Dict[str, Any]):
     """Log all agent actions for audit trail"""
@@ -39,7 +62,10 @@ def log_audit(event_type: str, details: Dict[str, Any]):
         "event_type": event_type,
         "details": details
     }
-    logger.info(json.dumps(log_entry))
+    if audit_logger is None:
+        init_logging()
+    with span("audit.write"):
+        audit_logger.info(log_entry)  # serialized by the log writer thread
 
 def log_telemetry(
     request_id: str,
@@ -70,28 +96,21 @@ def log_telemetry(
         "error_type": error_type,
         **kwargs  # Additional fields like response_length, function_called, etc.
     }
-    telemetry_logger.info(json.dumps(telemetry_entry))
-
-
-# ==================== INPUT VALIDATION ====================
-
-class AnalyzeCodeInput(BaseModel):
-    problem_id: str = Field(..., min_length=1, max_length=100)
-    user_code: str = Field(..., min_length=1, max_length=10000)
-    language: str = Field(default="python")
-    user_id: str = Field(default="user_001")
-    
-    @validator('problem_id')
-    def validate_problem_id(cls, v):
-        if not v.strip():
-            raise ValueError("problem_id cannot be empty")
-        return v.strip()
+    if telemetry_logger is None:
+        init_logging()
+    with span("telemetry.write"):
+        telemetry_logger.info(telemetry_entry)
 
 
 # ==================== CIRCUIT BREAKER ====================
 
 class CircuitBreaker:
-    """Circuit breaker per tool to prevent cascading failures"""
+    """Circuit breaker per tool to prevent cascading failures.
+    
+    Shared by every session, so state changes happen under a lock. While
+    half-open only one trial call is let through; the rest fail fast until
+    it settles the state.
+    """
     
     def __init__(self, failure_threshold=5, timeout_seconds=60):
         self.failure_count = 0
@@ -99,54 +118,62 @@ class CircuitBreaker:
         self.timeout = timeout_seconds
         self.last_failure_time = None
         self.state = "closed"  # closed, open, half_open
+        self._lock = threading.Lock()
+        self._trial_in_flight = False
+    
+    def _before_call(self, name: str) -> bool:
+        """Decide whether a call may go ahead; returns True if it is the half-open trial"""
+        with self._lock:
+            if self.state == "open":
+                if time.time() - self.last_failure_time > self.timeout:
+                    self.state = "half_open"
+                    log_audit("circuit_breaker", {"state": "half_open", "tool": name})
+                else:
+                    raise Exception(f"Circuit breaker OPEN for {name}")
+            
+            if self.state == "half_open":
+                if self._trial_in_flight:
+                    raise Exception(f"Circuit breaker HALF_OPEN for {name}: trial call in progress")
+                self._trial_in_flight = True
+                return True
+            return False
     
     def call(self, func, *args, **kwargs):
         """Execute function with circuit breaker protection"""
-        
-        # If circuit is open, check if timeout expired
-        if self.state == "open":
-            if time.time() - self.last_failure_time > self.timeout:
-                self.state = "half_open"
-                log_audit("circuit_breaker", {"state": "half_open", "tool": func.__name__})
-            else:
-                raise Exception(f"Circuit breaker OPEN for {func.__name__}")
+        is_trial = self._before_call(func.__name__)
         
         try:
             result = func(*args, **kwargs)
-            # Success resets circuit
+        except Exception as e:
+            with self._lock:
+                if is_trial:
+                    self._trial_in_flight = False
+                self.failure_count += 1
+                self.last_failure_time = time.time()
+                
+                if is_trial or self.failure_count >= self.failure_threshold:
+                    self.state = "open"
+                    log_audit("circuit_breaker", {
+                        "state": "open",
+                        "tool": func.__name__,
+                        "failures": self.failure_count
+                    })
+            raise e
+        
+        # Success resets circuit
+        with self._lock:
+            if is_trial:
+                self._trial_in_flight = False
             if self.state == "half_open":
                 self.state = "closed"
                 self.failure_count = 0
                 log_audit("circuit_breaker", {"state": "closed", "tool": func.__name__})
-            return result
-        
-        except Exception as e:
-            self.failure_count += 1
-            self.last_failure_time = time.time()
-            
-            if self.failure_count >= self.failure_threshold:
-                self.state = "open"
-                log_audit("circuit_breaker", {
-                    "state": "open",
-                    "tool": func.__name__,
-                    "failures": self.failure_count
-                })
-            raise e
+        return result
 
 
 # ==================== AUTHORIZATION ====================
 
-class Permission:
-    READ = "read"
-    WRITE = "write"
-    ADMIN = "admin"
-
-TOOL_PERMISSIONS = {
-    "analyze_code_submission": Permission.WRITE,
-    "get_recommended_problem": Permission.READ,
-    "track_user_progress": Permission.WRITE
-}
-
+# Tool permissions are part of the tool registration (src/backend/functions/registry.py)
 USER_ROLES = {
     "user_001": Permission.WRITE,
     "admin_001": Permission.ADMIN
@@ -154,7 +181,8 @@ USER_ROLES = {
 
 def check_authorization(user_id: str, tool_name: str) -> bool:
     """Check if user has permission to use tool"""
-    required_permission = TOOL_PERMISSIONS.get(tool_name, Permission.ADMIN)
+    tool = TOOLS.get(tool_name)
+    required_permission = tool.permission if tool else Permission.ADMIN
     user_permission = USER_ROLES.get(user_id, Permission.READ)
     
     permission_hierarchy = {
@@ -178,65 +206,192 @@ def check_authorization(user_id: str, tool_name: str) -> bool:
 
 # ==================== RETRY + TIMEOUTS ====================
 
-@retry(
-    stop=stop_after_attempt(3),
+class stop_at_deadline(stop_base):
+    """Stop retrying when the request deadline can't fit another backoff + attempt"""
+    
+    def __init__(self, min_wait: float = 1.0):
+        self.min_wait = min_wait
+    
+    def __call__(self, retry_state) -> bool:
+        deadline = current_deadline()
+        return deadline is not None and not deadline.can_fit(self.min_wait)
+
+
+_RETRY_POLICY = dict(
+    stop=stop_after_attempt(3) | stop_at_deadline(),
     wait=wait_exponential(multiplier=1, min=1, max=4),
     retry=retry_if_exception_type((TimeoutError, ConnectionError))
 )
+
+
+@retry(**_RETRY_POLICY)
 def call_with_retry(func, *args, timeout_seconds=5, **kwargs):
-    """Call function with timeout and retry logic"""
-    import signal
+    """
+    Call function with timeout and retry logic.
     
-    def timeout_handler(signum, frame):
-        raise TimeoutError(f"{func.__name__} exceeded {timeout_seconds}s timeout")
+    Thread-safe: the timeout is enforced with a future instead of SIGALRM,
+    so this works from worker threads and threaded servers. Only for
+    idempotent calls: a timed-out attempt keeps running in the background
+    while the next one starts (chat turns go through send_with_retry).
+    """
+    # Each attempt gets at most what is left of the request deadline
+    timeout_seconds = timeout_for(timeout_seconds)
+    if timeout_seconds <= 0:
+        raise TimeoutError(f"{func.__name__} skipped: request deadline exceeded")
     
-    # Set alarm (Unix-like systems only)
-    try:
-        old_handler = signal.signal(signal.SIGALRM, timeout_handler)
-        signal.alarm(timeout_seconds)
-        
-        result = func(*args, **kwargs)
-        
-        signal.alarm(0)
-        signal.signal(signal.SIGALRM, old_handler)
-        return result
-    except AttributeError:
-        # Windows doesn't support signal.SIGALRM
-        # Fallback to simple execution
-        return func(*args, **kwargs)
+    return run_with_timeout(func, timeout_seconds, *args, **kwargs)
+
+
+@retry(**_RETRY_POLICY)
+async def call_with_retry_async(func, *args, timeout_seconds=5, **kwargs):
+    """call_with_retry for asyncio code - never blocks the event loop"""
+    timeout_seconds = timeout_for(timeout_seconds)
+    if timeout_seconds <= 0:
+        raise TimeoutError(f"{func.__name__} skipped: request deadline exceeded")
+    
+    return await run_with_timeout_async(func, timeout_seconds, *args, **kwargs)
+
+
+@retry(**dict(_RETRY_POLICY, retry=retry_if_exception_type(ConnectionError)))
+def send_with_retry(chat, content, timeout_seconds=30):
+    """
+    chat.send_message(content) with a timeout and retries, for one chat turn.
+    
+    A chat send is not idempotent: the chat appends the turn to its history
+    when the call returns. A ConnectionError means the call failed without
+    touching the history, so it is retried. A TimeoutError is not: the
+    abandoned call may still finish and append its turn, so the caller has
+    to stop using this chat (see ProductionAgent._send). The timeout is
+    worked out per attempt from what is left of the request deadline.
+    """
+    timeout_seconds = timeout_for(timeout_seconds)
+    if timeout_seconds <= 0:
+        raise TimeoutError("send_message skipped: request deadline exceeded")
+    return run_with_timeout(chat.send_message, timeout_seconds, content,
+                            request_options={"timeout": timeout_seconds})
 
 
 # ==================== COST TRACKING ====================
 
 class CostTracker:
-    """Track API costs and enforce limits"""
+    """Track API costs and enforce limits (thread-safe)"""
     
-    def __init__(self, cost_limit=1.0):
+    def __init__(self, cost_limit=1.0, name: str = "global"):
+        self.name = name
         self.total_cost = 0.0
         self.cost_limit = cost_limit
         self.call_count = 0
+        self.total_tokens = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def limit_reached(self) -> bool:
+        with self._lock:
+            return self.total_cost >= self.cost_limit
     
-    def add_cost(self, cost: float, operation: str):
+    def add_cost(self, cost: float, operation: str, usage: Optional[TokenUsage] = None):
         """Add cost and check limit"""
-        self.total_cost += cost
-        self.call_count += 1
+        with self._lock:
+            self.total_cost += cost
+            self.call_count += 1
+            if usage is not None:
+                self.total_tokens += usage.total_tokens
+            total_cost = self.total_cost
+            call_count = self.call_count
         
         log_audit("cost_tracking", {
+            "tracker": self.name,
             "operation": operation,
             "cost": cost,
-            "total_cost": self.total_cost,
-            "call_count": self.call_count
+            "tokens": usage.total_tokens if usage is not None else None,
+            "tokens_estimated": usage.estimated if usage is not None else None,
+            "total_cost": total_cost,
+            "call_count": call_count
         })
         
-        if self.total_cost >= self.cost_limit:
-            raise Exception(f"Cost limit exceeded: ${self.total_cost:.4f} >= ${self.cost_limit}")
+        if total_cost >= self.cost_limit:
+            raise Exception(f"Cost limit exceeded: ${total_cost:.4f} >= ${self.cost_limit}")
     
     def get_summary(self) -> Dict[str, Any]:
-        return {
-            "total_cost": round(self.total_cost, 4),
-            "call_count": self.call_count,
-            "average_cost": round(self.total_cost / max(1, self.call_count), 4)
-        }
+        with self._lock:
+            return {
+                "total_cost": round(self.total_cost, 4),
+                "call_count": self.call_count,
+                "total_tokens": self.total_tokens,
+                "average_cost": round(self.total_cost / max(1, self.call_count), 4)
+            }
+
+
+# ==================== SESSION MANAGEMENT ====================
+
+class UserSession:
+    """One user's chat plus their cost tracker.
+    
+    A Gemini chat is a sequential conversation, so requests for the same
+    user are serialized on `lock`; different users run in parallel.
+    """
+    
+    def __init__(self, user_id: str, chat, cost_tracker: CostTracker):
+        self.user_id = user_id
+        self.chat = chat
+        self.cost_tracker = cost_tracker
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+class SessionManager:
+    """Bounded LRU of per-user sessions with idle eviction"""
+    
+    def __init__(self, model, max_sessions: int = 1000, idle_timeout_seconds: float = 1800.0,
+                 user_cost_limit: float = float("inf")):
+        self.model = model
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout_seconds
+        self.user_cost_limit = user_cost_limit
+        self._sessions: "OrderedDict[str, UserSession]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, user_id: str) -> UserSession:
+        """Return the user's session, creating it (and evicting stale ones) if needed"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            session = self._sessions.get(user_id)
+            if session is None:
+                session = UserSession(
+                    user_id,
+                    self.model.start_chat(),
+                    CostTracker(self.user_cost_limit, name=user_id)
+                )
+                self._sessions[user_id] = session
+                while len(self._sessions) > self.max_sessions:
+                    evicted_id, _ = self._sessions.popitem(last=False)
+                    log_audit("session_evicted", {"user_id": evicted_id, "reason": "capacity"})
+            else:
+                self._sessions.move_to_end(user_id)
+            session.last_used = now
+            return session
+    
+    def _evict_idle(self, now: float):
+        # Oldest first: stop at the first session that is still fresh
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used <= self.idle_timeout:
+                break
+            self._sessions.popitem(last=False)
+            log_audit("session_evicted", {"user_id": user_id, "reason": "idle"})
+    
+    def drop(self, user_id: str):
+        with self._lock:
+            self._sessions.pop(user_id, None)
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+    
+    def __contains__(self, user_id: str):
+        with self._lock:
+            return user_id in self._sessions
 
 
 # ==================== PRODUCTION AGENT WITH FULL TELEMETRY ====================
@@ -244,35 +399,50 @@ class CostTracker:
 class ProductionAgent:
     """Production agent with all 8 safety features + comprehensive telemetry"""
     
-    def __init__(self, cost_limit=1.0):
-        self.model = genai.GenerativeModel(model_name="models/gemini-2.0-flash-exp")
-        self.chat = None
+    MODEL_NAME = "models/gemini-2.0-flash-exp"
+    
+    def __init__(self, cost_limit=1.0, user_cost_limit: float = float("inf"),
+                 max_sessions: int = 1000, session_idle_seconds: float = 1800.0):
+        init_logging()
+        self.model = shared_model(self.MODEL_NAME)
+        # Global budget across all users; each session also has its own tracker
         self.cost_tracker = CostTracker(cost_limit)
-        self.circuit_breakers = {}
-        
-        # Import tools
-        from src.backend.functions.tools import (
-            analyze_code_submission,
-            get_recommended_problem,
-            track_user_progress
+        self.sessions = SessionManager(
+            self.model,
+            max_sessions=max_sessions,
+            idle_timeout_seconds=session_idle_seconds,
+            user_cost_limit=user_cost_limit
         )
-        self.tools = {
-            "analyze_code_submission": analyze_code_submission,
-            "get_recommended_problem": get_recommended_problem,
-            "track_user_progress": track_user_progress
-        }
+        self.circuit_breakers = {}
+        self._breaker_lock = threading.Lock()
     
     def _get_circuit_breaker(self, tool_name: str) -> CircuitBreaker:
-        """Get or create circuit breaker for tool"""
-        if tool_name not in self.circuit_breakers:
-            self.circuit_breakers[tool_name] = CircuitBreaker()
-        return self.circuit_breakers[tool_name]
+        """Get or create circuit breaker for tool (shared by all sessions)"""
+        with self._breaker_lock:
+            if tool_name not in self.circuit_breakers:
+                self.circuit_breakers[tool_name] = CircuitBreaker()
+            return self.circuit_breakers[tool_name]
     
-    def send_message(self, user_message: str, user_id: str = "user_001") -> Dict[str, Any]:
+    def send_message(self, user_message: str, user_id: str = "user_001", timeout_seconds: float = 30.0) -> Dict[str, Any]:
         """
         Send message with full safety features and telemetry.
         NEVER crashes - always returns structured response.
+        
+        timeout_seconds is the deadline for the whole request; every LLM
+        call, retry and tool call below is sized to fit inside it.
         """
+        deadline = Deadline(timeout_seconds)
+        session = self.sessions.get(user_id)
+        with deadline_scope(deadline), session.lock:
+            return self._handle_message(user_message, session, deadline)
+    
+    async def send_message_async(self, user_message: str, user_id: str = "user_001", timeout_seconds: float = 30.0) -> Dict[str, Any]:
+        """send_message for asyncio servers: runs on a worker thread so the event loop stays free"""
+        return await asyncio.to_thread(self.send_message, user_message, user_id, timeout_seconds)
+    
+    def _handle_message(self, user_message: str, session: UserSession, deadline: Deadline) -> Dict[str, Any]:
+        user_id = session.user_id
+        
         # Generate unique request ID for tracing
         request_id = f"req_{uuid.uuid4().hex[:8]}"
         start_time = time.time()
@@ -282,10 +452,11 @@ class ProductionAgent:
         function_called = None
         response_length = 0
         error_type = None
+        request_cost = 0.0
         
         try:
             # Check cost limit BEFORE calling API
-            if self.cost_tracker.total_cost >= self.cost_tracker.cost_limit:
+            if self.cost_tracker.limit_reached or session.cost_tracker.limit_reached:
                 error_type = "cost_limit_exceeded"
                 log_telemetry(
                     request_id=request_id,
@@ -298,18 +469,15 @@ class ProductionAgent:
                 return {
                     "success": False,
                     "message": "Cost limit reached. Please try again later.",
-                    "cost_summary": self.cost_tracker.get_summary()
+                    "cost_summary": session.cost_tracker.get_summary()
                 }
             
-            # Start chat if needed
-            if not self.chat:
-                self.chat = self.model.start_chat()
-            
-            # Call Gemini with retry and timeout (30s for LLM)
-            response = call_with_retry(self.chat.send_message, user_message, timeout_seconds=30)
+            # Call Gemini with retry and timeout (30s for LLM, less if the deadline is sooner)
+            with span("llm.initial"):
+                response = self._send(session, user_message)
             
-            # Track cost
-            self.cost_tracker.add_cost(0.002, "gemini_api_call")  # More realistic cost
+            # Track cost from the tokens Gemini reports for this call
+            request_cost += self._track_call_cost(session, response, user_message)
             
             # Check for function calls
             if response.candidates[0].content.parts[0].function_call:
@@ -339,14 +507,15 @@ class ProductionAgent:
                     return {
                         "success": False,
                         "message": f"You don't have permission to use {function_call.name}",
-                        "cost_summary": self.cost_tracker.get_summary()
+                        "cost_summary": session.cost_tracker.get_summary()
                     }
                 
-                # INPUT VALIDATION
+                # INPUT VALIDATION (every tool, against its registered request model)
                 try:
-                    if function_call.name == "analyze_code_submission":
-                        validated = AnalyzeCodeInput(**dict(function_call.args))
-                except Exception as validation_error:
+                    tool = get_tool(function_call.name)
+                    with span("validation"):
+                        request = tool.validate(dict(function_call.args))
+                except ValueError as validation_error:  # unknown tool, or pydantic's ValidationError
                     error_type = "validation_error"
                     log_audit("validation_error", {"error": str(validation_error)})
                     log_telemetry(
@@ -361,24 +530,26 @@ class ProductionAgent:
                     return {
                         "success": False,
                         "message": f"Invalid input: {validation_error}",
-                        "cost_summary": self.cost_tracker.get_summary()
+                        "cost_summary": session.cost_tracker.get_summary()
                     }
                 
+                # Out of time is not a tool failure - check before the breaker counts it
+                deadline.check(function_call.name)
+                
                 # Execute with CIRCUIT BREAKER
                 circuit_breaker = self._get_circuit_breaker(function_call.name)
-                function_result = circuit_breaker.call(
-                    self._execute_function,
-                    function_call.name,
-                    dict(function_call.args)
-                )
+                function_result = circuit_breaker.call(self._execute_function, tool, request)
                 
                 # Send result back
-                response = self.chat.send_message({
-                    "function_response": {
-                        "name": function_call.name,
-                        "response": function_result
-                    }
-                })
+                deadline.check("function response")
+                with span("llm.function_response"):
+                    response = self._send(session, {
+                        "function_response": {
+                            "name": function_call.name,
+                            "response": function_result
+                        }
+                    })
+                request_cost += self._track_call_cost(session, response, str(function_result))
             else:
                 query_type = "conversational"
             
@@ -393,7 +564,7 @@ class ProductionAgent:
                 query_type=query_type,
                 latency_ms=execution_time * 1000,
                 success=True,
-                cost_usd=self.cost_tracker.total_cost / max(1, self.cost_tracker.call_count),
+                cost_usd=request_cost,
                 model_used="gemini-2.0-flash-exp",
                 cache_hit=False,  # Set to True if using cache
                 function_called=function_called,
@@ -404,14 +575,15 @@ class ProductionAgent:
                 "request_id": request_id,
                 "user_id": user_id,
                 "execution_time": execution_time,
-                "cost": self.cost_tracker.total_cost
+                "cost": request_cost,
+                "user_total_cost": session.cost_tracker.total_cost
             })
             
             return {
                 "success": True,
                 "message": response.text,
                 "execution_time": round(execution_time, 2),
-                "cost_summary": self.cost_tracker.get_summary(),
+                "cost_summary": session.cost_tracker.get_summary(),
                 "request_id": request_id
             }
         
@@ -444,18 +616,41 @@ class ProductionAgent:
                 "message": "I encountered an issue processing your request. Please try again.",
                 "error_type": error_type,
                 "execution_time": round(execution_time, 2),
-                "cost_summary": self.cost_tracker.get_summary(),
+                "cost_summary": session.cost_tracker.get_summary(),
                 "request_id": request_id
             }
     
-    def _execute_function(self, function_name: str, arguments: Dict[str, Any]) -> Any:
-        """Execute function with error handling"""
-        tool_func = self.tools.get(function_name)
-        if not tool_func:
-            raise ValueError(f"Unknown function: {function_name}")
-        
-        result = tool_func(**arguments)
-        return result.model_dump()
+    def _send(self, session: UserSession, content, timeout_seconds: float = 30) -> Any:
+        """
+        One chat turn (30s for the LLM, less if the deadline is sooner). If
+        it times out, the session gets a new chat with the history from
+        before the turn, so the abandoned call can't change the history
+        the user's next request sees.
+        """
+        history = list(getattr(session.chat, "history", None) or [])
+        try:
+            return send_with_retry(session.chat, content, timeout_seconds=timeout_seconds)
+        except TimeoutError:
+            session.chat = self.sessions.model.start_chat(history=history)
+            log_audit("chat_reset", {"user_id": session.user_id, "reason": "timeout"})
+            raise
+    
+    def _track_call_cost(self, session: UserSession, response, prompt: str) -> float:
+        """Price one Gemini call and add it to the user's and the global tracker"""
+        usage = usage_from_gemini(response, prompt)
+        cost = calculate_cost(self.MODEL_NAME, usage.input_tokens, usage.output_tokens)
+        try:
+            session.cost_tracker.add_cost(cost, "gemini_api_call", usage)
+        finally:
+            # Always charge the global budget, even if the user's limit tripped
+            self.cost_tracker.add_cost(cost, "gemini_api_call", usage)
+        return cost
+    
+    def _execute_function(self, tool: ToolSpec, request) -> Any:
+        """Run a validated tool call within its timeout (shortened to the request deadline)"""
+        result = run_with_timeout(tool.invoke, timeout_for(tool.timeout_seconds), request)
+        with span("serialize"):
+            return result.model_dump()
 
 
 # ==================== TELEMETRY ANALYSIS HELPER ====================
@@ -464,80 +659,52 @@ def analyze_telemetry_logs(log_file: str = "logs/telemetry.log", hours: int = 24
     """
     Analyze telemetry logs to get system metrics.
     Useful for monitoring dashboard.
+    
+    Incremental: only lines written since the last call are parsed (see
+    src/telemetry_index.py); the window itself is answered from per-minute
+    aggregates.
     """
-    from collections import Counter
-    from datetime import timedelta
+    if not os.path.exists(log_file) and not rotated_files(log_file):
+        print(f"Telemetry log file not found: {log_file}")
+        return
     
-    cutoff_time = datetime.now() - timedelta(hours=hours)
+    stats = TelemetryIndex(log_file).summary(hours=hours)
+    total_requests = stats["total_requests"]
     
-    total_requests = 0
-    successful_requests = 0
-    latencies = []
-    costs = []
-    error_types = Counter()
-    query_types = Counter()
+    if total_requests == 0:
+        print(f"No telemetry data found in last {hours} hours")
+        return
     
-    try:
-        with open(log_file, 'r') as f:
-            for line in f:
-                try:
-                    entry = json.loads(line)
-                    timestamp = datetime.fromisoformat(entry['timestamp'])
-                    
-                    if timestamp > cutoff_time:
-                        total_requests += 1
-                        
-                        if entry['success']:
-                            successful_requests += 1
-                        else:
-                            error_types[entry.get('error_type', 'unknown')] += 1
-                        
-                        latencies.append(entry['latency_ms'])
-                        costs.append(entry.get('cost_usd', 0))
-                        query_types[entry['query_type']] += 1
-                        
-                except json.JSONDecodeError:
-                    continue
-        
-        if total_requests == 0:
-            print(f"No telemetry data found in last {hours} hours")
-            return
-        
-        # Calculate statistics
-        avg_latency = sum(latencies) / len(latencies)
-        p95_latency = sorted(latencies)[int(len(latencies) * 0.95)] if latencies else 0
-        success_rate = (successful_requests / total_requests) * 100
-        error_rate = ((total_requests - successful_requests) / total_requests) * 100
-        
-        print(f"\n{'='*60}")
-        print(f"TELEMETRY ANALYSIS (Last {hours} hours)")
-        print(f"{'='*60}")
-        print(f"\n📊 REQUEST METRICS:")
-        print(f"  Total Requests:    {total_requests}")
-        print(f"  Successful:        {successful_requests} ({success_rate:.1f}%)")
-        print(f"  Failed:            {total_requests - successful_requests} ({error_rate:.1f}%)")
-        
-        print(f"\n⏱️  LATENCY:")
-        print(f"  Average:           {avg_latency:.0f}ms")
-        print(f"  P95:               {p95_latency:.0f}ms")
-        
-        print(f"\n💰 COST:")
-        print(f"  Total:             ${sum(costs):.4f}")
-        print(f"  Average/query:     ${sum(costs)/len(costs):.6f}")
-        
-        print(f"\n📈 QUERY TYPES:")
-        for qtype, count in query_types.most_common():
-            print(f"  {qtype:20} {count:4} ({count/total_requests*100:.1f}%)")
-        
-        if error_types:
-            print(f"\n❌ ERROR TYPES:")
-            for etype, count in error_types.most_common():
-                print(f"  {etype:20} {count:4} ({count/total_requests*100:.1f}%)")
-        
-        print(f"\n{'='*60}\n")
-        
-    except FileNotFoundError:
-        print(f"Telemetry log file not found: {log_file}")
+    latency = stats["latency"]
+    
+    print(f"\n{'='*60}")
+    print(f"TELEMETRY ANALYSIS (Last {hours} hours)")
+    print(f"{'='*60}")
+    print(f"\n📊 REQUEST METRICS:")
+    print(f"  Total Requests:    {total_requests}")
+    print(f"  Successful:        {stats['successful_requests']} ({stats['success_rate']:.1f}%)")
+    print(f"  Failed:            {stats['failed_requests']} ({stats['error_rate']:.1f}%)")
+    
+    print(f"\n⏱️  LATENCY:")
+    print(f"  Average:           {latency['mean_ms']:.0f}ms")
+    print(f"  P95:               {latency['p95_ms']:.0f}ms")
+    print(f"  P99:               {latency['p99_ms']:.0f}ms")
+    
+    print(f"\n💰 COST:")
+    print(f"  Total:             ${stats['total_cost']:.4f}")
+    print(f"  Average/query:     ${stats['avg_cost']:.6f}")
+    
+    print(f"\n📈 QUERY TYPES:")
+    for qtype, count in stats["query_types"].items():
+        print(f"  {qtype:20} {count:4} ({count/total_requests*100:.1f}%)")
+    
+    if stats["error_types"]:
+        print(f"\n❌ ERROR TYPES:")
+        for etype, count in stats["error_types"].items():
+            print(f"  {etype:20} {count:4} ({count/total_requests*100:.1f}%)")
+    
+    print(f"\n{'='*60}\n")
+    return stats
 
 
 if __name__ == "__main__":
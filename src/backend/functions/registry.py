@@ -0,0 +1,169 @@
+"""
+The CodeMentor tools the agents expose to Gemini.
+
+Each tool is registered once with its pydantic request model (see
+src/backend/models/function_models.py); the Gemini function declarations
+are generated from those models instead of being written out by hand in
+every agent, and the agents dispatch through the registry instead of
+if/elif chains. A registered tool also carries the permission a user needs
+to call it, whether its results may be cached and its timeout.
+
+dispatch() looks a call up by name (one dict lookup), validates the
+arguments once with the request model's compiled pydantic-core validator
+and calls the tool with the validated fields, so tools get defaults
+filled in and arguments coerced (Gemini sends integers as floats).
+
+gemini_tool() builds the Tool object once per process, so the Gemini SDK
+is only imported when a model is actually created. compact=True gives the
+token-optimized declarations used by the optimized agent: short tool
+descriptions and no per-field descriptions.
+"""
+
+import functools
+from typing import Any, Callable, Dict, Mapping, Tuple, Type
+
+from pydantic import BaseModel
+
+from src.backend.functions.tools import (
+    analyze_code_submission,
+    get_recommended_problem,
+    track_user_progress
+)
+from src.backend.models.function_models import (
+    CodeSubmissionRequest,
+    ProblemRecommendationRequest,
+    ProgressTrackingRequest
+)
+
+# JSON-schema keys Gemini's function-declaration schema understands
+SCHEMA_KEYS = ("type", "description", "enum", "items", "properties", "required")
+
+
+class Permission:
+    READ = "read"
+    WRITE = "write"
+    ADMIN = "admin"
+
+
+class ToolSpec:
+    """One registered tool and everything needed to declare, authorize, validate and run it"""
+    
+    __slots__ = ("name", "func", "request_model", "validator", "description", "compact_description",
+                 "permission", "cacheable", "timeout_seconds")
+    
+    def __init__(self, name: str, func: Callable, request_model: Type[BaseModel],
+                 description: str, compact_description: str, permission: str = Permission.ADMIN,
+                 cacheable: bool = False, timeout_seconds: float = 10.0):
+        self.name = name
+        self.func = func
+        self.request_model = request_model
+        # Compiled when the model class was created; calling it directly
+        # skips BaseModel.__init__'s Python-level indirection
+        self.validator = request_model.__pydantic_validator__
+        self.description = description
+        self.compact_description = compact_description
+        self.permission = permission
+        self.cacheable = cacheable
+        self.timeout_seconds = timeout_seconds
+    
+    def validate(self, arguments: Mapping[str, Any]) -> BaseModel:
+        """The request model for `arguments`; raises pydantic.ValidationError"""
+        return self.validator.validate_python(arguments)
+    
+    def invoke(self, request: BaseModel) -> Any:
+        """Call the tool with an already validated request"""
+        return self.func(**request.__dict__)
+
+
+TOOLS: Dict[str, ToolSpec] = {}
+
+
+def register(spec: ToolSpec) -> ToolSpec:
+    TOOLS[spec.name] = spec
+    function_declarations.cache_clear()
+    gemini_tool.cache_clear()
+    return spec
+
+
+def get_tool(name: str) -> ToolSpec:
+    spec = TOOLS.get(name)
+    if spec is None:
+        raise ValueError(f"Unknown function: {name}")
+    return spec
+
+
+def dispatch(name: str, arguments: Mapping[str, Any]) -> Any:
+    """Validate `arguments` for tool `name` and call it; ValueError for unknown tools"""
+    spec = get_tool(name)
+    return spec.invoke(spec.validate(arguments))
+
+
+# ==================== DECLARATIONS ====================
+
+def _gemini_schema(schema: Dict[str, Any], compact: bool) -> Dict[str, Any]:
+    """Keep only the JSON-schema keys Gemini accepts (pydantic adds title, default...)"""
+    result = {}
+    for key in SCHEMA_KEYS:
+        if key not in schema or (compact and key == "description"):
+            continue
+        value = schema[key]
+        if key == "items":
+            value = _gemini_schema(value, compact)
+        elif key == "properties":
+            value = {name: _gemini_schema(prop, compact) for name, prop in value.items()}
+        result[key] = value
+    return result
+
+
+def parameters_schema(model: Type[BaseModel], compact: bool = False) -> Dict[str, Any]:
+    """Gemini `parameters` schema of a request model"""
+    schema = _gemini_schema(model.model_json_schema(), compact)
+    schema.pop("description", None)  # the model docstring; the tool has its own
+    schema.setdefault("properties", {})
+    return schema
+
+
+@functools.lru_cache(maxsize=None)
+def function_declarations(compact: bool = False) -> Tuple[Any, ...]:
+    """FunctionDeclarations for every registered tool, built once per process"""
+    from google.generativeai.types import FunctionDeclaration
+    
+    return tuple(
+        FunctionDeclaration(
+            name=spec.name,
+            description=spec.compact_description if compact else spec.description,
+            parameters=parameters_schema(spec.request_model, compact)
+        )
+        for spec in TOOLS.values()
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def gemini_tool(compact: bool = False):
+    """The shared Gemini Tool declaring every registered tool"""
+    from google.generativeai.types import Tool
+    
+    return Tool(function_declarations=list(function_declarations(compact)))
+
+
+# ==================== CODEMENTOR TOOLS ====================
+
+register(ToolSpec(
+    "analyze_code_submission", analyze_code_submission, CodeSubmissionRequest,
+    description="Analyze user's code submission, run tests, detect error patterns, and provide feedback",
+    compact_description="Analyze code, run tests, detect patterns, give feedback",
+    permission=Permission.WRITE, cacheable=True
+))
+register(ToolSpec(
+    "get_recommended_problem", get_recommended_problem, ProblemRecommendationRequest,
+    description="Get next recommended problem based on user's weakness profile. "
+                "Call this when user asks what to practice next.",
+    compact_description="Get next problem based on weaknesses",
+    permission=Permission.READ, cacheable=True
+))
+register(ToolSpec(
+    "track_user_progress", track_user_progress, ProgressTrackingRequest,
+    description="Update user's weakness profile after a problem submission",
+    compact_description="Update weakness scores after submission",
+    permission=Permission.WRITE  # changes the profile: never served from cache
+))
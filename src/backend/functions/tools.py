@@ -2,6 +2,8 @@ import time
 import uuid
 from datetime import datetime
 from typing import List
+from src.deadline import check_deadline
+from src.tracing import span, traced
 from src.backend.models.function_models import (
     CodeSubmissionRequest, CodeAnalysisResponse, TestResult, ErrorPattern,
     ProblemRecommendationRequest, RecommendationResponse, Problem,
@@ -65,6 +67,7 @@ USER_WEAKNESS_PROFILES = {
 
 # ==================== Function 1: Code Analysis ====================
 
+@traced("tool.analyze_code_submission")
 def analyze_code_submission(
     problem_id: str,
     user_code: str,
@@ -85,22 +88,29 @@ def analyze_code_submission(
     """
     start_time = time.time()
     
+    # Don't start work for a request whose deadline already passed
+    check_deadline("analyze_code_submission")
+    
     try:
         # Generate unique submission ID
         submission_id = f"sub_{uuid.uuid4().hex[:8]}"
         
         # Mock test execution (in real app, would use Judge0/Piston)
-        test_results = _run_mock_tests(problem_id, user_code)
+        with span("analyze.run_tests"):
+            test_results = _run_mock_tests(problem_id, user_code)
         all_passed = all(test.passed for test in test_results)
         
         # Detect error patterns (mock analysis)
-        detected_patterns = _detect_error_patterns(user_code, all_passed)
+        with span("analyze.detect_patterns"):
+            detected_patterns = _detect_error_patterns(user_code, all_passed)
         
         # Generate AI feedback (mock for now, will use Gemini later)
-        ai_feedback = _generate_mock_feedback(problem_id, detected_patterns, all_passed)
+        with span("analyze.feedback"):
+            ai_feedback = _generate_mock_feedback(problem_id, detected_patterns, all_passed)
         
         # Estimate complexity (simple heuristic)
-        time_complexity, space_complexity = _estimate_complexity(user_code)
+        with span("analyze.complexity"):
+            time_complexity, space_complexity = _estimate_complexity(user_code)
         
         execution_time = (time.time() - start_time) * 1000  # Convert to ms
         
@@ -236,6 +246,7 @@ def _estimate_complexity(code: str) -> tuple[str, str]:
 
 # ==================== Function 2: Problem Recommendation ====================
 
+@traced("tool.get_recommended_problem")
 def get_recommended_problem(
     user_id: str = "user_001",
     difficulty_level: str = "easy"
@@ -250,6 +261,9 @@ def get_recommended_problem(
     Returns:
         RecommendationResponse with problem details and reasoning
     """
+    # Don't start work for a request whose deadline already passed
+    check_deadline("get_recommended_problem")
+    
     try:
         # Get user's weakness profile
         weaknesses = USER_WEAKNESS_PROFILES.get(user_id, {})
@@ -307,6 +321,7 @@ def get_recommended_problem(
 
 # ==================== Function 3: Progress Tracking ====================
 
+@traced("tool.track_user_progress")
 def track_user_progress(
     user_id: str,
     problem_id: str,
@@ -329,6 +344,9 @@ def track_user_progress(
     Returns:
         ProgressTrackingResponse with updated weakness scores
     """
+    # Don't start work for a request whose deadline already passed
+    check_deadline("track_user_progress")
+    
     try:
         # Get current profile
         profile = USER_WEAKNESS_PROFILES.get(user_id, {}).copy()
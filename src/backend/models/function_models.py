@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Literal, Dict
 from datetime import datetime
 
@@ -7,11 +7,24 @@ from datetime import datetime
 
 class CodeSubmissionRequest(BaseModel):
     """Input model for code analysis"""
-    problem_id: str = Field(description="Problem ID (e.g., 'two-sum', 'reverse-string')")
-    user_code: str = Field(description="User's submitted code as a string")
-    language: Literal["python", "javascript"] = Field(description="Programming language")
+    problem_id: str = Field(min_length=1, max_length=100, description="Problem ID (e.g., 'two-sum', 'reverse-string')")
+    user_code: str = Field(min_length=1, max_length=10000, description="User's submitted code as a string")
+    language: Literal["python", "javascript"] = Field(default="python", description="Programming language")
     user_id: str = Field(default="user_001", description="User identifier")
 
+    @field_validator("problem_id")
+    @classmethod
+    def strip_problem_id(cls, v: str) -> str:
+        if not v.strip():
+            raise ValueError("problem_id cannot be empty")
+        return v.strip()
+
+    @field_validator("language", mode="before")
+    @classmethod
+    def lowercase_language(cls, v):
+        # Models often send "Python" / "JavaScript"
+        return v.strip().lower() if isinstance(v, str) else v
+
 
 class TestResult(BaseModel):
     """Individual test case result"""
@@ -93,12 +106,12 @@ class RecommendationResponse(BaseModel):
 
 class ProgressTrackingRequest(BaseModel):
     """Input model for progress tracking"""
-    user_id: str = Field(default="user_001", description="User identifier")
-    problem_id: str
+    user_id: str = Field(description="User identifier")
+    problem_id: str = Field(description="Problem that was attempted")
     detected_patterns: List[str] = Field(description="Error pattern types detected")
-    time_taken_minutes: float
-    attempts_count: int
-    solved_correctly: bool
+    time_taken_minutes: float = Field(description="Time spent on problem in minutes")
+    attempts_count: int = Field(description="Number of attempts made")
+    solved_correctly: bool = Field(description="Whether problem was solved correctly")
 
 
 class WeaknessScore(BaseModel):
@@ -0,0 +1,113 @@
+"""
+Shared token accounting and pricing.
+
+Every cost tracker (router providers, OptimizedCodeMentorAgent,
+ProductionAgent) prices calls through calculate_cost() so the numbers are
+comparable. Token counts come from the vendor's response metadata when it
+is available; estimate_tokens() is the local fallback.
+"""
+
+import functools
+import re
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+# USD per 1M tokens
+MODEL_PRICING = {
+    # Gemini
+    "models/gemini-2.5-flash": {"input": 0.30, "output": 2.50},
+    "models/gemini-2.0-flash-exp": {"input": 0.10, "output": 0.40},
+    "models/gemini-1.5-flash": {"input": 0.075, "output": 0.30},
+    # OpenAI
+    "gpt-4o": {"input": 2.50, "output": 10.00},
+    "gpt-4o-mini": {"input": 0.15, "output": 0.60},
+    # Anthropic
+    "claude-sonnet-4-20250514": {"input": 3.00, "output": 15.00},
+    "claude-haiku-3-5-20241022": {"input": 0.80, "output": 4.00},
+}
+
+# Word runs, number runs, and single punctuation marks - close to how BPE
+# vocabularies split English and code
+_TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding():
+    """tiktoken's cl100k_base, loaded on first use (it may download its vocabulary); None if unavailable"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # Optional dependency (or its vocab download) unavailable
+        return None
+
+
+@dataclass
+class TokenUsage:
+    input_tokens: int = 0
+    output_tokens: int = 0
+    estimated: bool = False  # True when counted locally, not reported by the vendor
+    
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+
+def estimate_tokens(text: str) -> int:
+    """Count tokens locally (tiktoken if installed, otherwise a regex split)"""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    
+    # Long words are usually several BPE tokens: charge one per 4 chars
+    return sum(max(1, len(piece) // 4) for piece in _TOKEN_PATTERN.findall(text))
+
+
+def calculate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """USD cost of a call; models without a price (e.g. local Ollama) are free"""
+    pricing = MODEL_PRICING.get(model) or MODEL_PRICING.get(f"models/{model}")
+    if pricing is None:
+        return 0.0
+    return (input_tokens / 1_000_000) * pricing["input"] + (output_tokens / 1_000_000) * pricing["output"]
+
+
+def usage_from_gemini(response: Any, prompt: Optional[str] = None) -> TokenUsage:
+    """
+    Token usage of a google.generativeai response.
+    
+    Reads response.usage_metadata; if it is missing, estimates from the
+    prompt (when given) and the response text.
+    """
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is not None and getattr(metadata, "total_token_count", 0):
+        return TokenUsage(
+            input_tokens=metadata.prompt_token_count or 0,
+            output_tokens=metadata.candidates_token_count or 0
+        )
+    
+    try:
+        completion = response.text
+    except Exception:  # Function-call responses have no text part
+        completion = ""
+    return TokenUsage(
+        input_tokens=estimate_tokens(prompt or ""),
+        output_tokens=estimate_tokens(completion),
+        estimated=True
+    )
+
+
+def usage_from_ollama(data: dict, prompt: str, completion: str) -> TokenUsage:
+    """Token usage from an Ollama /api/generate payload (final chunk when streaming)"""
+    if "prompt_eval_count" in data or "eval_count" in data:
+        return TokenUsage(
+            input_tokens=data.get("prompt_eval_count", 0),
+            output_tokens=data.get("eval_count", 0)
+        )
+    
+    return TokenUsage(
+        input_tokens=estimate_tokens(prompt),
+        output_tokens=estimate_tokens(completion),
+        estimated=True
+    )
@@ -0,0 +1,164 @@
+"""
+Per-request deadlines.
+
+A Deadline is created once per request (in the agents' send_message) and
+carried down to tools, the LLM router and providers. Each layer sizes its
+own timeout from what is left (`deadline.timeout(cap)`) and asks
+`deadline.can_fit(seconds)` before starting a retry or fallback, so no work
+is started for a client that has already given up.
+
+Layers that have an explicit API take the deadline as an argument; tools
+and providers read the ambient one set by `deadline_scope()`.
+
+run_with_timeout() bounds a blocking call from any thread (or, via
+run_with_timeout_async(), from an event loop). Python threads can't be
+killed, so cancellation is cooperative: the call runs under a deadline
+that expires with the timeout, and every check_deadline() /
+deadline-sized timeout inside it stops further work. Each call gets its own
+daemon thread rather than a slot in a fixed pool, so calls that hang past
+their timeout never make later calls queue (and spend their own timeout
+waiting for a worker).
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's deadline passed before the operation could run"""
+
+
+class Deadline:
+    """Absolute point in time (monotonic clock) by which a request must finish"""
+    
+    def __init__(self, timeout_seconds: float):
+        self.timeout_seconds = timeout_seconds
+        self.expires_at = time.monotonic() + timeout_seconds
+    
+    def remaining(self) -> float:
+        """Seconds left (never negative)"""
+        return max(0.0, self.expires_at - time.monotonic())
+    
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+    
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Timeout for the next operation: time left, capped at `cap`"""
+        remaining = self.remaining()
+        return remaining if cap is None else min(cap, remaining)
+    
+    def can_fit(self, seconds: float) -> bool:
+        """Whether an operation expected to take `seconds` can still finish"""
+        return self.remaining() > seconds
+    
+    def check(self, operation: str = "request"):
+        """Raise DeadlineExceeded if no time is left"""
+        if self.expired:
+            raise DeadlineExceeded(
+                f"{operation} skipped: {self.timeout_seconds:.1f}s deadline exceeded"
+            )
+    
+    def __repr__(self):
+        return f"Deadline(remaining={self.remaining():.3f}s)"
+
+
+_current = contextvars.ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Deadline of the request being served on this thread/task, if any"""
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """Make `deadline` the ambient deadline for the enclosed block"""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def check_deadline(operation: str = "request"):
+    """Raise DeadlineExceeded if the ambient deadline has passed (no-op without one)"""
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check(operation)
+
+
+def timeout_for(cap: float) -> float:
+    """`cap`, shortened to the ambient deadline's remaining time if there is one"""
+    deadline = _current.get()
+    return cap if deadline is None else deadline.timeout(cap)
+
+
+# ==================== TIMEOUTS ====================
+
+def _run_scoped(func: Callable, deadline: Deadline, args: tuple, kwargs: dict) -> Any:
+    with deadline_scope(deadline):
+        return func(*args, **kwargs)
+
+
+def _start(func: Callable, deadline: Deadline, args: tuple, kwargs: dict) -> Future:
+    """Run the call on a new daemon thread, in a copy of the caller's context"""
+    future = Future()
+    context = contextvars.copy_context()
+    
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = context.run(_run_scoped, func, deadline, args, kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+    
+    threading.Thread(target=run, name="deadline", daemon=True).start()
+    return future
+
+
+def _attempt_deadline(timeout_seconds: float) -> Deadline:
+    """Deadline for one attempt: the timeout, or the request deadline if sooner"""
+    attempt = Deadline(timeout_seconds)
+    outer = _current.get()
+    if outer is not None and outer.expires_at < attempt.expires_at:
+        return outer
+    return attempt
+
+
+def run_with_timeout(func: Callable, timeout_seconds: float, *args, **kwargs) -> Any:
+    """
+    Call func(*args, **kwargs), raising TimeoutError after timeout_seconds.
+    
+    Works from any thread (unlike SIGALRM). The call runs on its own
+    daemon thread in a copy of the caller's context, under a deadline that
+    expires with the timeout so it stops at its next cancellation point.
+    """
+    deadline = _attempt_deadline(timeout_seconds)
+    future = _start(func, deadline, args, kwargs)
+    
+    try:
+        return future.result(timeout=deadline.remaining())
+    except FutureTimeoutError:
+        name = getattr(func, "__name__", "call")
+        raise TimeoutError(f"{name} exceeded {timeout_seconds:.1f}s timeout") from None
+
+
+async def run_with_timeout_async(func: Callable, timeout_seconds: float, *args, **kwargs) -> Any:
+    """run_with_timeout for asyncio: awaits the blocking call without blocking the loop"""
+    deadline = _attempt_deadline(timeout_seconds)
+    future = asyncio.wrap_future(_start(func, deadline, args, kwargs))
+    
+    try:
+        return await asyncio.wait_for(future, deadline.remaining())
+    except asyncio.TimeoutError:
+        name = getattr(func, "__name__", "call")
+        raise TimeoutError(f"{name} exceeded {timeout_seconds:.1f}s timeout") from None
@@ -0,0 +1,398 @@
+"""
+Leveled, rate-limited logging for request hot paths.
+
+Call sites use plain `logging` with %-style arguments, so a disabled level
+costs one integer compare: no string formatting and no I/O. Loggers from
+get_logger() additionally carry a SamplingFilter, so an enabled DEBUG level
+or an error storm cannot flood the handlers.
+
+AsyncBatchHandler moves the file writes themselves off the request path:
+emit() is an append to an in-memory buffer, and a background thread does the
+serialization, batching, fsync and (optionally) size-based rotation with
+gzip compression. get_stream_logger() wires one such handler to a dedicated,
+non-propagating logger per output stream.
+"""
+
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from collections import deque
+from typing import List
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is the fallback
+    orjson = None
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Sample DEBUG records and rate-limit repeats of everything else.
+    
+    - DEBUG: only every `debug_every`-th record per call site passes.
+    - INFO and above: each call site (logger + message template) may emit
+      `max_per_second` records per second; the rest are dropped and counted,
+      and the next record that gets through reports how many were dropped.
+    """
+    
+    def __init__(self, max_per_second: float = 5.0, debug_every: int = 1):
+        super().__init__()
+        self.max_per_second = max_per_second
+        self.debug_every = max(1, debug_every)
+        self._lock = threading.Lock()
+        self._sites = {}  # (logger, msg) -> [tokens, last_refill, seen, dropped]
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                site = self._sites[key] = [self.max_per_second, now, 0, 0]
+            site[2] += 1
+            
+            if record.levelno <= logging.DEBUG:
+                allowed = (site[2] - 1) % self.debug_every == 0
+            else:
+                site[0] = min(self.max_per_second, site[0] + (now - site[1]) * self.max_per_second)
+                site[1] = now
+                allowed = site[0] >= 1
+                if allowed:
+                    site[0] -= 1
+            
+            if not allowed:
+                site[3] += 1
+                return False
+            dropped, site[3] = site[3], 0
+        
+        if dropped and record.levelno > logging.DEBUG:
+            record.msg = f"{record.msg} [{dropped} similar messages suppressed]"
+        return True
+
+
+def get_logger(name: str, max_per_second: float = 5.0, debug_every: int = 1) -> logging.Logger:
+    """logging.getLogger(name) with a SamplingFilter attached (once)"""
+    logger = logging.getLogger(name)
+    if not any(isinstance(f, SamplingFilter) for f in logger.filters):
+        logger.addFilter(SamplingFilter(max_per_second, debug_every))
+    return logger
+
+
+def dumps_line(obj) -> bytes:
+    """Serialize one record as a JSON line, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, default=str) + "\n").encode("utf-8")
+
+
+class AsyncBatchHandler(logging.Handler):
+    """
+    File handler that keeps serialization and I/O off the logging thread.
+    
+    emit() only appends the record to a bounded buffer. A daemon thread
+    drains it in batches of up to `batch_size` (or whatever arrived within
+    `flush_interval` seconds), serializes them - records whose msg is a dict
+    become JSON lines, anything else goes through the formatter - and writes
+    each batch with a single write(). fsync runs at most every
+    `fsync_interval` seconds, and on flush()/close().
+    
+    When the buffer already holds `capacity` records, `overflow` decides:
+    - "drop_oldest": discard the oldest queued record (default, never blocks)
+    - "drop_newest": discard the incoming record
+    - "block": wait up to `block_timeout` seconds for room, then drop it
+    Every discarded record is counted in `dropped`.
+    
+    With `max_bytes` and `backup_count` set, a batch that would push the file
+    past `max_bytes` first rotates it (file -> file.1 -> ... -> file.N, like
+    RotatingFileHandler); with `compress` the rotated files are gzipped
+    (file.1.gz, ...). Rotation runs on the writer thread, so the buffer
+    absorbs the pause.
+    
+    With `segment_seconds` instead, the file is time-partitioned: when a
+    batch is written in a new period the active file is closed as
+    file.YYYYmmdd-HHMMSS (the start of its period in UTC, so names never
+    repeat across a DST change; .gz with `compress`), and only the newest `backup_count` segments are kept
+    (0 keeps all). rotated_files() lists both kinds, oldest first.
+    
+    Dict messages are serialized later on the writer thread, so callers must
+    not mutate them after logging.
+    """
+    
+    OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+    
+    def __init__(self, filename: str, capacity: int = 10000, batch_size: int = 256,
+                 flush_interval: float = 0.5, fsync_interval: float = 5.0,
+                 overflow: str = "drop_oldest", block_timeout: float = 0.1,
+                 max_bytes: int = 0, backup_count: int = 0, compress: bool = False,
+                 segment_seconds: int = 0):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {self.OVERFLOW_POLICIES}, got {overflow!r}")
+        if max_bytes and segment_seconds:
+            raise ValueError("max_bytes and segment_seconds are mutually exclusive")
+        super().__init__()
+        self.filename = os.path.abspath(filename)
+        self.capacity = max(1, capacity)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+        self.segment_seconds = segment_seconds
+        self.written = 0
+        self.dropped = 0
+        
+        self._buffer = deque()
+        self._cond = threading.Condition(threading.Lock())
+        self._in_flight = 0
+        self._flush_requested = False
+        self._closed = False
+        self._stream = self._open()
+        self._segment = self._segment_of(os.path.getmtime(self.filename)) if self._stream.tell() else None
+        self._last_fsync = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"log-writer:{os.path.basename(filename)}",
+            daemon=True
+        )
+        self._thread.start()
+    
+    def _open(self):
+        return open(self.filename, "ab")
+    
+    # ----- producer side -----
+    
+    def emit(self, record: logging.LogRecord):
+        with self._cond:
+            if self._closed:
+                self.dropped += 1
+                return
+            
+            if len(self._buffer) >= self.capacity:
+                if self.overflow == "drop_oldest":
+                    self._buffer.popleft()
+                    self.dropped += 1
+                elif self.overflow == "drop_newest":
+                    self.dropped += 1
+                    return
+                else:
+                    has_room = self._cond.wait_for(
+                        lambda: len(self._buffer) < self.capacity or self._closed,
+                        self.block_timeout
+                    )
+                    if not has_room or self._closed:
+                        self.dropped += 1
+                        return
+            
+            self._buffer.append(record)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+    
+    def flush(self):
+        """Block until every record queued so far is written and fsynced"""
+        if threading.current_thread() is self._thread:
+            return
+        with self._cond:
+            if self._closed:
+                return
+            self._flush_requested = True
+            self._cond.notify_all()
+            self._cond.wait_for(
+                lambda: not self._flush_requested or not self._thread.is_alive(),
+                timeout=5.0
+            )
+    
+    def close(self):
+        with self._cond:
+            already_closed = self._closed
+            self._closed = True
+            self._cond.notify_all()
+        if not already_closed:
+            if threading.current_thread() is not self._thread:
+                self._thread.join(timeout=5.0)
+            self._stream.close()
+        super().close()
+    
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "queued": len(self._buffer),
+                "written": self.written,
+                "dropped": self.dropped
+            }
+    
+    # ----- writer thread -----
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                if not (self._closed or self._flush_requested or len(self._buffer) >= self.batch_size):
+                    self._cond.wait(self.flush_interval)
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                self._in_flight = len(batch)
+                drained = not self._buffer
+                force_sync = drained and (self._closed or self._flush_requested)
+                closing = drained and self._closed
+                self._cond.notify_all()  # room for producers blocked on a full buffer
+            
+            if batch or force_sync:
+                self._write_batch(batch, force_sync)
+            
+            with self._cond:
+                self._in_flight = 0
+                if force_sync:
+                    self._flush_requested = False
+                    self._cond.notify_all()
+            if closing:
+                return
+    
+    def _serialize(self, record: logging.LogRecord) -> bytes:
+        if isinstance(record.msg, dict) and not record.args:
+            return dumps_line(record.msg)
+        return (self.format(record) + "\n").encode("utf-8")
+    
+    def _write_batch(self, batch, force_sync: bool = False):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self._serialize(record))
+            except Exception:
+                self.handleError(record)
+        
+        try:
+            if lines:
+                payload = b"".join(lines)
+                if self.segment_seconds:
+                    self._maybe_roll_segment()
+                elif self._should_rotate(len(payload)):
+                    self._rotate()
+                self._stream.write(payload)
+                self._stream.flush()
+                self.written += len(lines)
+            now = time.monotonic()
+            if force_sync or now - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._stream.fileno())
+                self._last_fsync = now
+        except Exception:
+            self.handleError(batch[-1] if batch else logging.makeLogRecord({}))
+    
+    # ----- rotation -----
+    
+    def _should_rotate(self, incoming: int) -> bool:
+        if self.max_bytes <= 0 or self.backup_count <= 0:
+            return False
+        size = self._stream.tell()
+        return size > 0 and size + incoming > self.max_bytes
+    
+    def _rotated_name(self, index: int) -> str:
+        name = f"{self.filename}.{index}"
+        return name + ".gz" if self.compress else name
+    
+    def _rotate(self):
+        self._stream.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = self._rotated_name(i)
+            if os.path.exists(src):
+                os.replace(src, self._rotated_name(i + 1))
+        
+        if self.compress:
+            with open(self.filename, "rb") as src, gzip.open(self._rotated_name(1), "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.filename)
+        else:
+            os.replace(self.filename, self._rotated_name(1))
+        
+        self._stream = self._open()
+    
+    def _segment_of(self, timestamp: float):
+        if not self.segment_seconds:
+            return None
+        return int(timestamp // self.segment_seconds) * self.segment_seconds
+    
+    def _maybe_roll_segment(self):
+        segment = self._segment_of(time.time())
+        if self._segment is not None and segment != self._segment and self._stream.tell():
+            self._roll_segment()
+        self._segment = segment
+    
+    def _roll_segment(self):
+        self._stream.close()
+        suffix = time.strftime("%Y%m%d-%H%M%S", time.gmtime(self._segment))
+        closed = f"{self.filename}.{suffix}" + (".gz" if self.compress else "")
+        
+        # A period can close twice if the clock is set back; append to the
+        # earlier segment rather than overwrite it (gzip members concatenate)
+        if self.compress:
+            with open(self.filename, "rb") as src, gzip.open(closed, "ab") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.filename)
+        elif os.path.exists(closed):
+            with open(self.filename, "rb") as src, open(closed, "ab") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.filename)
+        else:
+            os.replace(self.filename, closed)
+        
+        if self.backup_count > 0:
+            for old in rotated_files(self.filename)[:-self.backup_count]:
+                os.remove(old)
+        
+        self._stream = self._open()
+
+
+def get_stream_logger(name: str, filename: str, level: int = logging.INFO, **handler_kwargs) -> logging.Logger:
+    """
+    Logger for one dedicated output stream (audit, telemetry, ...).
+    
+    It does not propagate, so its records land only in `filename` and never
+    in the root handlers or another stream's file. handler_kwargs go to
+    AsyncBatchHandler. Calling it again for the same file reuses the handler.
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    logger.propagate = False
+    
+    path = os.path.abspath(filename)
+    if not any(isinstance(h, AsyncBatchHandler) and h.filename == path for h in logger.handlers):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        logger.addHandler(AsyncBatchHandler(path, **handler_kwargs))
+    return logger
+
+
+_ROTATED_SUFFIX = re.compile(r"^\.(?:(\d+)|(\d{8}-\d{6}))(?:\.gz)?$")
+
+
+def rotated_files(filename: str) -> List[str]:
+    """
+    Closed files of a log written by AsyncBatchHandler, oldest first.
+    
+    Covers size rotation (file.N, file.N.gz: higher N is older) and time
+    segments (file.YYYYmmdd-HHMMSS[.gz]). The active file is not included.
+    """
+    path = os.path.abspath(filename)
+    directory, base = os.path.split(path)
+    numbered, dated = [], []
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        if not name.startswith(base):
+            continue
+        match = _ROTATED_SUFFIX.match(name[len(base):])
+        if match is None:
+            continue
+        full = os.path.join(directory, name)
+        if match.group(1) is not None:
+            numbered.append((-int(match.group(1)), full))
+        else:
+            dated.append((match.group(2), full))
+    return [p for _, p in sorted(numbered)] + [p for _, p in sorted(dated)]
@@ -0,0 +1,238 @@
+"""
+Local history of benchmark and regression runs.
+
+Every run of benchmark.py, microbench.py and tests/test_regression.py is
+appended to a SQLite database (logs/perf_history.db, or $PERF_HISTORY_DB)
+with the git commit it ran on. Runs against the fake Gemini backend are
+kept apart from live runs.
+
+check() is the regression gate: a metric regresses when it is worse than
+the median of the last `window` comparable runs by more than `k` robust
+standard deviations (1.4826 * MAD) and by more than `min_relative` of the
+median. The baseline therefore follows the code as it changes, and noisy
+metrics get wider bounds than stable ones. With fewer than `min_runs` runs
+of history there is no verdict.
+
+    python -m src.perf_history                    # trends for every suite
+    python -m src.perf_history regression --last 10
+    python -m src.perf_history benchmark.optimized --metric p95_latency
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_PATH = Path(__file__).resolve().parents[1] / "logs" / "perf_history.db"
+
+# Everything else is treated as lower-is-better (latency, cost, error rate...)
+HIGHER_IS_BETTER = {
+    "accuracy", "successful", "successful_queries", "quality_pass",
+    "ops_per_sec", "achieved_rps", "max_sustainable_rps", "cost_reduction_percent",
+    "latency_improvement_percent"
+}
+
+SPARK = "▁▂▃▄▅▆▇█"
+
+
+def git_commit(cwd: Optional[str] = None) -> Tuple[str, bool]:
+    """(HEAD commit, working tree has uncommitted changes); ("unknown", False) outside git"""
+    cwd = cwd or str(Path(__file__).resolve().parents[1])
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=cwd, capture_output=True,
+                                text=True, timeout=10, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=cwd,
+                                capture_output=True, text=True, timeout=30, check=True).stdout
+    except (OSError, subprocess.SubprocessError):
+        return "unknown", False
+    return commit, bool(status.strip())
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.rsplit(".", 1)[-1] in HIGHER_IS_BETTER
+
+
+class PerfHistory:
+    """SQLite store of runs (suite, commit, backend) and their numeric metrics"""
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = str(path or os.getenv("PERF_HISTORY_DB") or DEFAULT_PATH)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, suite TEXT NOT NULL, commit_sha TEXT NOT NULL, "
+            "dirty INTEGER NOT NULL, backend TEXT NOT NULL, recorded_at REAL NOT NULL, metadata TEXT);"
+            "CREATE TABLE IF NOT EXISTS metrics ("
+            "run_id INTEGER NOT NULL REFERENCES runs(id), name TEXT NOT NULL, value REAL NOT NULL, "
+            "PRIMARY KEY (run_id, name));"
+            "CREATE INDEX IF NOT EXISTS idx_runs_suite ON runs(suite, backend, recorded_at);"
+        )
+        self._conn.commit()
+    
+    def record_run(self, suite: str, metrics: Dict[str, Any], backend: str = "live",
+                   commit: Optional[str] = None, dirty: Optional[bool] = None,
+                   metadata: Optional[Dict[str, Any]] = None, recorded_at: Optional[float] = None) -> int:
+        """Store one run; non-numeric metric values are ignored. Returns the run id."""
+        if commit is None:
+            commit, detected_dirty = git_commit()
+            dirty = detected_dirty if dirty is None else dirty
+        numeric = {
+            name: float(value) for name, value in metrics.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        }
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (suite, commit_sha, dirty, backend, recorded_at, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+                (suite, commit, int(bool(dirty)), backend, recorded_at or time.time(),
+                 json.dumps(metadata) if metadata else None)
+            )
+            run_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO metrics (run_id, name, value) VALUES (?, ?, ?)",
+                [(run_id, name, value) for name, value in numeric.items()]
+            )
+            self._conn.commit()
+        return run_id
+    
+    def runs(self, suite: str, backend: str = "live", limit: int = 20,
+             before_run: Optional[int] = None) -> List[Dict[str, Any]]:
+        """The last `limit` runs of a suite (oldest first), each with its metrics"""
+        query = "SELECT id, commit_sha, dirty, recorded_at FROM runs WHERE suite = ? AND backend = ?"
+        params: List[Any] = [suite, backend]
+        if before_run is not None:
+            query += " AND id < ?"
+            params.append(before_run)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            runs = []
+            for run_id, commit, dirty, recorded_at in reversed(rows):
+                metrics = dict(self._conn.execute(
+                    "SELECT name, value FROM metrics WHERE run_id = ?", (run_id,)
+                ).fetchall())
+                runs.append({"id": run_id, "commit": commit, "dirty": bool(dirty),
+                             "recorded_at": recorded_at, "metrics": metrics})
+        return runs
+    
+    def suites(self) -> List[Tuple[str, str]]:
+        """(suite, backend) pairs that have runs"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT DISTINCT suite, backend FROM runs ORDER BY suite, backend"
+            ).fetchall()
+    
+    def check(self, suite: str, metrics: Dict[str, Any], backend: str = "live",
+              gated: Optional[Iterable[str]] = None, window: int = 20, min_runs: int = 5,
+              k: float = 3.0, min_relative: float = 0.10,
+              min_absolute: Optional[Dict[str, float]] = None,
+              before_run: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Compare `metrics` with the last `window` runs of the suite. Returns
+        {metric: {value, median, bound, history, regressed}} for every gated
+        metric with at least `min_runs` past values. min_absolute gives a
+        per-metric smallest margin, for rates whose history is all zeros.
+        Call it before record_run(), or pass before_run= to leave the run
+        itself out.
+        """
+        history = self.runs(suite, backend, window, before_run)
+        names = list(gated) if gated is not None else [
+            name for name, value in metrics.items() if isinstance(value, (int, float)) and not isinstance(value, bool)
+        ]
+        
+        verdicts = {}
+        for name in names:
+            if name not in metrics:
+                continue
+            past = [run["metrics"][name] for run in history if name in run["metrics"]]
+            if len(past) < min_runs:
+                continue
+            median = statistics.median(past)
+            mad = statistics.median(abs(v - median) for v in past)
+            margin = max(k * 1.4826 * mad, min_relative * abs(median), (min_absolute or {}).get(name, 0.0))
+            value = float(metrics[name])
+            if higher_is_better(name):
+                bound = median - margin
+                regressed = value < bound
+            else:
+                bound = median + margin
+                regressed = value > bound
+            verdicts[name] = {
+                "value": value,
+                "median": median,
+                "bound": bound,
+                "history": len(past),
+                "regressed": regressed
+            }
+        return verdicts
+    
+    def close(self):
+        self._conn.close()
+
+
+def format_verdicts(verdicts: Dict[str, Dict[str, Any]], indent: str = "  ") -> str:
+    lines = []
+    for name, v in verdicts.items():
+        status = "REGRESSED" if v["regressed"] else "ok"
+        direction = "≥" if higher_is_better(name) else "≤"
+        lines.append(f"{indent}{name:28} {status:10} {v['value']:.6g} (median of last {v['history']}: "
+                     f"{v['median']:.6g}, bound {direction} {v['bound']:.6g})")
+    return "\n".join(lines)
+
+
+def sparkline(values: List[float]) -> str:
+    if not values:
+        return ""
+    low, high = min(values), max(values)
+    if high == low:
+        return SPARK[0] * len(values)
+    return "".join(SPARK[int((v - low) / (high - low) * (len(SPARK) - 1))] for v in values)
+
+
+def print_trends(history: PerfHistory, suite: Optional[str] = None, metric: Optional[str] = None,
+                 last: int = 20):
+    """Per-metric trend lines: sparkline, first/median/latest over the last runs"""
+    for name, backend in history.suites():
+        if suite and name != suite:
+            continue
+        runs = history.runs(name, backend, last)
+        print(f"\n{name} [{backend}] - {len(runs)} run(s), latest {runs[-1]['commit'][:10]}"
+              f"{'+dirty' if runs[-1]['dirty'] else ''}")
+        metric_names = sorted({m for run in runs for m in run["metrics"]})
+        for metric_name in metric_names:
+            if metric and metric not in metric_name:
+                continue
+            values = [run["metrics"][metric_name] for run in runs if metric_name in run["metrics"]]
+            median = statistics.median(values)
+            latest = values[-1]
+            change = (latest - median) / abs(median) * 100 if median else 0.0
+            print(f"  {metric_name:44} {sparkline(values):{last}}  median {median:<10.4g} "
+                  f"latest {latest:<10.4g} {change:+6.1f}%")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Performance history trends")
+    parser.add_argument("suite", nargs="?", help="only this suite (e.g. regression, benchmark.optimized)")
+    parser.add_argument("--metric", help="only metrics whose name contains this")
+    parser.add_argument("--last", type=int, default=20, help="number of recent runs")
+    parser.add_argument("--db", help="history database (default logs/perf_history.db)")
+    args = parser.parse_args(argv)
+    
+    history = PerfHistory(args.db)
+    if not history.suites():
+        print(f"No runs recorded in {history.path}")
+        return
+    print_trends(history, args.suite, args.metric, args.last)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Shared statistics for benchmarks and telemetry.
+
+One definition of a percentile for the whole repo: quantile() interpolates
+linearly between closest ranks (the same as numpy's default and Excel's
+PERCENTILE.INC), so p95 of 10 samples is well defined and never indexes
+outside the data. Timing uses time.perf_counter_ns, which is monotonic and
+has nanosecond resolution, instead of time.time().
+
+describe() is what benchmark reports are built from: warm-up exclusion,
+Tukey outlier detection and percentile-bootstrap confidence intervals, so
+a claimed improvement can be checked against run-to-run noise
+(compare_samples()).
+"""
+
+import math
+import random
+import statistics
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+
+def now_ns() -> int:
+    return time.perf_counter_ns()
+
+
+def elapsed_ms(start_ns: int) -> float:
+    """Milliseconds since a now_ns() reading"""
+    return (time.perf_counter_ns() - start_ns) / 1e6
+
+
+def quantile(values: Sequence[float], q: float, is_sorted: bool = False) -> float:
+    """Linearly interpolated quantile, q in [0, 1]; 0.0 for no data"""
+    if not values:
+        return 0.0
+    data = values if is_sorted else sorted(values)
+    position = (len(data) - 1) * min(max(q, 0.0), 1.0)
+    lower = math.floor(position)
+    upper = min(lower + 1, len(data) - 1)
+    return data[lower] + (data[upper] - data[lower]) * (position - lower)
+
+
+def exclude_warmup(values: Sequence[float], warmup: int) -> List[float]:
+    """Drop the first `warmup` samples (cold caches, connection setup, JIT...)"""
+    return list(values[warmup:])
+
+
+def outliers(values: Sequence[float], k: float = 1.5) -> Dict[str, object]:
+    """Samples outside Tukey's fences [Q1 - k*IQR, Q3 + k*IQR]"""
+    if len(values) < 4:
+        return {"low": [], "high": [], "fences": None}
+    data = sorted(values)
+    q1, q3 = quantile(data, 0.25, True), quantile(data, 0.75, True)
+    iqr = q3 - q1
+    low_fence, high_fence = q1 - k * iqr, q3 + k * iqr
+    return {
+        "low": [v for v in data if v < low_fence],
+        "high": [v for v in data if v > high_fence],
+        "fences": [low_fence, high_fence]
+    }
+
+
+def bootstrap_ci(values: Sequence[float], statistic: Callable[[List[float]], float] = statistics.mean,
+                 confidence: float = 0.95, resamples: int = 1000, seed: int = 0) -> Optional[List[float]]:
+    """Percentile-bootstrap confidence interval of `statistic`; None for fewer than 2 samples"""
+    if len(values) < 2:
+        return None
+    rng = random.Random(seed)
+    data = list(values)
+    n = len(data)
+    estimates = sorted(statistic([data[rng.randrange(n)] for _ in range(n)]) for _ in range(resamples))
+    alpha = (1 - confidence) / 2
+    return [quantile(estimates, alpha, True), quantile(estimates, 1 - alpha, True)]
+
+
+def describe(values: Sequence[float], warmup: int = 0, ci: bool = True,
+             resamples: int = 1000, seed: int = 0) -> Dict[str, object]:
+    """Summary statistics of a latency (or any) sample after warm-up exclusion"""
+    data = sorted(exclude_warmup(values, warmup))
+    if not data:
+        return {"n": 0, "warmup_excluded": min(warmup, len(values))}
+    
+    summary = {
+        "n": len(data),
+        "warmup_excluded": min(warmup, len(values)),
+        "mean": statistics.mean(data),
+        "median": quantile(data, 0.50, True),
+        "p95": quantile(data, 0.95, True),
+        "p99": quantile(data, 0.99, True),
+        "min": data[0],
+        "max": data[-1],
+        "stdev": statistics.stdev(data) if len(data) > 1 else 0.0
+    }
+    found = outliers(data)
+    summary["outliers"] = len(found["low"]) + len(found["high"])
+    if ci:
+        summary["mean_ci95"] = bootstrap_ci(data, statistics.mean, resamples=resamples, seed=seed)
+        summary["p95_ci95"] = bootstrap_ci(data, lambda xs: quantile(xs, 0.95), resamples=resamples, seed=seed)
+    return summary
+
+
+def compare_samples(baseline: Sequence[float], candidate: Sequence[float],
+                    resamples: int = 1000, seed: int = 0) -> Dict[str, object]:
+    """
+    Relative change of the mean from baseline to candidate (negative is
+    lower), with a bootstrap CI. `significant` is True when the CI excludes
+    zero, i.e. the difference is larger than resampling noise.
+    """
+    if not baseline or not candidate:
+        return {"change_percent": None, "ci95_percent": None, "significant": False}
+    
+    base_mean = statistics.mean(baseline)
+    change = (statistics.mean(candidate) - base_mean) / base_mean * 100 if base_mean else 0.0
+    
+    rng = random.Random(seed)
+    b, c = list(baseline), list(candidate)
+    changes = []
+    for _ in range(resamples):
+        b_mean = statistics.mean([b[rng.randrange(len(b))] for _ in b])
+        c_mean = statistics.mean([c[rng.randrange(len(c))] for _ in c])
+        changes.append((c_mean - b_mean) / b_mean * 100 if b_mean else 0.0)
+    changes.sort()
+    ci = [quantile(changes, 0.025, True), quantile(changes, 0.975, True)]
+    return {
+        "change_percent": change,
+        "ci95_percent": ci,
+        "significant": ci[0] > 0 or ci[1] < 0
+    }
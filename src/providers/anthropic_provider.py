@@ -1,43 +1,74 @@
 from anthropic import Anthropic
 import time
+from typing import Iterator, Optional, Union
+from ..cost_model import calculate_cost
+from ..deadline import check_deadline, timeout_for
 from .base_provider import LLMProvider, ProviderResponse, ProviderError
 
 class AnthropicProvider(LLMProvider):
-    # Updated pricing per 1M tokens (December 2025)
-    PRICING = {
-        "claude-sonnet-4-20250514": {"input": 3.00, "output": 15.00},
-        "claude-haiku-3-5-20241022": {"input": 0.80, "output": 4.00},
-    }
-    
-    def __init__(self, api_key: str, model: str = "claude-haiku-3-5-20241022"):
-        super().__init__(api_key, model, "Anthropic")
+    def __init__(self, api_key: str, model: str = "claude-haiku-3-5-20241022", temperature: Optional[float] = None):
+        super().__init__(api_key, model, "Anthropic", temperature)
         self.client = Anthropic(api_key=api_key)
     
     def generate(self, prompt: str, max_tokens: int = 500) -> ProviderResponse:
+        check_deadline(f"{self.name} call")
         start = time.time()
         
         response = self.client.messages.create(
             model=self.model,
             max_tokens=max_tokens,
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            timeout=timeout_for(self.request_timeout),
+            **self._sampling_params()
         )
         
         latency = (time.time() - start) * 1000
         
-        # Calculate cost
-        pricing = self.PRICING[self.model]
-        input_cost = (response.usage.input_tokens / 1_000_000) * pricing["input"]
-        output_cost = (response.usage.output_tokens / 1_000_000) * pricing["output"]
-        
         return ProviderResponse(
             content=response.content[0].text,
             model=self.model,
             provider=self.name,
             tokens_used=response.usage.input_tokens + response.usage.output_tokens,
-            cost=input_cost + output_cost,
+            cost=self._calculate_cost(response.usage.input_tokens, response.usage.output_tokens),
             latency_ms=latency
         )
     
+    def generate_stream(self, prompt: str, max_tokens: int = 500) -> Iterator[Union[str, ProviderResponse]]:
+        check_deadline(f"{self.name} stream")
+        start = time.time()
+        ttft = None
+        parts = []
+        
+        with self.client.messages.stream(
+            model=self.model,
+            max_tokens=max_tokens,
+            messages=[{"role": "user", "content": prompt}],
+            timeout=timeout_for(self.request_timeout),
+            **self._sampling_params()
+        ) as stream:
+            for delta in stream.text_stream:
+                if ttft is None:
+                    ttft = (time.time() - start) * 1000
+                parts.append(delta)
+                yield delta
+            usage = stream.get_final_message().usage
+        
+        latency = (time.time() - start) * 1000
+        
+        yield ProviderResponse(
+            content="".join(parts),
+            model=self.model,
+            provider=self.name,
+            tokens_used=usage.input_tokens + usage.output_tokens,
+            cost=self._calculate_cost(usage.input_tokens, usage.output_tokens),
+            latency_ms=latency,
+            ttft_ms=ttft
+        )
+    
+    def _calculate_cost(self, input_tokens: int, output_tokens: int) -> float:
+        # Pricing per 1M tokens lives in the shared cost model
+        return calculate_cost(self.model, input_tokens, output_tokens)
+    
     def classify_error(self, error: Exception) -> ProviderError:
         error_msg = str(error).lower()
         
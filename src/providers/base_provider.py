@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Union
 
 @dataclass
 class ProviderResponse:
@@ -11,6 +11,27 @@ class ProviderResponse:
     tokens_used: int
     cost: float
     latency_ms: float
+    ttft_ms: Optional[float] = None  # Time to first token (streaming only)
+    cached: bool = False  # Served from LLMRouter's response cache
+
+@dataclass
+class BatchResult:
+    """Results of LLMRouter.generate_batch, in prompt order"""
+    responses: List[Optional[ProviderResponse]]
+    errors: List[Optional[str]]  # Error message for items that failed on every provider
+    total_cost: float
+    total_tokens: int
+    wall_time_ms: float
+    avg_latency_ms: float
+    provider_usage: dict = field(default_factory=dict)
+    
+    @property
+    def succeeded(self) -> int:
+        return sum(1 for r in self.responses if r is not None)
+    
+    @property
+    def failed(self) -> int:
+        return len(self.responses) - self.succeeded
 
 @dataclass
 class ProviderError:
@@ -18,21 +39,63 @@ class ProviderError:
     error_type: str  # "rate_limit", "api_error", "timeout", "invalid_request"
     message: str
     retry_after: Optional[int] = None
-    provider: str  # Added: track which provider failed
+    provider: str = ""  # Added: track which provider failed
 
 class LLMProvider(ABC):
     """Base class for all LLM providers"""
     
-    def __init__(self, api_key: str, model: str, name: str):
+    # Limits honoured by LLMRouter (None = unbounded)
+    max_concurrency: Optional[int] = None
+    rate_limit_rpm: Optional[int] = None
+    
+    # Upper bound for one API call; shortened to the request deadline if sooner
+    request_timeout: float = 60.0
+    
+    # Set True in providers that implement generate_batch()
+    supports_batch: bool = False
+    
+    def __init__(self, api_key: str, model: str, name: str, temperature: Optional[float] = None):
         self.api_key = api_key
         self.model = model
         self.name = name  # "OpenAI", "Anthropic", "Ollama"
+        self.temperature = temperature  # None = vendor default
+    
+    @property
+    def is_deterministic(self) -> bool:
+        """Greedy decoding - same prompt gives the same completion"""
+        return self.temperature == 0
+    
+    def _sampling_params(self) -> dict:
+        """Extra request kwargs for sampling settings that were set explicitly"""
+        return {} if self.temperature is None else {"temperature": self.temperature}
     
     @abstractmethod
     def generate(self, prompt: str, max_tokens: int = 500) -> ProviderResponse:
         """Generate completion from this provider"""
         pass
     
+    def generate_stream(self, prompt: str, max_tokens: int = 500) -> Iterator[Union[str, ProviderResponse]]:
+        """
+        Stream completion from this provider.
+        
+        Yields text deltas as they arrive, then a final ProviderResponse
+        with the full content, usage, cost and time-to-first-token.
+        Providers without native streaming fall back to one big delta.
+        """
+        response = self.generate(prompt, max_tokens)
+        response.ttft_ms = response.latency_ms
+        yield response.content
+        yield response
+    
+    def generate_batch(self, prompts: List[str], max_tokens: int = 500) -> List[Optional[ProviderResponse]]:
+        """
+        Generate many completions in one request (native batch endpoint).
+        
+        Returns one entry per prompt, None for items the endpoint could not
+        answer so the router can fall back for just those.
+        """
+        raise NotImplementedError(f"{self.name} has no batch endpoint")
+    
     @abstractmethod
     def classify_error(self, error: Exception) -> ProviderError:
         """Classify error for fallback decisions"""
@@ -0,0 +1,225 @@
+import math
+import threading
+import weakref
+from typing import Dict, List
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram (HDR-style).
+    
+    Bucket boundaries grow by GROWTH, so every quantile is accurate to
+    about +/-2% regardless of magnitude, and memory stays bounded by the
+    number of distinct buckets hit (a few hundred at most).
+    """
+    
+    GROWTH = 1.04
+    MIN_MS = 0.01
+    _LOG_GROWTH = math.log(GROWTH)
+    
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+    
+    @classmethod
+    def bucket_of(cls, value_ms: float) -> int:
+        if value_ms <= cls.MIN_MS:
+            return 0
+        return int(math.log(value_ms / cls.MIN_MS) / cls._LOG_GROWTH) + 1
+    
+    @classmethod
+    def bucket_value(cls, bucket: int) -> float:
+        """Representative (geometric midpoint) value of a bucket"""
+        if bucket == 0:
+            return cls.MIN_MS
+        return cls.MIN_MS * cls.GROWTH ** (bucket - 0.5)
+    
+    def record(self, value_ms: float):
+        bucket = self.bucket_of(value_ms)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total_ms += value_ms
+        if value_ms > self.max_ms:
+            self.max_ms = value_ms
+    
+    def merge(self, other: "LatencyHistogram"):
+        for bucket, n in other.counts.copy().items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + n
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+    
+    def to_dict(self) -> Dict:
+        return {
+            "counts": {str(b): n for b, n in self.counts.items()},
+            "count": self.count,
+            "total_ms": self.total_ms,
+            "max_ms": self.max_ms
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "LatencyHistogram":
+        hist = cls()
+        hist.counts = {int(b): n for b, n in data["counts"].items()}
+        hist.count = data["count"]
+        hist.total_ms = data["total_ms"]
+        hist.max_ms = data["max_ms"]
+        return hist
+    
+    def quantile(self, q: float) -> float:
+        """
+        Quantile, q in [0, 1], interpolated between ranks exactly like
+        perf_stats.quantile - only at bucket precision.
+        """
+        if self.count == 0:
+            return 0.0
+        position = (self.count - 1) * min(max(q, 0.0), 1.0)
+        lower_rank = math.floor(position)
+        lower = upper = None
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if lower is None and seen > lower_rank:
+                lower = self.bucket_value(bucket)
+            if seen > lower_rank + 1:
+                upper = self.bucket_value(bucket)
+                break
+        if upper is None:
+            upper = lower
+        return min(lower + (upper - lower) * (position - lower_rank), self.max_ms)
+    
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.50), 2),
+            "p95_ms": round(self.quantile(0.95), 2),
+            "p99_ms": round(self.quantile(0.99), 2),
+            "max_ms": round(self.max_ms, 2)
+        }
+
+
+class _ProviderShard:
+    def __init__(self):
+        self.successes = 0
+        self.errors = 0
+        self.tokens = 0
+        self.cost = 0.0
+        self.latency = LatencyHistogram()
+
+
+class _Shard:
+    """Counters owned by a single thread - only that thread writes them"""
+    
+    def __init__(self):
+        self.counters: Dict[str, float] = {}
+        self.providers: Dict[str, _ProviderShard] = {}
+    
+    def merge(self, other: "_Shard"):
+        for name, value in other.counters.copy().items():
+            self.counters[name] = self.counters.get(name, 0) + value
+        for name, stats in other.providers.copy().items():
+            merged = self.providers.get(name)
+            if merged is None:
+                merged = self.providers[name] = _ProviderShard()
+            merged.successes += stats.successes
+            merged.errors += stats.errors
+            merged.tokens += stats.tokens
+            merged.cost += stats.cost
+            merged.latency.merge(stats.latency)
+
+
+class _ShardHandle:
+    """What a thread's local storage holds; it dies with the thread"""
+    
+    __slots__ = ("shard", "__weakref__")
+    
+    def __init__(self, shard: _Shard):
+        self.shard = shard
+
+
+class RouterMetrics:
+    """
+    Router statistics without a lock on the hot path.
+    
+    Each thread records into its own shard, so increments never race and
+    never contend. snapshot() sums the shards; the only lock is taken the
+    first time a thread records anything (to register its shard) and when
+    the thread exits, at which point its shard is folded into `_retired`.
+    The number of shards is therefore the number of live threads that have
+    recorded something, however many short-lived threads came and went.
+    """
+    
+    def __init__(self, provider_names: List[str] = ()):
+        self.provider_names = list(provider_names)
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._retired = _Shard()
+        self._register_lock = threading.Lock()
+    
+    def _shard(self) -> _Shard:
+        handle = getattr(self._local, "handle", None)
+        if handle is None:
+            handle = _ShardHandle(_Shard())
+            with self._register_lock:
+                self._shards.append(handle.shard)
+            finalizer = weakref.finalize(handle, RouterMetrics._retire, weakref.ref(self), handle.shard)
+            finalizer.atexit = False
+            self._local.handle = handle
+        return handle.shard
+    
+    @staticmethod
+    def _retire(metrics_ref, shard: _Shard):
+        """Fold the shard of a thread that has exited into the running total"""
+        metrics = metrics_ref()
+        if metrics is None:
+            return
+        with metrics._register_lock:
+            metrics._shards.remove(shard)
+            metrics._retired.merge(shard)
+    
+    def incr(self, name: str, amount: float = 1):
+        counters = self._shard().counters
+        counters[name] = counters.get(name, 0) + amount
+    
+    def record_provider(self, provider: str, latency_ms: float, success: bool = True,
+                        tokens: int = 0, cost: float = 0.0):
+        shards = self._shard().providers
+        stats = shards.get(provider)
+        if stats is None:
+            stats = shards[provider] = _ProviderShard()
+        
+        if success:
+            stats.successes += 1
+        else:
+            stats.errors += 1
+        stats.tokens += tokens
+        stats.cost += cost
+        stats.latency.record(latency_ms)
+    
+    def snapshot(self) -> Dict[str, dict]:
+        """Merge all shards into {"counters": {...}, "providers": {...}}"""
+        total = _Shard()
+        total.providers = {name: _ProviderShard() for name in self.provider_names}
+        with self._register_lock:
+            total.merge(self._retired)
+            shards = list(self._shards)
+        
+        for shard in shards:
+            total.merge(shard)
+        
+        return {
+            "counters": total.counters,
+            "providers": {
+                name: {
+                    "successes": stats.successes,
+                    "errors": stats.errors,
+                    "tokens": stats.tokens,
+                    "cost": round(stats.cost, 6),
+                    "latency": stats.latency.summary()
+                }
+                for name, stats in total.providers.items()
+            }
+        }
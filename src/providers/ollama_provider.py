@@ -1,44 +1,143 @@
+import json
 import requests
 import time
+from typing import Iterator, Optional, Union
+from requests.adapters import HTTPAdapter
+from ..cost_model import usage_from_ollama
+from ..deadline import check_deadline, timeout_for
 from .base_provider import LLMProvider, ProviderResponse, ProviderError
 
 class OllamaProvider(LLMProvider):
     """Local Ollama provider - FREE fallback"""
     
-    def __init__(self, base_url: str = "http://localhost:11434", model: str = "llama3.1:8b"):
-        super().__init__("", model, "Ollama")  # No API key needed
-        self.base_url = base_url
+    def __init__(
+        self,
+        base_url: str = "http://localhost:11434",
+        model: str = "llama3.1:8b",
+        pool_connections: int = 1,
+        pool_maxsize: int = 10,
+        keep_alive: bool = True,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 30.0,
+        temperature: Optional[float] = None
+    ):
+        super().__init__("", model, "Ollama", temperature)  # No API key needed
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        
+        # One pooled session per provider: TCP connections are reused across
+        # requests instead of being set up (and torn down) on every generate()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=0  # LLMRouter owns retries
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Connection"] = "keep-alive" if keep_alive else "close"
+    
+    @property
+    def timeout(self) -> tuple:
+        """(connect, read) timeout pair passed to requests, bounded by the request deadline"""
+        return (timeout_for(self.connect_timeout), timeout_for(self.read_timeout))
     
     def generate(self, prompt: str, max_tokens: int = 500) -> ProviderResponse:
+        check_deadline(f"{self.name} call")
         start = time.time()
         
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/api/generate",
             json={
                 "model": self.model,
                 "prompt": prompt,
                 "stream": False,
                 "options": {
-                    "num_predict": max_tokens
+                    "num_predict": max_tokens,
+                    **self._sampling_params()
                 }
             },
-            timeout=30
+            timeout=self.timeout
         )
         
         response.raise_for_status()
         data = response.json()
         
         latency = (time.time() - start) * 1000
+        usage = usage_from_ollama(data, prompt, data["response"])
         
         return ProviderResponse(
             content=data["response"],
             model=self.model,
             provider=self.name,
-            tokens_used=0,  # Ollama doesn't provide token counts
+            tokens_used=usage.total_tokens,
             cost=0.0,  # Free!
             latency_ms=latency
         )
     
+    def generate_stream(self, prompt: str, max_tokens: int = 500) -> Iterator[Union[str, ProviderResponse]]:
+        check_deadline(f"{self.name} stream")
+        start = time.time()
+        ttft = None
+        parts = []
+        final = {}
+        
+        with self.session.post(
+            f"{self.base_url}/api/generate",
+            json={
+                "model": self.model,
+                "prompt": prompt,
+                "stream": True,
+                "options": {
+                    "num_predict": max_tokens,
+                    **self._sampling_params()
+                }
+            },
+            timeout=self.timeout,
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            
+            # Ollama streams one JSON object per line
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                delta = data.get("response", "")
+                if delta:
+                    if ttft is None:
+                        ttft = (time.time() - start) * 1000
+                    parts.append(delta)
+                    yield delta
+                if data.get("done"):
+                    final = data
+                    break
+        
+        latency = (time.time() - start) * 1000
+        content = "".join(parts)
+        usage = usage_from_ollama(final, prompt, content)
+        
+        yield ProviderResponse(
+            content=content,
+            model=self.model,
+            provider=self.name,
+            tokens_used=usage.total_tokens,
+            cost=0.0,  # Free!
+            latency_ms=latency,
+            ttft_ms=ttft
+        )
+    
+    def close(self):
+        """Release pooled connections"""
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
     def classify_error(self, error: Exception) -> ProviderError:
         error_msg = str(error).lower()
         
@@ -1,43 +1,83 @@
 from openai import OpenAI
 import time
+from typing import Iterator, Optional, Union
+from ..cost_model import calculate_cost
+from ..deadline import check_deadline, timeout_for
 from .base_provider import LLMProvider, ProviderResponse, ProviderError
 
 class OpenAIProvider(LLMProvider):
-    # Updated pricing per 1M tokens (December 2025)
-    PRICING = {
-        "gpt-4o": {"input": 2.50, "output": 10.00},
-        "gpt-4o-mini": {"input": 0.15, "output": 0.60},
-    }
-    
-    def __init__(self, api_key: str, model: str = "gpt-4o-mini"):
-        super().__init__(api_key, model, "OpenAI")
+    def __init__(self, api_key: str, model: str = "gpt-4o-mini", temperature: Optional[float] = None):
+        super().__init__(api_key, model, "OpenAI", temperature)
         self.client = OpenAI(api_key=api_key)
     
     def generate(self, prompt: str, max_tokens: int = 500) -> ProviderResponse:
+        check_deadline(f"{self.name} call")
         start = time.time()
         
         response = self.client.chat.completions.create(
             model=self.model,
             messages=[{"role": "user", "content": prompt}],
-            max_tokens=max_tokens
+            max_tokens=max_tokens,
+            timeout=timeout_for(self.request_timeout),
+            **self._sampling_params()
         )
         
         latency = (time.time() - start) * 1000
         
-        # Calculate cost
-        pricing = self.PRICING[self.model]
-        input_cost = (response.usage.prompt_tokens / 1_000_000) * pricing["input"]
-        output_cost = (response.usage.completion_tokens / 1_000_000) * pricing["output"]
-        
         return ProviderResponse(
             content=response.choices[0].message.content,
             model=self.model,
             provider=self.name,
             tokens_used=response.usage.total_tokens,
-            cost=input_cost + output_cost,
+            cost=self._calculate_cost(response.usage.prompt_tokens, response.usage.completion_tokens),
             latency_ms=latency
         )
     
+    def generate_stream(self, prompt: str, max_tokens: int = 500) -> Iterator[Union[str, ProviderResponse]]:
+        check_deadline(f"{self.name} stream")
+        start = time.time()
+        ttft = None
+        parts = []
+        usage = None
+        
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True},  # Usage arrives on the last chunk
+            timeout=timeout_for(self.request_timeout),
+            **self._sampling_params()
+        )
+        
+        for chunk in stream:
+            if chunk.usage:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if ttft is None:
+                    ttft = (time.time() - start) * 1000
+                parts.append(delta)
+                yield delta
+        
+        latency = (time.time() - start) * 1000
+        
+        yield ProviderResponse(
+            content="".join(parts),
+            model=self.model,
+            provider=self.name,
+            tokens_used=usage.total_tokens if usage else 0,
+            cost=self._calculate_cost(usage.prompt_tokens, usage.completion_tokens) if usage else 0.0,
+            latency_ms=latency,
+            ttft_ms=ttft
+        )
+    
+    def _calculate_cost(self, input_tokens: int, output_tokens: int) -> float:
+        # Pricing per 1M tokens lives in the shared cost model
+        return calculate_cost(self.model, input_tokens, output_tokens)
+    
     def classify_error(self, error: Exception) -> ProviderError:
         error_msg = str(error).lower()
         
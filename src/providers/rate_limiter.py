@@ -0,0 +1,38 @@
+import threading
+import time
+from typing import Optional
+from ..deadline import Deadline, DeadlineExceeded
+
+
+class SlotPastDeadline(DeadlineExceeded):
+    """The next rate-limit slot comes up after the request's deadline"""
+
+
+class RateLimiter:
+    """
+    Spaces calls to at most `requests_per_minute`.
+    
+    Callers block in acquire() until their slot comes up, so a burst of
+    batch items is smoothed out instead of tripping the vendor's 429s.
+    """
+    
+    def __init__(self, requests_per_minute: int):
+        self.interval = 60.0 / requests_per_minute
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+    
+    def acquire(self, deadline: Optional[Deadline] = None):
+        """
+        Wait for the next slot. With a deadline that cannot cover the wait,
+        raise SlotPastDeadline at once, without reserving the slot.
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            wait = slot - now
+            if deadline is not None and wait > 0 and not deadline.can_fit(wait):
+                raise SlotPastDeadline(f"Rate limit slot is {wait:.1f}s away, past the request deadline")
+            self._next_slot = slot + self.interval
+        
+        if wait > 0:
+            time.sleep(wait)
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Optional
+from .base_provider import ProviderResponse
+
+
+class ResponseCache:
+    """
+    In-memory TTL + LRU cache of provider responses.
+    
+    Keys are (provider, model, sha256(prompt), max_tokens). Entries older
+    than `ttl_seconds` are dropped on read; once `max_entries` is reached
+    the least recently used entry is evicted.
+    """
+    
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (ProviderResponse, stored_at)
+    
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str, max_tokens: int) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()
+        return f"{provider}:{model}:{prompt_hash}:{max_tokens}"
+    
+    def get(self, key: str) -> Optional[ProviderResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            response, stored_at = entry
+            if time.time() - stored_at >= self.ttl:
+                del self._entries[key]  # Expired
+                return None
+            self._entries.move_to_end(key)
+            return response
+    
+    def set(self, key: str, response: ProviderResponse):
+        with self._lock:
+            self._entries[key] = (response, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskResponseCache(ResponseCache):
+    """
+    SQLite-backed ResponseCache that survives restarts.
+    
+    Same TTL / LRU semantics; recency is tracked in a last_used column so
+    eviction does not need the whole table in memory.
+    """
+    
+    def __init__(self, path: str = "logs/response_cache.db", max_entries: int = 10000, ttl_seconds: float = 86400):
+        super().__init__(max_entries, ttl_seconds)
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+            "stored_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON responses(last_used)")
+        self._conn.commit()
+    
+    def get(self, key: str) -> Optional[ProviderResponse]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, stored_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] >= self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return ProviderResponse(**json.loads(row[0]))
+    
+    def set(self, key: str, response: ProviderResponse):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, stored_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(asdict(response)), now, now)
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+    
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+    
+    def close(self):
+        self._conn.close()
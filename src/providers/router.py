@@ -1,6 +1,18 @@
+import contextvars
+import dataclasses
+import threading
 import time
-from typing import List
-from .base_provider import LLMProvider, ProviderResponse, ProviderError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Optional, Union
+from .base_provider import LLMProvider, ProviderResponse, ProviderError, BatchResult
+from .metrics import RouterMetrics
+from .rate_limiter import RateLimiter, SlotPastDeadline
+from .response_cache import ResponseCache
+from .single_flight import SingleFlight
+from ..deadline import Deadline, DeadlineExceeded, current_deadline, deadline_scope
+from ..log_utils import get_logger
+
+logger = get_logger(__name__)
 
 class LLMRouter:
     """
@@ -8,68 +20,368 @@ class LLMRouter:
     Try providers in order: OpenAI → Anthropic → Ollama
     """
     
-    def __init__(self, providers: List[LLMProvider], max_retries: int = 3):
+    def __init__(
+        self,
+        providers: List[LLMProvider],
+        max_retries: int = 3,
+        coalesce: bool = True,
+        cache: Optional[ResponseCache] = None,
+        cache_nondeterministic: bool = False
+    ):
         self.providers = providers
         self.max_retries = max_retries
-        self.stats = {
-            "total_requests": 0,
-            "successful_requests": 0,
-            "fallbacks_triggered": 0,
-            "provider_usage": {p.name: 0 for p in providers}
+        self.single_flight = SingleFlight() if coalesce else None
+        
+        # Only temperature=0 providers are cached unless told otherwise:
+        # sampled completions are expected to differ between calls
+        self.cache = cache
+        self.cache_nondeterministic = cache_nondeterministic
+        self.metrics = RouterMetrics([p.name for p in providers])
+        
+        # Per-provider concurrency slots and rate limiters
+        self._slots = {
+            p.name: threading.BoundedSemaphore(p.max_concurrency)
+            for p in providers if p.max_concurrency
+        }
+        self._rate_limiters = {
+            p.name: RateLimiter(p.rate_limit_rpm)
+            for p in providers if p.rate_limit_rpm
         }
     
-    def generate(self, prompt: str, max_tokens: int = 500) -> ProviderResponse:
-        """Try each provider in order until one succeeds"""
-        self.stats["total_requests"] += 1
+    def generate(self, prompt: str, max_tokens: int = 500, deadline: Optional[Deadline] = None) -> ProviderResponse:
+        """
+        Try each provider in order until one succeeds.
+        
+        Identical requests that arrive while one is already in flight wait
+        for it and share its ProviderResponse instead of calling a provider.
+        
+        With a deadline (passed in, or the caller's ambient one) retries and
+        fallbacks stop once it has passed, and provider timeouts are capped
+        at the time left.
+        """
+        if deadline is not None:
+            with deadline_scope(deadline):
+                return self.generate(prompt, max_tokens)
+        
+        if self.single_flight is None:
+            return self._generate(prompt, max_tokens)
+        
+        key = (prompt, max_tokens, tuple(p.model for p in self.providers))
+        led = []
+        
+        def run():
+            led.append(True)
+            return self._generate(prompt, max_tokens)
+        
+        deadline = current_deadline()
+        try:
+            response = self.single_flight.do(key, run, timeout=deadline.remaining() if deadline else None)
+        except Exception:
+            if not led:
+                self.metrics.incr("total_requests")
+            raise
+        
+        if not led:
+            # Shared the leader's response - no provider call made
+            self.metrics.incr("total_requests")
+            self.metrics.incr("successful_requests")
+            self.metrics.incr("coalesced_requests")
+        
+        return response
+    
+    def _generate(self, prompt: str, max_tokens: int) -> ProviderResponse:
+        self.metrics.incr("total_requests")
         
         last_error = None
         
         for provider_idx, provider in enumerate(self.providers):
+            cache_key = self._cache_key(provider, prompt, max_tokens)
+            if cache_key:
+                cached = self._cache_get(cache_key)
+                if cached:
+                    return cached
+            
             for retry in range(self.max_retries):
+                self._check_deadline(last_error)
                 try:
-                    print(f"[Router] Trying {provider.name}/{provider.model} (attempt {retry + 1}/{self.max_retries})...")
+                    logger.debug("Trying %s/%s (attempt %d/%d)", provider.name, provider.model, retry + 1, self.max_retries)
                     
-                    response = provider.generate(prompt, max_tokens)
+                    response = self._call_provider(provider, prompt, max_tokens)
                     
                     # Success!
-                    self.stats["successful_requests"] += 1
-                    self.stats["provider_usage"][provider.name] += 1
-                    
-                    if provider_idx > 0:
-                        self.stats["fallbacks_triggered"] += 1
-                        print(f"[Router] ✓ Fallback successful with {provider.name}")
-                    else:
-                        print(f"[Router] ✓ Success with {provider.name}")
-                    
+                    self._record_success(provider, provider_idx)
+                    if cache_key:
+                        self.cache.set(cache_key, response)
                     return response
                 
+                except SlotPastDeadline as e:
+                    # Waiting for this provider's rate limit would outlive the request
+                    logger.info("%s: %s, trying next provider", provider.name, e)
+                    last_error = ProviderError("rate_limit", str(e), provider=provider.name)
+                    break
+                except DeadlineExceeded:
+                    raise
                 except Exception as e:
-                    error = provider.classify_error(e)
-                    last_error = error
-                    
-                    print(f"[Router] ✗ {provider.name} error: {error.error_type}")
-                    
-                    # If rate limited, wait and retry SAME provider
-                    if error.error_type == "rate_limit" and retry < self.max_retries - 1:
-                        wait_time = 2 ** retry  # Exponential backoff: 1s, 2s, 4s
-                        print(f"[Router]   Rate limited. Waiting {wait_time}s before retry...")
-                        time.sleep(wait_time)
+                    last_error = provider.classify_error(e)
+                    if self._should_retry(provider, last_error, retry):
+                        continue
+                    break
+        
+        # All providers failed
+        raise Exception(f"All providers failed. Last error: {last_error.message if last_error else 'Unknown'}")
+    
+    def generate_batch(self, prompts: List[str], max_tokens: int = 500, concurrency: int = 4,
+                       deadline: Optional[Deadline] = None) -> BatchResult:
+        """
+        Generate completions for many prompts (offline workloads).
+        
+        Items run on up to `concurrency` worker threads, each with its own
+        fallback chain; provider max_concurrency / rate_limit_rpm still
+        apply. If the primary provider has a batch endpoint it is tried
+        first and only the items it could not answer go through the chain.
+        Results come back in prompt order. A deadline applies to the whole
+        batch: items not started in time fail with DeadlineExceeded.
+        """
+        if deadline is not None:
+            with deadline_scope(deadline):
+                return self.generate_batch(prompts, max_tokens, concurrency)
+        
+        start = time.time()
+        responses = [None] * len(prompts)
+        errors = [None] * len(prompts)
+        pending = list(range(len(prompts)))
+        
+        primary = self.providers[0] if self.providers else None
+        if primary is not None and primary.supports_batch and prompts:
+            try:
+                logger.debug("Batch of %d via %s batch endpoint", len(prompts), primary.name)
+                for idx, response in enumerate(primary.generate_batch(prompts, max_tokens)):
+                    if response is not None:
+                        responses[idx] = response
+                        self.metrics.incr("total_requests")
+                        self.metrics.record_provider(primary.name, response.latency_ms, True, response.tokens_used, response.cost)
+                        self._record_success(primary, 0)
+                pending = [idx for idx in pending if responses[idx] is None]
+            except Exception as e:
+                error = primary.classify_error(e)
+                logger.warning("%s batch endpoint error: %s", primary.name, error.error_type)
+        
+        if pending:
+            with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+                # Each worker runs in a copy of this context so the deadline follows it
+                futures = {
+                    pool.submit(contextvars.copy_context().run, self._generate, prompts[idx], max_tokens): idx
+                    for idx in pending
+                }
+                for future in as_completed(futures):
+                    idx = futures[future]
+                    try:
+                        responses[idx] = future.result()
+                    except Exception as e:
+                        errors[idx] = str(e)
+        
+        completed = [r for r in responses if r is not None]
+        usage = {}
+        for r in completed:
+            usage[r.provider] = usage.get(r.provider, 0) + 1
+        
+        return BatchResult(
+            responses=responses,
+            errors=errors,
+            total_cost=sum(r.cost for r in completed),
+            total_tokens=sum(r.tokens_used for r in completed),
+            wall_time_ms=(time.time() - start) * 1000,
+            avg_latency_ms=sum(r.latency_ms for r in completed) / len(completed) if completed else 0.0,
+            provider_usage=usage
+        )
+    
+    def generate_stream(self, prompt: str, max_tokens: int = 500,
+                        deadline: Optional[Deadline] = None) -> Iterator[Union[str, ProviderResponse]]:
+        """
+        Stream from the first provider that produces a token.
+        
+        Fallback only happens before the first token arrives: once text
+        has been yielded to the caller, switching providers would splice
+        two different completions together, so later errors propagate.
+        
+        An explicit deadline is the ambient one (see src/deadline.py)
+        whenever the providers run, i.e. while each chunk is produced; it
+        is not left set in the caller's context between chunks.
+        """
+        if deadline is not None:
+            stream = self.generate_stream(prompt, max_tokens)
+            try:
+                while True:
+                    with deadline_scope(deadline):
+                        try:
+                            chunk = next(stream)
+                        except StopIteration:
+                            return
+                    yield chunk
+            finally:
+                stream.close()
+        
+        self.metrics.incr("total_requests")
+        
+        deadline = current_deadline()
+        last_error = None
+        
+        for provider_idx, provider in enumerate(self.providers):
+            for retry in range(self.max_retries):
+                self._check_deadline(last_error, deadline)
+                start = time.time()
+                logger.debug("Streaming from %s/%s (attempt %d/%d)", provider.name, provider.model, retry + 1, self.max_retries)
+                stream = provider.generate_stream(prompt, max_tokens)
+                
+                try:
+                    first = next(stream)
+                except StopIteration:
+                    first = None
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    self.metrics.record_provider(provider.name, (time.time() - start) * 1000, success=False)
+                    last_error = provider.classify_error(e)
+                    if self._should_retry(provider, last_error, retry):
                         continue
-                    
-                    # If invalid request, don't retry - fail immediately
-                    if error.error_type == "invalid_request":
-                        raise Exception(f"Invalid request: {error.message}")
-                    
-                    # For other errors (timeout, api_error), try next provider
                     break
+                
+                # First token received - committed to this provider
+                self._record_success(provider, provider_idx)
+                if first is not None:
+                    yield first
+                for chunk in stream:
+                    if isinstance(chunk, ProviderResponse):
+                        self.metrics.record_provider(provider.name, chunk.latency_ms, True, chunk.tokens_used, chunk.cost)
+                    yield chunk
+                return
         
         # All providers failed
         raise Exception(f"All providers failed. Last error: {last_error.message if last_error else 'Unknown'}")
     
+    def _check_deadline(self, last_error: Optional[ProviderError], deadline: Optional[Deadline] = None):
+        """Stop retrying / falling back once the request deadline has passed"""
+        deadline = deadline or current_deadline()
+        if deadline is not None and deadline.expired:
+            reason = f" Last error: {last_error.message}" if last_error else ""
+            self.metrics.incr("deadline_exceeded")
+            raise DeadlineExceeded(f"Request deadline exceeded before a provider answered.{reason}")
+    
+    def _cache_key(self, provider: LLMProvider, prompt: str, max_tokens: int) -> Optional[str]:
+        """Cache key for this provider, or None if its responses aren't cacheable"""
+        if self.cache is None:
+            return None
+        if not (provider.is_deterministic or self.cache_nondeterministic):
+            return None
+        return self.cache.make_key(provider.name, provider.model, prompt, max_tokens)
+    
+    def _cache_get(self, key: str) -> Optional[ProviderResponse]:
+        start = time.time()
+        response = self.cache.get(key)
+        if response is None:
+            return None
+        
+        self.metrics.incr("successful_requests")
+        self.metrics.incr("cache_hits")
+        self.metrics.incr("cost_saved", response.cost)
+        logger.debug("Cache hit for %s", response.provider)
+        
+        # Copy so callers see this request's latency, and no cost
+        return dataclasses.replace(
+            response,
+            cost=0.0,
+            latency_ms=(time.time() - start) * 1000,
+            ttft_ms=None,
+            cached=True
+        )
+    
+    def _call_provider(self, provider: LLMProvider, prompt: str, max_tokens: int) -> ProviderResponse:
+        """
+        Call provider.generate inside its concurrency slot and rate limit;
+        SlotPastDeadline if the rate limit would hold the call past the deadline
+        """
+        limiter = self._rate_limiters.get(provider.name)
+        if limiter:
+            limiter.acquire(current_deadline())
+        
+        start = time.time()
+        try:
+            slot = self._slots.get(provider.name)
+            if slot is None:
+                response = provider.generate(prompt, max_tokens)
+            else:
+                with slot:
+                    response = provider.generate(prompt, max_tokens)
+        except Exception:
+            self.metrics.record_provider(provider.name, (time.time() - start) * 1000, success=False)
+            raise
+        
+        self.metrics.record_provider(provider.name, response.latency_ms, True, response.tokens_used, response.cost)
+        return response
+    
+    def _record_success(self, provider: LLMProvider, provider_idx: int):
+        self.metrics.incr("successful_requests")
+        self.metrics.incr(f"usage:{provider.name}")
+        
+        if provider_idx > 0:
+            self.metrics.incr("fallbacks_triggered")
+            logger.info("Fallback successful with %s", provider.name)
+        else:
+            logger.debug("Success with %s", provider.name)
+    
+    def _should_retry(self, provider: LLMProvider, error: ProviderError, retry: int) -> bool:
+        """Decide whether to retry the SAME provider (True) or move on (False)"""
+        logger.warning("%s error: %s", provider.name, error.error_type)
+        
+        # If rate limited, wait and retry SAME provider - unless the wait
+        # alone would outlive the request, then try the next provider now
+        deadline = current_deadline()
+        if error.error_type == "rate_limit" and retry < self.max_retries - 1:
+            wait_time = 2 ** retry  # Exponential backoff: 1s, 2s, 4s
+            if deadline is not None and not deadline.can_fit(wait_time):
+                logger.info("%s rate limited, no time left to wait %ds", provider.name, wait_time)
+                return False
+            logger.info("%s rate limited. Waiting %ds before retry", provider.name, wait_time)
+            time.sleep(wait_time)
+            return True
+        
+        # If invalid request, don't retry - fail immediately
+        if error.error_type == "invalid_request":
+            raise Exception(f"Invalid request: {error.message}")
+        
+        # For other errors (timeout, api_error), try next provider
+        return False
+    
+    @property
+    def stats(self) -> dict:
+        """Request counters (snapshot; see get_stats for rates and latencies)"""
+        return self._counters(self.metrics.snapshot())
+    
+    def _counters(self, snapshot: dict) -> dict:
+        counters = snapshot["counters"]
+        return {
+            "total_requests": int(counters.get("total_requests", 0)),
+            "successful_requests": int(counters.get("successful_requests", 0)),
+            "fallbacks_triggered": int(counters.get("fallbacks_triggered", 0)),
+            "coalesced_requests": int(counters.get("coalesced_requests", 0)),
+            "deadline_exceeded": int(counters.get("deadline_exceeded", 0)),
+            "cache_hits": int(counters.get("cache_hits", 0)),
+            "cost_saved": counters.get("cost_saved", 0.0),
+            "provider_usage": {p.name: int(counters.get(f"usage:{p.name}", 0)) for p in self.providers}
+        }
+    
     def get_stats(self):
-        """Return usage statistics"""
+        """Return usage statistics, including per-provider latency percentiles"""
+        snapshot = self.metrics.snapshot()
+        stats = self._counters(snapshot)
+        total = stats["total_requests"]
+        
         return {
-            **self.stats,
-            "success_rate": self.stats["successful_requests"] / self.stats["total_requests"] if self.stats["total_requests"] > 0 else 0,
-            "fallback_rate": self.stats["fallbacks_triggered"] / self.stats["total_requests"] if self.stats["total_requests"] > 0 else 0
+            **stats,
+            "success_rate": stats["successful_requests"] / total if total > 0 else 0,
+            "fallback_rate": stats["fallbacks_triggered"] / total if total > 0 else 0,
+            "coalesce_rate": stats["coalesced_requests"] / total if total > 0 else 0,
+            "cache_hit_rate": stats["cache_hits"] / total if total > 0 else 0,
+            "cache_size": len(self.cache) if self.cache is not None else 0,
+            "providers": snapshot["providers"]
         }
@@ -0,0 +1,77 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+from ..deadline import DeadlineExceeded
+
+
+class _Call:
+    """One in-flight call that other callers can wait on"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapse concurrent identical calls into one.
+    
+    The first caller for a key (the leader) runs the function; callers that
+    arrive with the same key while it is still running block until it
+    finishes and receive the same result (or exception). Nothing is kept
+    once the call completes, so this is not a cache.
+    
+    A DeadlineExceeded raised by the leader is its own deadline, not the
+    followers': they start over instead, and one of them leads the retry.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+    
+    def do(self, key: Hashable, func: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Run func once per in-flight key and return its result.
+        
+        `timeout` bounds how long a follower waits for the leader (the
+        follower's own deadline may be shorter or longer than the leader's).
+        """
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+        
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                if call is not None:
+                    leader = False
+                else:
+                    call = _Call()
+                    self._calls[key] = call
+                    leader = True
+            
+            if leader:
+                break
+            
+            remaining = None if give_up_at is None else give_up_at - time.monotonic()
+            if (remaining is not None and remaining <= 0) or not call.done.wait(remaining):
+                raise DeadlineExceeded("Deadline exceeded while waiting for an identical in-flight request")
+            if isinstance(call.error, DeadlineExceeded):
+                continue  # the leader ran out of time; retry under our own deadline
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:  # followers must not mistake e.g. KeyboardInterrupt for a None result
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+    
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,197 @@
+"""
+Columnar compaction and per-minute rollups for closed telemetry segments.
+
+compact() turns every closed segment of the telemetry log into two files in
+`out_dir`:
+
+- <segment>.<hash>.parquet: one row per request with a fixed schema (COLUMNS).
+  Parquet needs pyarrow; without it the same columns are written as
+  gzipped column-oriented JSON (<segment>.<hash>.columns.json.gz).
+  read_columns() reads either format.
+- <segment>.<hash>.rollup.json: one record per (minute, query_type, model_used)
+  with count, errors, cost, query/error type counts and a latency sketch.
+
+Output files are named after the segment plus the hash of its first line
+(as in TelemetryIndex), so a size-rotated file.1 that moves on to file.2 or
+gets gzipped is not compacted again, while the new file.1 is. The rollup
+file is written last, so its presence marks a segment as done and
+compact() can be re-run at any time. Weeks of traffic then come down to
+a few kilobytes of rollups per hour for offline analysis (rollup_window()).
+"""
+
+import gzip
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.log_utils import rotated_files
+from src.telemetry_index import (
+    BUCKET_SECONDS, TelemetryBucket, open_segment, parse_entry, segment_fingerprint
+)
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional: fall back to gzipped column JSON
+    pyarrow = None
+
+COLUMNS = [
+    "ts", "timestamp", "request_id", "user_id", "query_type", "latency_ms",
+    "success", "cost_usd", "model_used", "cache_hit", "error_type",
+    "function_called", "response_length"
+]
+ROLLUP_KEYS = ("query_type", "model_used")
+ROLLUP_SUFFIX = ".rollup.json"
+FINGERPRINT_CHARS = 16
+
+
+def _segment_name(path: str) -> str:
+    name = os.path.basename(path)
+    return name[:-3] if name.endswith(".gz") else name
+
+
+def _output_base(segment_path: str, fingerprint: str) -> str:
+    return f"{_segment_name(segment_path)}.{fingerprint[:FINGERPRINT_CHARS]}"
+
+
+def _compacted_fingerprints(out_dir: str) -> set:
+    """Fingerprint prefixes of the segments that already have a rollup file"""
+    if not os.path.isdir(out_dir):
+        return set()
+    return {
+        name[:-len(ROLLUP_SUFFIX)].rsplit(".", 1)[-1]
+        for name in os.listdir(out_dir) if name.endswith(ROLLUP_SUFFIX)
+    }
+
+
+def _write_atomic(path: str, write):
+    tmp = f"{path}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _write_columns(columns: Dict[str, List[Any]], base: str) -> str:
+    if pyarrow is not None:
+        path = f"{base}.parquet"
+        table = pyarrow.table(columns)
+        _write_atomic(path, lambda tmp: pyarrow.parquet.write_table(table, tmp, compression="zstd"))
+        return path
+    
+    path = f"{base}.columns.json.gz"
+    
+    def write(tmp):
+        with gzip.open(tmp, "wt") as f:
+            json.dump({"columns": columns}, f)
+    
+    _write_atomic(path, write)
+    return path
+
+
+def read_columns(path: str) -> Dict[str, List[Any]]:
+    """Columns of a compacted segment, as {column: values}"""
+    if path.endswith(".parquet"):
+        if pyarrow is None:
+            raise ImportError("reading .parquet files requires pyarrow")
+        return pyarrow.parquet.read_table(path).to_pydict()
+    with gzip.open(path, "rt") as f:
+        return json.load(f)["columns"]
+
+
+def compact_segment(segment_path: str, out_dir: str, fingerprint: Optional[str] = None) -> Dict[str, Any]:
+    """Write the columnar file and the rollups for one closed, non-empty segment"""
+    fingerprint = fingerprint or segment_fingerprint(segment_path)
+    if fingerprint is None:
+        raise ValueError(f"{segment_path} has no complete first line")
+    columns = {name: [] for name in COLUMNS}
+    rollups: Dict[Tuple[int, str, str], TelemetryBucket] = {}
+    
+    with open_segment(segment_path) as f:
+        for line in f:
+            entry = parse_entry(line)
+            if entry is None:
+                continue
+            entry["ts"] = entry.pop("_ts")
+            for name in COLUMNS:
+                columns[name].append(entry.get(name))
+            
+            minute = int(entry["ts"] // BUCKET_SECONDS) * BUCKET_SECONDS
+            key = (minute, entry.get("query_type") or "unknown", entry.get("model_used") or "unknown")
+            bucket = rollups.get(key)
+            if bucket is None:
+                bucket = rollups[key] = TelemetryBucket()
+            bucket.add(entry)
+    
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, _output_base(segment_path, fingerprint))
+    columns_path = _write_columns(columns, base)
+    
+    records = [
+        {"minute": minute, "query_type": query_type, "model_used": model, **bucket.to_dict()}
+        for (minute, query_type, model), bucket in sorted(rollups.items())
+    ]
+    rollup_path = f"{base}{ROLLUP_SUFFIX}"
+    
+    def write_rollups(tmp):
+        with open(tmp, "w") as f:
+            json.dump(records, f)
+    
+    _write_atomic(rollup_path, write_rollups)
+    return {"rows": len(columns["ts"]), "rollups": len(records), "columns": columns_path, "rollup": rollup_path}
+
+
+def compact(log_file: str = "logs/telemetry.log", out_dir: str = "logs/telemetry_columnar") -> List[str]:
+    """Compact every closed segment not yet compacted; returns the segment names done"""
+    compacted = _compacted_fingerprints(out_dir)
+    done = []
+    for path in rotated_files(log_file):
+        fingerprint = segment_fingerprint(path)
+        if fingerprint is None or fingerprint[:FINGERPRINT_CHARS] in compacted:
+            continue
+        compact_segment(path, out_dir, fingerprint)
+        compacted.add(fingerprint[:FINGERPRINT_CHARS])
+        done.append(_segment_name(path))
+    return done
+
+
+def load_rollups(out_dir: str = "logs/telemetry_columnar", since: float = 0.0,
+                 until: float = float("inf")) -> List[Dict[str, Any]]:
+    """Rollup records with since <= minute < until, from every compacted segment"""
+    records = []
+    if not os.path.isdir(out_dir):
+        return records
+    for name in sorted(os.listdir(out_dir)):
+        if not name.endswith(ROLLUP_SUFFIX):
+            continue
+        with open(os.path.join(out_dir, name)) as f:
+            records.extend(r for r in json.load(f) if since <= r["minute"] < until)
+    return records
+
+
+def rollup_window(out_dir: str = "logs/telemetry_columnar", since: float = 0.0,
+                  until: float = float("inf"),
+                  group_by: Optional[Tuple[str, ...]] = ROLLUP_KEYS) -> Dict[Tuple, TelemetryBucket]:
+    """
+    Merge rollups over a time range, grouped by any of "minute",
+    "query_type" and "model_used" (group_by=() merges everything).
+    """
+    groups: Dict[Tuple, TelemetryBucket] = {}
+    for record in load_rollups(out_dir, since, until):
+        key = tuple(record[k] for k in group_by)
+        bucket = groups.get(key)
+        if bucket is None:
+            bucket = groups[key] = TelemetryBucket()
+        bucket.merge(TelemetryBucket.from_dict(record))
+    return groups
+
+
+if __name__ == "__main__":
+    import time
+    
+    compacted = compact()
+    print(f"Compacted {len(compacted)} segment(s)")
+    
+    week_ago = time.time() - 7 * 24 * 3600
+    for (query_type, model), bucket in sorted(rollup_window(since=week_ago).items()):
+        stats = bucket.summary()
+        print(f"  {query_type:20} {model:25} {stats['total_requests']:6} req  "
+              f"p95 {stats['latency']['p95_ms']:8.0f}ms  ${stats['total_cost']:.4f}")
@@ -0,0 +1,336 @@
+"""
+Incremental analytics over the line-JSON telemetry log.
+
+The telemetry stream is written in time-partitioned segments (see
+AsyncBatchHandler.segment_seconds): the active file plus closed, possibly
+gzipped, segment files. TelemetryIndex keeps a checkpoint for each segment:
+the byte offset parsed so far, a sparse (timestamp, offset) index and
+per-minute aggregates that carry a latency sketch. A refresh therefore only
+parses lines appended since the previous one, and a window query merges
+minute buckets instead of re-reading the log. Only the part of the minute
+that straddles the window start is read again, and the sparse index takes
+the read straight to it.
+
+Segments are identified by a hash of their first line, so a checkpoint
+survives the active file being renamed or gzipped into a closed segment.
+"""
+
+import bisect
+import gzip
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.log_utils import rotated_files
+from src.providers.metrics import LatencyHistogram
+
+BUCKET_SECONDS = 60
+# Records reach the file in batches, so timestamps are only nearly sorted;
+# range scans start this far before the requested time.
+ORDER_SLACK_SECONDS = 5.0
+
+
+class TelemetryBucket:
+    """Aggregates for one minute (or any merged set of minutes)"""
+    
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.cost = 0.0
+        self.latency = LatencyHistogram()
+        self.query_types = Counter()
+        self.error_types = Counter()
+    
+    def add(self, entry: Dict[str, Any]):
+        self.count += 1
+        if not entry.get("success"):
+            self.errors += 1
+            self.error_types[entry.get("error_type") or "unknown"] += 1
+        self.cost += entry.get("cost_usd") or 0.0
+        self.latency.record(entry.get("latency_ms") or 0.0)
+        self.query_types[entry.get("query_type") or "unknown"] += 1
+    
+    def merge(self, other: "TelemetryBucket"):
+        self.count += other.count
+        self.errors += other.errors
+        self.cost += other.cost
+        self.latency.merge(other.latency)
+        self.query_types.update(other.query_types)
+        self.error_types.update(other.error_types)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "cost": self.cost,
+            "latency": self.latency.to_dict(),
+            "query_types": dict(self.query_types),
+            "error_types": dict(self.error_types)
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TelemetryBucket":
+        bucket = cls()
+        bucket.count = data["count"]
+        bucket.errors = data["errors"]
+        bucket.cost = data["cost"]
+        bucket.latency = LatencyHistogram.from_dict(data["latency"])
+        bucket.query_types = Counter(data["query_types"])
+        bucket.error_types = Counter(data["error_types"])
+        return bucket
+    
+    def summary(self) -> Dict[str, Any]:
+        successes = self.count - self.errors
+        return {
+            "total_requests": self.count,
+            "successful_requests": successes,
+            "failed_requests": self.errors,
+            "success_rate": successes / self.count * 100 if self.count else 0.0,
+            "error_rate": self.errors / self.count * 100 if self.count else 0.0,
+            "latency": self.latency.summary(),
+            "total_cost": self.cost,
+            "avg_cost": self.cost / self.count if self.count else 0.0,
+            "query_types": dict(self.query_types.most_common()),
+            "error_types": dict(self.error_types.most_common())
+        }
+
+
+class _Segment:
+    """Checkpoint for one segment file"""
+    
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.path: Optional[str] = None
+        self.offset = 0
+        self.lines = 0
+        self.min_ts: Optional[float] = None
+        self.max_ts: Optional[float] = None
+        self.index: List[List[float]] = []  # sparse [timestamp, offset] pairs
+        self.buckets: Dict[int, TelemetryBucket] = {}
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "offset": self.offset,
+            "lines": self.lines,
+            "min_ts": self.min_ts,
+            "max_ts": self.max_ts,
+            "index": self.index,
+            "buckets": {str(start): b.to_dict() for start, b in self.buckets.items()}
+        }
+    
+    @classmethod
+    def from_dict(cls, fingerprint: str, data: Dict[str, Any]) -> "_Segment":
+        segment = cls(fingerprint)
+        segment.offset = data["offset"]
+        segment.lines = data["lines"]
+        segment.min_ts = data["min_ts"]
+        segment.max_ts = data["max_ts"]
+        segment.index = data["index"]
+        segment.buckets = {int(start): TelemetryBucket.from_dict(b) for start, b in data["buckets"].items()}
+        return segment
+
+
+def open_segment(path: str):
+    """Open a segment for binary reading, gzipped or not"""
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def segment_fingerprint(path: str) -> Optional[str]:
+    """Hash of a segment's first line; None while it is empty or that line is still being written"""
+    with open_segment(path) as f:
+        first = f.readline(4096)
+    if not first.endswith(b"\n"):
+        return None
+    return hashlib.sha1(first).hexdigest()
+
+
+def parse_entry(line: bytes) -> Optional[Dict[str, Any]]:
+    """Parse one log line: the telemetry entry with an epoch `_ts` added, or None for anything else"""
+    try:
+        entry = json.loads(line)
+        entry["_ts"] = datetime.fromisoformat(entry["timestamp"]).timestamp()
+    except (ValueError, KeyError, TypeError):
+        return None
+    if "latency_ms" not in entry:
+        return None
+    return entry
+
+
+class TelemetryIndex:
+    """
+    Checkpointed, incremental view of a telemetry log.
+    
+    refresh() parses new lines; summary(hours) answers a window query from
+    the minute buckets. The checkpoint is saved to `state_path` (default:
+    <log_file>.index.json) so a new process resumes where the last stopped.
+    """
+    
+    def __init__(self, log_file: str = "logs/telemetry.log", state_path: Optional[str] = None,
+                 index_every: int = 256):
+        self.log_file = log_file
+        self.state_path = state_path if state_path is not None else f"{log_file}.index.json"
+        self.index_every = max(1, index_every)
+        self._segments: Dict[str, _Segment] = {}
+        self._fingerprints: Dict[str, tuple] = {}  # path -> (mtime_ns, size, fingerprint)
+        self._lock = threading.Lock()
+        self._load()
+    
+    # ----- checkpoint -----
+    
+    def _load(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path) as f:
+                data = json.load(f)
+            self._segments = {
+                fp: _Segment.from_dict(fp, seg) for fp, seg in data["segments"].items()
+            }
+        except (ValueError, KeyError, TypeError, OSError):
+            self._segments = {}  # unreadable checkpoint: rebuild from the log
+    
+    def save(self):
+        if not self.state_path:
+            return
+        data = {"segments": {fp: seg.to_dict() for fp, seg in self._segments.items()}}
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.state_path)
+    
+    # ----- ingestion -----
+    
+    def _segment_paths(self) -> List[str]:
+        paths = rotated_files(self.log_file)
+        if os.path.exists(self.log_file):
+            paths.append(self.log_file)
+        return paths
+    
+    def _fingerprint(self, path: str) -> Optional[str]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        cached = self._fingerprints.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        
+        fingerprint = segment_fingerprint(path)
+        if fingerprint is None:
+            return None
+        self._fingerprints[path] = (stat.st_mtime_ns, stat.st_size, fingerprint)
+        return fingerprint
+    
+    def refresh(self) -> int:
+        """Parse everything appended since the last refresh; returns the number of new entries"""
+        with self._lock:
+            parsed = 0
+            present = set()
+            for path in self._segment_paths():
+                fingerprint = self._fingerprint(path)
+                if fingerprint is None:
+                    continue
+                present.add(fingerprint)
+                segment = self._segments.get(fingerprint)
+                if segment is None:
+                    segment = self._segments[fingerprint] = _Segment(fingerprint)
+                segment.path = path
+                parsed += self._consume(segment)
+            
+            # Segments deleted by retention drop out of the checkpoint too
+            for fingerprint in list(self._segments):
+                if fingerprint not in present:
+                    del self._segments[fingerprint]
+            self._fingerprints = {p: v for p, v in self._fingerprints.items() if v[2] in present}
+            
+            if parsed:
+                self.save()
+            return parsed
+    
+    def _consume(self, segment: _Segment) -> int:
+        parsed = 0
+        with open_segment(segment.path) as f:
+            f.seek(segment.offset)
+            offset = segment.offset
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partial last line: pick it up next time
+                line_offset, offset = offset, offset + len(line)
+                entry = parse_entry(line)
+                if entry is None:
+                    continue
+                
+                ts = entry["_ts"]
+                if segment.lines % self.index_every == 0:
+                    segment.index.append([ts, line_offset])
+                segment.lines += 1
+                segment.min_ts = ts if segment.min_ts is None else min(segment.min_ts, ts)
+                segment.max_ts = ts if segment.max_ts is None else max(segment.max_ts, ts)
+                
+                start = int(ts // BUCKET_SECONDS) * BUCKET_SECONDS
+                bucket = segment.buckets.get(start)
+                if bucket is None:
+                    bucket = segment.buckets[start] = TelemetryBucket()
+                bucket.add(entry)
+                parsed += 1
+            segment.offset = offset
+        return parsed
+    
+    # ----- queries -----
+    
+    def entries(self, since: float, until: float = math.inf) -> Iterator[Dict[str, Any]]:
+        """Raw entries with since <= timestamp < until, located through the sparse index"""
+        for segment in sorted(self._segments.values(), key=lambda s: s.min_ts or 0):
+            if segment.max_ts is None or segment.max_ts < since or segment.min_ts >= until:
+                continue
+            
+            keys = [point[0] for point in segment.index]
+            i = bisect.bisect_right(keys, since - ORDER_SLACK_SECONDS) - 1
+            start = segment.index[i][1] if i >= 0 else 0
+            
+            with open_segment(segment.path) as f:
+                f.seek(start)
+                offset = start
+                for line in f:
+                    offset += len(line)
+                    if offset > segment.offset:
+                        break
+                    entry = parse_entry(line)
+                    if entry is None:
+                        continue
+                    if entry["_ts"] >= until + ORDER_SLACK_SECONDS:
+                        break
+                    if since <= entry["_ts"] < until:
+                        yield entry
+    
+    def window(self, hours: float = 24, now: Optional[float] = None) -> TelemetryBucket:
+        """Merged aggregates for the last `hours` hours"""
+        now = time.time() if now is None else now
+        cutoff = now - hours * 3600
+        first_full = math.ceil(cutoff / BUCKET_SECONDS) * BUCKET_SECONDS
+        
+        with self._lock:
+            total = TelemetryBucket()
+            for segment in self._segments.values():
+                if segment.max_ts is None or segment.max_ts < cutoff:
+                    continue
+                for start, bucket in segment.buckets.items():
+                    if start >= first_full:
+                        total.merge(bucket)
+            
+            # The minute the window starts in is only partly inside it
+            if first_full > cutoff:
+                for entry in self.entries(cutoff, first_full):
+                    total.add(entry)
+            return total
+    
+    def summary(self, hours: float = 24, now: Optional[float] = None) -> Dict[str, Any]:
+        """refresh() and summarize the last `hours` hours"""
+        self.refresh()
+        return self.window(hours, now).summary()
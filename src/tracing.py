@@ -0,0 +1,247 @@
+"""
+Per-stage spans for agent requests.
+
+A Trace collects the spans of one request. The agents and tools mark their
+stages with `span(name)` (LLM calls, tool execution, cache get/set,
+validation, serialization, telemetry writes); the spans go to the ambient
+trace set by `trace_scope()`, the same way deadlines are carried (see
+src/deadline.py), so nothing has to be threaded through call signatures.
+Without an active trace `span()` only does one context-variable lookup.
+
+StageStats aggregates many traces into a per-stage breakdown, and
+write_chrome_trace() / write_folded() export them for chrome://tracing
+(or Perfetto) and flamegraph.pl / speedscope.
+"""
+
+import contextvars
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.perf_stats import quantile
+
+ROOT_SPAN = "request"
+
+
+class Span:
+    """One timed stage; `path` is the chain of enclosing span names, outermost first"""
+    
+    __slots__ = ("name", "path", "start_ns", "end_ns", "thread_id", "attrs")
+    
+    def __init__(self, name: str, path: Tuple[str, ...], attrs: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.path = path
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns: Optional[int] = None
+        self.thread_id = threading.get_ident()
+        self.attrs = attrs or {}
+    
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.perf_counter_ns()
+        return (end - self.start_ns) / 1e6
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "path": list(self.path),
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 4),
+            "thread_id": self.thread_id,
+            "attrs": self.attrs
+        }
+
+
+class Trace:
+    """Spans of one request (in the order they finished)"""
+    
+    def __init__(self, name: str = ROOT_SPAN, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.spans: List[Span] = []
+    
+    def record(self, span: Span):
+        self.spans.append(span)  # list.append is atomic; spans may end on worker threads
+    
+    @property
+    def duration_ms(self) -> float:
+        roots = [s for s in self.spans if len(s.path) == 1]
+        return sum(s.duration_ms for s in roots)
+    
+    def stage_totals(self) -> Dict[str, float]:
+        """Total milliseconds per stage name (a stage that runs twice is summed)"""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration_ms
+        return totals
+
+
+_current = contextvars.ContextVar("trace", default=None)
+_path = contextvars.ContextVar("span_path", default=())
+
+
+def current_trace() -> Optional[Trace]:
+    """Trace of the request being served on this thread/task, if any"""
+    return _current.get()
+
+
+@contextmanager
+def trace_scope(trace: Optional[Trace]):
+    """Make `trace` the ambient trace and time the enclosed block as its root span"""
+    token = _current.set(trace)
+    path_token = _path.set(())
+    try:
+        if trace is None:
+            yield None
+        else:
+            with span(trace.name, **trace.attrs):
+                yield trace
+    finally:
+        _path.reset(path_token)
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time the enclosed block as stage `name` of the ambient trace (no-op without one)"""
+    trace = _current.get()
+    if trace is None:
+        yield None
+        return
+    
+    path = _path.get() + (name,)
+    current = Span(name, path, attrs)
+    token = _path.set(path)
+    try:
+        yield current
+    except BaseException as e:
+        current.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        current.end_ns = time.perf_counter_ns()
+        _path.reset(token)
+        trace.record(current)
+
+
+def traced(name: str) -> Callable:
+    """Decorator form of span()"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ==================== AGGREGATION ====================
+
+class StageStats:
+    """
+    Per-stage latency breakdown over many traces.
+    
+    For every stage: how many requests ran it, its mean/p50/p95 time per
+    request that ran it and its share of total request time. Nested stages
+    (e.g. tool internals) are counted inside their parents too, so shares
+    of different depths overlap. `(unattributed)` is request time not
+    covered by any top-level stage (agent glue code).
+    """
+    
+    UNATTRIBUTED = "(unattributed)"
+    
+    def __init__(self):
+        self.requests = 0
+        self.request_ms: List[float] = []
+        self.stage_ms: Dict[str, List[float]] = {}
+        self.calls: Dict[str, int] = {}
+    
+    def add(self, trace: Trace):
+        roots = [s for s in trace.spans if len(s.path) == 1]
+        if not roots:
+            return
+        self.requests += 1
+        total = sum(s.duration_ms for s in roots)
+        self.request_ms.append(total)
+        
+        per_request: Dict[str, float] = {}
+        for span in trace.spans:
+            if len(span.path) > 1:
+                per_request[span.name] = per_request.get(span.name, 0.0) + span.duration_ms
+                self.calls[span.name] = self.calls.get(span.name, 0) + 1
+        for name, ms in per_request.items():
+            self.stage_ms.setdefault(name, []).append(ms)
+        
+        covered = sum(s.duration_ms for s in trace.spans if len(s.path) == 2)
+        self.stage_ms.setdefault(self.UNATTRIBUTED, []).append(max(0.0, total - covered))
+    
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """{stage: stats}, largest share of request time first"""
+        grand_total = sum(self.request_ms)
+        stages = {}
+        for name, values in self.stage_ms.items():
+            values = sorted(values)
+            stages[name] = {
+                "requests": len(values),
+                "calls": self.calls.get(name, len(values)),
+                "mean_ms": round(sum(values) / len(values), 4),
+                "p50_ms": round(quantile(values, 0.50, True), 4),
+                "p95_ms": round(quantile(values, 0.95, True), 4),
+                "total_ms": round(sum(values), 4),
+                "share_percent": round(sum(values) / grand_total * 100, 1) if grand_total else 0.0
+            }
+        return dict(sorted(stages.items(), key=lambda item: -item[1]["total_ms"]))
+
+
+def format_stages(summary: Dict[str, Dict[str, Any]], indent: str = "  ") -> str:
+    """Text table of a StageStats summary"""
+    lines = [f"{indent}{'stage':<34}{'calls':>7}{'mean ms':>11}{'p95 ms':>11}{'share':>8}"]
+    for name, stats in summary.items():
+        lines.append(f"{indent}{name:<34}{stats['calls']:>7}{stats['mean_ms']:>11.3f}"
+                     f"{stats['p95_ms']:>11.3f}{stats['share_percent']:>7.1f}%")
+    return "\n".join(lines)
+
+
+# ==================== EXPORT ====================
+
+def write_chrome_trace(traces: Iterable[Trace], path: str):
+    """Chrome trace-event JSON (chrome://tracing, ui.perfetto.dev): one complete event per span"""
+    events = []
+    for index, trace in enumerate(traces):
+        for span in trace.spans:
+            events.append({
+                "name": span.name,
+                "cat": span.name.split(".")[0],
+                "ph": "X",
+                "ts": span.start_ns / 1000,
+                "dur": (span.end_ns - span.start_ns) / 1000,
+                "pid": 1,
+                "tid": span.thread_id,
+                "args": dict(span.attrs, trace=index)
+            })
+    events.sort(key=lambda e: e["ts"])
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def write_folded(traces: Iterable[Trace], path: str):
+    """Folded stacks ("a;b;c self_microseconds" per line) for flamegraph.pl or speedscope"""
+    inclusive: Dict[Tuple[str, ...], float] = {}
+    for trace in traces:
+        for span in trace.spans:
+            inclusive[span.path] = inclusive.get(span.path, 0.0) + (span.end_ns - span.start_ns) / 1000
+    
+    children: Dict[Tuple[str, ...], float] = {}
+    for stack, us in inclusive.items():
+        if len(stack) > 1:
+            children[stack[:-1]] = children.get(stack[:-1], 0.0) + us
+    
+    with open(path, "w") as f:
+        for stack in sorted(inclusive):
+            self_us = max(0.0, inclusive[stack] - children.get(stack, 0.0))
+            if self_us >= 1:
+                f.write(f"{';'.join(stack)} {int(self_us)}\n")
@@ -1,9 +1,12 @@
 import os
+import logging
 from src.providers.openai_provider import OpenAIProvider
 from src.providers.anthropic_provider import AnthropicProvider
 from src.providers.ollama_provider import OllamaProvider
 from src.providers.router import LLMRouter
 
+logging.basicConfig(level=logging.DEBUG, format="[%(name)s] %(message)s")
+
 # Setup providers (OpenAI → Anthropic → Ollama)
 providers = [
     OpenAIProvider(
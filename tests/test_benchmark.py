@@ -0,0 +1,109 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+
+import pytest
+from benchmark import Benchmark, LoadGenerator, response_succeeded
+from src.backend.ai.fake_gemini import FakeGeminiBackend
+from src.backend.ai.gemini_backend import use_fake_backend, use_live_backend
+from src.backend.ai.optimized_agent import OptimizedCodeMentorAgent
+
+
+class SlowSession:
+    """Agent session that takes a fixed time per message"""
+    
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.messages = 0
+    
+    def send_message(self, query):
+        time.sleep(self.seconds)
+        self.messages += 1
+        return "ok"
+
+
+# ===== LOAD GENERATOR =====
+
+def test_load_step_reports_throughput_and_latency():
+    """Test that an unsaturated step keeps up with the offered rate"""
+    generator = LoadGenerator(lambda _: SlowSession(0.01), num_users=4)
+    
+    step = generator.run_step(target_rps=40, duration_seconds=1.0)
+    
+    assert step["error_rate"] == 0
+    assert step["achieved_rps"] >= 0.8 * step["offered_rps"]
+    assert 0.01 <= step["p50_latency"] < 0.2
+
+
+def test_load_curve_finds_saturation_point():
+    """Test that throughput capped by per-user sessions is reported as saturation"""
+    # 2 users x 20 requests/s each = 40 rps capacity
+    generator = LoadGenerator(lambda _: SlowSession(0.05), num_users=2)
+    
+    report = generator.run_curve([10, 100], duration_seconds=1.0)
+    
+    assert report["max_sustainable_rps"] == 10
+    assert report["saturation_rps"] == 100
+    assert report["curve"][-1]["p95_latency"] > report["curve"][0]["p95_latency"]
+
+
+def test_load_curve_starts_each_level_with_fresh_sessions():
+    """Test that chat history from one rate level doesn't carry into the next"""
+    created = []
+    
+    def factory(user):
+        created.append(SlowSession(0.001))
+        return created[-1]
+    
+    generator = LoadGenerator(factory, num_users=2)
+    report = generator.run_curve([5, 10], duration_seconds=0.5)
+    
+    assert len(created) == 4
+    first_level, second_level = created[:2], created[2:]
+    assert sum(s.messages for s in first_level) == report["curve"][0]["offered_requests"]
+    assert sum(s.messages for s in second_level) == report["curve"][1]["offered_requests"]
+
+
+def test_session_errors_count_as_failures():
+    """Test that exceptions from a session show up in the error rate"""
+    class Broken:
+        def send_message(self, query):
+            raise ConnectionError("down")
+    
+    step = LoadGenerator(lambda _: Broken(), num_users=1).run_step(20, 0.3)
+    
+    assert step["error_rate"] == 1.0
+    assert step["errors"] == {"ConnectionError": step["offered_requests"]}
+
+
+# ===== BENCHMARK =====
+
+def test_error_replies_count_as_failures():
+    """Test that agents' "Error..." replies and unsuccessful dicts are failures"""
+    assert response_succeeded("Here is your next problem")
+    assert not response_succeeded("Error: injected fake Gemini error")
+    assert not response_succeeded("Error processing message: timeout")
+    assert not response_succeeded({"success": False, "message": "Invalid input"})
+
+
+def test_benchmark_measures_injected_errors():
+    """Test that the fake backend's injected errors show up in failed_queries"""
+    use_fake_backend(FakeGeminiBackend(error_rate=0.5, seed=1))
+    try:
+        bench = Benchmark("fake", OptimizedCodeMentorAgent())
+        stats = bench.run_benchmark(["What problem should I practice next?"], num_iterations=20,
+                                    warmup_iterations=0)
+    finally:
+        use_live_backend()
+    
+    failures = [r for r in bench.results if not r["success"]]
+    assert 0 < stats["failed_queries"] == len(failures) < stats["total_queries"]
+    assert all("injected fake Gemini error" in r["error"] for r in failures)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,65 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from types import SimpleNamespace
+import pytest
+from src.cost_model import (
+    calculate_cost,
+    estimate_tokens,
+    usage_from_gemini,
+    usage_from_ollama
+)
+
+
+def test_calculate_cost_uses_per_million_pricing():
+    """Test cost for a known model, with and without the models/ prefix"""
+    cost = calculate_cost("models/gemini-2.0-flash-exp", 1_000_000, 1_000_000)
+    
+    assert cost == pytest.approx(0.50)
+    assert calculate_cost("gemini-2.0-flash-exp", 1_000_000, 0) == pytest.approx(0.10)
+
+
+def test_calculate_cost_unknown_model_is_free():
+    """Test that local / unpriced models cost nothing"""
+    assert calculate_cost("llama3.1:8b", 5000, 5000) == 0.0
+
+
+def test_estimate_tokens_scales_with_text():
+    """Test that the local estimate is non-zero and grows with input"""
+    short = estimate_tokens("def two_sum(nums, target):")
+    long = estimate_tokens("def two_sum(nums, target):\n" * 20)
+    
+    assert estimate_tokens("") == 0
+    assert short > 0
+    assert long > short * 10
+
+
+def test_usage_from_gemini_metadata():
+    """Test that reported usage_metadata is preferred over estimates"""
+    response = SimpleNamespace(
+        text="hello",
+        usage_metadata=SimpleNamespace(prompt_token_count=120, candidates_token_count=30, total_token_count=150)
+    )
+    usage = usage_from_gemini(response, "prompt")
+    
+    assert (usage.input_tokens, usage.output_tokens, usage.estimated) == (120, 30, False)
+
+
+def test_usage_from_gemini_falls_back_to_estimate():
+    """Test the estimate when the response carries no usage metadata"""
+    usage = usage_from_gemini(SimpleNamespace(text="Try two-sum next."), "What should I practice?")
+    
+    assert usage.estimated
+    assert usage.input_tokens > 0 and usage.output_tokens > 0
+
+
+def test_usage_from_ollama_counts():
+    """Test Ollama prompt_eval_count / eval_count handling"""
+    usage = usage_from_ollama({"prompt_eval_count": 12, "eval_count": 40}, "p", "c")
+    assert usage.total_tokens == 52 and not usage.estimated
+    
+    estimated = usage_from_ollama({}, "some prompt", "some reply")
+    assert estimated.estimated and estimated.total_tokens > 0
@@ -0,0 +1,126 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from src.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    current_deadline,
+    deadline_scope,
+    run_with_timeout,
+    run_with_timeout_async,
+    timeout_for
+)
+from src.backend.functions.tools import get_recommended_problem
+
+
+def test_deadline_timeout_is_capped_by_remaining_time():
+    """Test that per-operation timeouts never exceed the time left"""
+    deadline = Deadline(2.0)
+    
+    assert deadline.timeout(30) <= 2.0
+    assert deadline.timeout(0.5) == 0.5
+    assert deadline.can_fit(1.0)
+    assert not deadline.can_fit(5.0)
+
+
+def test_expired_deadline_raises():
+    """Test that check() raises once the deadline has passed"""
+    deadline = Deadline(0)
+    
+    assert deadline.expired
+    with pytest.raises(DeadlineExceeded):
+        deadline.check("test")
+
+
+def test_deadline_scope_is_ambient_and_restored():
+    """Test that deadline_scope sets and then clears the ambient deadline"""
+    deadline = Deadline(10)
+    
+    assert current_deadline() is None
+    assert timeout_for(30) == 30
+    with deadline_scope(deadline):
+        assert current_deadline() is deadline
+        assert timeout_for(30) <= 10
+    assert current_deadline() is None
+
+
+def test_tools_refuse_work_after_deadline():
+    """Test that tools don't run for a request that has already timed out"""
+    with deadline_scope(Deadline(0)):
+        with pytest.raises(DeadlineExceeded):
+            get_recommended_problem(user_id="user_001")
+    
+    # Without a deadline the tool runs normally
+    assert get_recommended_problem(user_id="user_001").recommended_problem is not None
+
+
+# ==================== Thread-safe timeouts ====================
+
+def test_run_with_timeout_works_off_main_thread():
+    """Test that the timeout works from worker threads (SIGALRM can't)"""
+    import threading
+    results = []
+    
+    thread = threading.Thread(target=lambda: results.append(run_with_timeout(lambda x: x * 2, 1.0, 21)))
+    thread.start()
+    thread.join()
+    
+    assert results == [42]
+
+
+def test_run_with_timeout_raises_and_cancels_cooperatively():
+    """Test that a slow call times out and sees its deadline expire"""
+    import time
+    seen = []
+    
+    def slow():
+        time.sleep(0.3)
+        seen.append(current_deadline().expired)
+    
+    with pytest.raises(TimeoutError):
+        run_with_timeout(slow, 0.05)
+    time.sleep(0.4)
+    
+    assert seen == [True]
+
+
+def test_run_with_timeout_respects_outer_deadline():
+    """Test that the request deadline wins when it is shorter than the timeout"""
+    import time
+    
+    with deadline_scope(Deadline(0.05)):
+        with pytest.raises(TimeoutError):
+            run_with_timeout(time.sleep, 5.0, 0.5)
+
+
+def test_run_with_timeout_does_not_queue_behind_hung_calls():
+    """Test that more timed calls than any worker pool would hold all run at once"""
+    import threading
+    calls = 40
+    barrier = threading.Barrier(calls)
+    results = []
+    
+    def caller():
+        results.append(run_with_timeout(barrier.wait, 5.0, 5.0))
+    
+    threads = [threading.Thread(target=caller) for _ in range(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert sorted(results) == list(range(calls))
+
+
+def test_run_with_timeout_async():
+    """Test the asyncio variant"""
+    import asyncio
+    import time
+    
+    assert asyncio.run(run_with_timeout_async(lambda: "ok", 1.0)) == "ok"
+    with pytest.raises(TimeoutError):
+        asyncio.run(run_with_timeout_async(time.sleep, 0.05, 0.3))
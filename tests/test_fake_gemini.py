@@ -0,0 +1,108 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+
+import pytest
+from src.backend.ai.fake_gemini import FakeGeminiBackend, load_golden_script
+from src.backend.ai.gemini_backend import use_fake_backend, use_live_backend
+from src.backend.ai.agent import CodeMentorAgent
+from src.backend.ai.optimized_agent import OptimizedCodeMentorAgent
+from src.backend.ai.production_agent import ProductionAgent
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "golden_set.json")
+
+
+@pytest.fixture
+def fake_backend():
+    backend = use_fake_backend(FakeGeminiBackend())
+    yield backend
+    use_live_backend()
+
+
+def golden_cases_with_function():
+    with open(GOLDEN_PATH) as f:
+        cases = json.load(f)["golden_set"]
+    return [c for c in cases if c.get("expected_function")]
+
+
+# ===== SCRIPTED TURNS =====
+
+def test_golden_set_cases_replay_expected_function():
+    """Test that every golden case with an expected_function is scripted to call it"""
+    backend = FakeGeminiBackend()
+    
+    for case in golden_cases_with_function():
+        turn = backend.plan(case["query"])
+        assert turn["function_call"] == case["expected_function"]
+    assert len(load_golden_script()) == len(golden_cases_with_function())
+
+
+def test_explicit_script_overrides_routing():
+    """Test that a scripted text turn wins over keyword routing"""
+    backend = FakeGeminiBackend(script={"Recommend a problem": {"text": "No."}})
+    
+    chat = backend.GenerativeModel(model_name="m").start_chat()
+    assert chat.send_message("Recommend a problem").text == "No."
+
+
+# ===== AGENTS OFFLINE =====
+
+@pytest.mark.parametrize("agent_class", [CodeMentorAgent, OptimizedCodeMentorAgent])
+def test_agents_run_golden_set_offline(fake_backend, agent_class):
+    """Test that the chat agents answer golden queries through the fake backend"""
+    agent = agent_class()
+    agent.start_conversation()
+    
+    for case in golden_cases_with_function():
+        reply = agent.send_message(case["query"])
+        assert not reply.startswith("Error"), reply
+    assert fake_backend.calls >= 2 * len(golden_cases_with_function())
+
+
+def test_production_agent_runs_offline(fake_backend):
+    """Test that ProductionAgent calls tools and prices tokens with the fake backend"""
+    agent = ProductionAgent(cost_limit=10.0)
+    
+    result = agent.send_message("What problem should I practice next?", user_id="user_001")
+    
+    assert result["success"]
+    assert "recommend" in result["message"].lower()
+    assert result["cost_summary"]["call_count"] == 2
+    assert result["cost_summary"]["total_tokens"] > 0
+
+
+# ===== INJECTED FAULTS =====
+
+def test_error_injection_is_reproducible():
+    """Test that the same seed fails the same calls"""
+    def failures(seed):
+        backend = FakeGeminiBackend(error_rate=0.3, seed=seed)
+        chat = backend.GenerativeModel().start_chat()
+        pattern = []
+        for _ in range(50):
+            try:
+                chat.send_message("hello")
+                pattern.append(False)
+            except ConnectionError:
+                pattern.append(True)
+        return pattern
+    
+    assert failures(7) == failures(7)
+    assert 5 < sum(failures(7)) < 25
+
+
+def test_latency_beyond_timeout_raises():
+    """Test that injected latency over the request timeout becomes a TimeoutError"""
+    backend = FakeGeminiBackend(latency_ms=500)
+    chat = backend.GenerativeModel().start_chat()
+    
+    with pytest.raises(TimeoutError):
+        chat.send_message("hello", request_options={"timeout": 0.05})
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,54 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from microbench import HEAVY_MODULES, IMPORT_MODULES, import_problems, measure_import
+
+
+# ===== IMPORT SIDE EFFECTS =====
+
+@pytest.mark.parametrize("module", IMPORT_MODULES)
+def test_import_loads_no_sdk_and_creates_no_files(module):
+    result = measure_import(module, runs=1)
+    assert result["heavy_modules"] == []
+    assert result["created_files"] == []
+
+
+def test_import_problems_reports_sdks_and_files():
+    results = {
+        "clean": {"heavy_modules": [], "created_files": []},
+        "eager": {"heavy_modules": [HEAVY_MODULES[0]], "created_files": ["logs"]},
+    }
+    problems = import_problems(results)
+    assert problems == [f"eager: imports {HEAVY_MODULES[0]}", "eager: creates logs"]
+
+
+# ===== EXPLICIT INIT =====
+
+def test_production_logging_is_created_on_first_use(tmp_path, monkeypatch):
+    from src.backend.ai import production_agent
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(production_agent, "audit_logger", None)
+    monkeypatch.setattr(production_agent, "telemetry_logger", None)
+    production_agent.init_logging()
+    first = production_agent.audit_logger
+    production_agent.init_logging()
+    assert production_agent.audit_logger is first
+    assert production_agent.telemetry_logger is not None
+
+
+def test_src_package_exports_providers_lazily():
+    import src
+    assert "LLMRouter" in dir(src)
+    from src import LLMRouter
+    from src.providers.router import LLMRouter as router_class
+    assert LLMRouter is router_class
+    with pytest.raises(AttributeError):
+        src.SimpleRouter
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,218 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import gzip
+import json
+import logging
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from src import log_utils
+from src.log_utils import AsyncBatchHandler, get_stream_logger, rotated_files
+
+
+def make_logger(name, handler):
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def read_lines(path):
+    with open(path) as f:
+        return [line for line in f.read().splitlines() if line]
+
+
+# ===== ASYNC BATCH HANDLER =====
+
+def test_dict_records_are_written_as_json_lines(tmp_path):
+    """Test that dict messages are serialized by the writer thread"""
+    path = tmp_path / "audit.log"
+    handler = AsyncBatchHandler(str(path))
+    logger = make_logger("test.async.json", handler)
+    
+    logger.info({"event_type": "a", "n": 1})
+    logger.info("plain %s", "text")
+    handler.flush()
+    
+    lines = read_lines(path)
+    assert json.loads(lines[0]) == {"event_type": "a", "n": 1}
+    assert lines[1] == "plain text"
+    handler.close()
+
+
+def test_concurrent_writers_lose_nothing(tmp_path):
+    """Test that records from many threads all reach the file in whole lines"""
+    path = tmp_path / "telemetry.log"
+    handler = AsyncBatchHandler(str(path), batch_size=32)
+    logger = make_logger("test.async.threads", handler)
+    
+    def write_many(worker):
+        for i in range(250):
+            logger.info({"worker": worker, "i": i})
+    
+    threads = [threading.Thread(target=write_many, args=(w,)) for w in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    handler.close()
+    
+    entries = [json.loads(line) for line in read_lines(path)]
+    assert len(entries) == 2000
+    assert handler.dropped == 0
+
+
+def test_drop_newest_policy_bounds_the_queue(tmp_path):
+    """Test that a full buffer drops and counts records instead of growing"""
+    path = tmp_path / "drop.log"
+    handler = AsyncBatchHandler(str(path), capacity=5, batch_size=1000,
+                                flush_interval=60, overflow="drop_newest")
+    logger = make_logger("test.async.drop", handler)
+    
+    for i in range(20):
+        logger.info({"i": i})
+    
+    assert handler.stats()["queued"] == 5
+    assert handler.dropped == 15
+    handler.close()
+    assert [json.loads(line)["i"] for line in read_lines(path)] == [0, 1, 2, 3, 4]
+
+
+def test_drop_oldest_policy_keeps_latest_records(tmp_path):
+    """Test that drop_oldest keeps the most recent records"""
+    path = tmp_path / "oldest.log"
+    handler = AsyncBatchHandler(str(path), capacity=3, batch_size=1000, flush_interval=60)
+    logger = make_logger("test.async.oldest", handler)
+    
+    for i in range(10):
+        logger.info({"i": i})
+    handler.close()
+    
+    assert [json.loads(line)["i"] for line in read_lines(path)] == [7, 8, 9]
+    assert handler.dropped == 7
+
+
+def test_unknown_overflow_policy_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        AsyncBatchHandler(str(tmp_path / "x.log"), overflow="spill")
+
+
+# ===== STREAMS AND ROTATION =====
+
+def test_rotation_gzips_old_files(tmp_path):
+    """Test that full files rotate to .1.gz, .2.gz and old ones fall off"""
+    path = tmp_path / "telemetry.log"
+    handler = AsyncBatchHandler(str(path), batch_size=1, max_bytes=200,
+                                backup_count=2, compress=True)
+    logger = make_logger("test.async.rotate", handler)
+    
+    for i in range(30):
+        logger.info({"i": i, "pad": "x" * 40})
+        handler.flush()
+    handler.close()
+    
+    assert os.path.getsize(path) <= 200
+    assert (tmp_path / "telemetry.log.1.gz").exists()
+    assert (tmp_path / "telemetry.log.2.gz").exists()
+    assert not (tmp_path / "telemetry.log.3.gz").exists()
+    
+    with gzip.open(tmp_path / "telemetry.log.1.gz", "rt") as f:
+        rotated = [json.loads(line)["i"] for line in f]
+    current = [json.loads(line)["i"] for line in read_lines(path)]
+    assert rotated[-1] + 1 == current[0]
+
+
+def test_time_segments_roll_and_age_out(tmp_path, monkeypatch):
+    """Test that segment_seconds closes dated segments and keeps backup_count of them"""
+    clock = [1740830400.0]  # an hour boundary
+    fake_time = SimpleNamespace(
+        time=lambda: clock[0],
+        monotonic=time.monotonic,
+        strftime=time.strftime,
+        gmtime=time.gmtime
+    )
+    monkeypatch.setattr(log_utils, "time", fake_time)
+    
+    path = tmp_path / "telemetry.log"
+    handler = AsyncBatchHandler(str(path), batch_size=1, segment_seconds=3600, backup_count=2)
+    logger = make_logger("test.async.segments", handler)
+    
+    for hour in range(4):
+        logger.info({"hour": hour})
+        handler.flush()
+        clock[0] += 3600
+    handler.close()
+    
+    segments = rotated_files(str(path))
+    assert len(segments) == 2
+    assert [json.loads(l)["hour"] for l in read_lines(segments[0])] == [1]
+    assert [json.loads(l)["hour"] for l in read_lines(segments[1])] == [2]
+    assert [json.loads(l)["hour"] for l in read_lines(path)] == [3]
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_segment_name_collision_does_not_overwrite(tmp_path, monkeypatch, compress):
+    """Test that a period closed twice (clock set back) keeps both parts, under its UTC name"""
+    clock = [1740830400.0]  # 2025-03-01 12:00 UTC
+    fake_time = SimpleNamespace(
+        time=lambda: clock[0],
+        monotonic=time.monotonic,
+        strftime=time.strftime,
+        gmtime=time.gmtime
+    )
+    monkeypatch.setattr(log_utils, "time", fake_time)
+    
+    path = tmp_path / "telemetry.log"
+    handler = AsyncBatchHandler(str(path), batch_size=1, segment_seconds=3600, compress=compress)
+    logger = make_logger(f"test.async.collision.{compress}", handler)
+    
+    for step, offset in enumerate([0, 3600, 0, 3600]):
+        clock[0] = 1740830400.0 + offset
+        logger.info({"step": step})
+        handler.flush()
+    handler.close()
+    
+    first = str(tmp_path / "telemetry.log.20250301-120000") + (".gz" if compress else "")
+    opener = gzip.open if compress else open
+    with opener(first, "rt") as f:
+        assert [json.loads(line)["step"] for line in f] == [0, 2]
+    assert len(rotated_files(str(path))) == 2
+
+
+def test_stream_loggers_do_not_cross_write(tmp_path):
+    """Test that each stream logger writes only its own file, not the root's"""
+    root_records = []
+    
+    class Collect(logging.Handler):
+        def emit(self, record):
+            root_records.append(record)
+    
+    root_handler = Collect()
+    logging.getLogger().addHandler(root_handler)
+    try:
+        audit = get_stream_logger("test.stream.audit", str(tmp_path / "audit.log"))
+        telemetry = get_stream_logger("test.stream.telemetry", str(tmp_path / "telemetry.log"))
+        assert get_stream_logger("test.stream.audit", str(tmp_path / "audit.log")) is audit
+        assert len(audit.handlers) == 1
+        
+        audit.info({"event_type": "login"})
+        telemetry.info({"request_id": "r1"})
+        for logger in (audit, telemetry):
+            logger.handlers[0].close()
+    finally:
+        logging.getLogger().removeHandler(root_handler)
+    
+    assert [json.loads(l) for l in read_lines(tmp_path / "audit.log")] == [{"event_type": "login"}]
+    assert [json.loads(l) for l in read_lines(tmp_path / "telemetry.log")] == [{"request_id": "r1"}]
+    assert root_records == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
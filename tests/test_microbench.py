@@ -0,0 +1,95 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+
+import pytest
+import microbench
+from microbench import (
+    BASELINE_PATH,
+    CODE_SIZE_CAP,
+    build_cases,
+    compare,
+    generate_catalog,
+    generate_code,
+    generate_profile,
+    measure,
+    run_suite
+)
+from src.backend.functions import tools
+
+
+# ===== INPUTS =====
+
+def test_generated_code_respects_size_cap():
+    assert len(generate_code(10).splitlines()) == 10
+    capped = generate_code(10 ** 6)
+    assert CODE_SIZE_CAP - 100 < len(capped) <= CODE_SIZE_CAP
+    assert capped.startswith("def two_sum")
+
+
+def test_generated_data_sizes():
+    assert len(generate_profile(100)) == 100
+    catalog = generate_catalog(50)
+    assert len(catalog) == 50
+    assert set(tools.MOCK_PROBLEMS) <= set(catalog)
+
+
+def test_cases_restore_tool_data():
+    """Test that measuring a case leaves the tools' profiles and catalog as they were"""
+    catalog = tools.MOCK_PROBLEMS
+    profiles = dict(tools.USER_WEAKNESS_PROFILES)
+    case = next(c for c in build_cases() if c.catalog is not None)
+    
+    result = measure(case, min_time=0.01, rounds=2)
+    
+    assert result["ops_per_sec"] > 0
+    assert result["peak_alloc_bytes"] > 0
+    assert tools.MOCK_PROBLEMS is catalog
+    assert tools.USER_WEAKNESS_PROFILES == profiles
+
+
+# ===== REGRESSION CHECK =====
+
+def test_compare_flags_slowdowns_and_allocation_growth():
+    baseline = {"a": {"ops_per_sec": 1000.0, "peak_alloc_bytes": 100_000},
+                "b": {"ops_per_sec": 1000.0, "peak_alloc_bytes": 100_000}}
+    results = {"a": {"ops_per_sec": 600.0, "peak_alloc_bytes": 100_000},
+               "b": {"ops_per_sec": 950.0, "peak_alloc_bytes": 150_000},
+               "new": {"ops_per_sec": 1.0, "peak_alloc_bytes": 1}}
+    
+    regressions = compare(results, baseline)
+    
+    assert len(regressions) == 2
+    assert regressions[0].startswith("a:") and "ops/s" in regressions[0]
+    assert regressions[1].startswith("b:") and "allocation" in regressions[1]
+
+
+def test_save_baseline_with_filter_keeps_other_cases(tmp_path, monkeypatch):
+    path = tmp_path / "baseline.json"
+    path.write_text(json.dumps({"cases": {"other": {"ops_per_sec": 1.0, "peak_alloc_bytes": 1}}}))
+    monkeypatch.setattr(microbench, "BASELINE_PATH", path)
+    
+    assert microbench.main(["-k", "lines=10]", "--min-time", "0.01", "--save-baseline"]) == 0
+    
+    saved = json.loads(path.read_text())["cases"]
+    assert set(saved) == {"other", "analyze_code_submission[lines=10]"}
+
+
+def test_allocations_match_stored_baseline():
+    """Test every case's peak allocation against tests/microbench_baseline.json (timing is left to the CLI)"""
+    with open(BASELINE_PATH) as f:
+        stored = json.load(f)
+    if stored["python"].rsplit(".", 1)[0] != ".".join(map(str, sys.version_info[:2])):
+        pytest.skip("baseline was recorded on a different Python version")
+    
+    results = run_suite(min_time=0.01, verbose=False)
+    
+    assert compare(results, stored["cases"], time_tolerance=1.0) == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,98 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from src.perf_history import PerfHistory, git_commit, main, sparkline
+
+
+@pytest.fixture
+def history(tmp_path):
+    store = PerfHistory(str(tmp_path / "history.db"))
+    yield store
+    store.close()
+
+
+def record_series(history, values, suite="regression", backend="live", metric="avg_latency"):
+    for i, value in enumerate(values):
+        history.record_run(suite, {metric: value, "label": "ignored"}, backend, commit=f"c{i}", dirty=False)
+
+
+# ===== STORE =====
+
+def test_runs_are_keyed_by_commit_and_backend(history):
+    """Test that runs come back oldest first with only their numeric metrics"""
+    record_series(history, [1.0, 2.0])
+    history.record_run("regression", {"avg_latency": 9.0}, "fake", commit="c9", dirty=True)
+    
+    runs = history.runs("regression")
+    
+    assert [r["commit"] for r in runs] == ["c0", "c1"]
+    assert runs[0]["metrics"] == {"avg_latency": 1.0}
+    assert history.runs("regression", "fake")[0]["dirty"]
+    assert history.suites() == [("regression", "fake"), ("regression", "live")]
+
+
+def test_git_commit_of_this_repo():
+    commit, _ = git_commit()
+    assert commit == "unknown" or len(commit) == 40
+
+
+# ===== GATE =====
+
+def test_gate_needs_enough_history(history):
+    record_series(history, [1.0, 1.1, 0.9])
+    assert history.check("regression", {"avg_latency": 50.0}, min_runs=5) == {}
+
+
+def test_gate_flags_values_outside_the_noise_band(history):
+    """Test that the bound widens with the spread of past runs"""
+    record_series(history, [1.00, 1.02, 0.98, 1.01, 0.99, 1.00])
+    
+    ok = history.check("regression", {"avg_latency": 1.04})
+    slow = history.check("regression", {"avg_latency": 1.30})
+    
+    assert not ok["avg_latency"]["regressed"]
+    assert slow["avg_latency"]["regressed"]
+    assert slow["avg_latency"]["median"] == pytest.approx(1.0)
+
+
+def test_gate_respects_metric_direction_and_margins(history):
+    """Test higher-is-better metrics and absolute margins for all-zero histories"""
+    record_series(history, [0.9] * 6, metric="accuracy")
+    record_series(history, [0.0] * 6, metric="error_rate")
+    
+    verdicts = history.check("regression", {"accuracy": 0.95, "error_rate": 0.01},
+                             min_absolute={"error_rate": 0.02})
+    dropped = history.check("regression", {"accuracy": 0.80})
+    
+    assert not verdicts["accuracy"]["regressed"]
+    assert not verdicts["error_rate"]["regressed"]
+    assert dropped["accuracy"]["regressed"]
+
+
+def test_gate_follows_recent_runs_only(history):
+    """Test that an accepted improvement becomes the new baseline"""
+    record_series(history, [2.0] * 10 + [1.0] * 5)
+    
+    verdict = history.check("regression", {"avg_latency": 1.5}, window=5)
+    
+    assert verdict["avg_latency"]["regressed"]
+
+
+# ===== CLI =====
+
+def test_trend_cli_prints_each_metric(history, capsys):
+    record_series(history, [1.0, 2.0, 3.0])
+    
+    main(["regression", "--db", history.path])
+    
+    out = capsys.readouterr().out
+    assert "regression [live] - 3 run(s)" in out
+    assert "avg_latency" in out and sparkline([1.0, 2.0, 3.0]) in out
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
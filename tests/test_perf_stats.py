@@ -0,0 +1,75 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import random
+
+import pytest
+from src.perf_stats import bootstrap_ci, compare_samples, describe, outliers, quantile
+from src.providers.metrics import LatencyHistogram
+
+
+# ===== QUANTILES =====
+
+def test_quantile_interpolates_between_ranks():
+    """Test the numpy-default (linear) definition, including tiny samples"""
+    assert quantile([1, 2, 3, 4], 0.5) == 2.5
+    assert quantile([10], 0.95) == 10
+    assert quantile([1, 2], 0.95) == pytest.approx(1.95)
+    assert quantile(list(range(1, 11)), 0.95) == pytest.approx(9.55)
+    assert quantile([], 0.5) == 0.0
+
+
+def test_histogram_quantile_uses_same_definition():
+    """Test that the telemetry sketch agrees with the exact quantile within bucket precision"""
+    rng = random.Random(3)
+    values = [rng.lognormvariate(6, 0.8) for _ in range(5000)]
+    hist = LatencyHistogram()
+    for v in values:
+        hist.record(v)
+    
+    for q in (0.5, 0.95, 0.99):
+        assert hist.quantile(q) == pytest.approx(quantile(values, q), rel=0.04)
+
+
+# ===== DESCRIBE / CI =====
+
+def test_describe_excludes_warmup_and_flags_outliers():
+    """Test that warm-up samples are dropped and extreme samples are counted"""
+    values = [5.0, 4.0] + [1.0, 1.1, 0.9, 1.0, 1.05, 0.95, 1.0, 20.0]
+    
+    summary = describe(values, warmup=2)
+    
+    assert summary["n"] == 8
+    assert summary["warmup_excluded"] == 2
+    assert summary["outliers"] == 1
+    assert summary["mean_ci95"][0] <= summary["mean"] <= summary["mean_ci95"][1]
+
+
+def test_outliers_needs_enough_data():
+    assert outliers([1, 100]) == {"low": [], "high": [], "fences": None}
+
+
+def test_bootstrap_ci_is_reproducible():
+    values = [random.Random(1).random() for _ in range(50)]
+    
+    assert bootstrap_ci(values, seed=4) == bootstrap_ci(values, seed=4)
+    assert bootstrap_ci([1.0]) is None
+
+
+def test_compare_samples_detects_real_change_only():
+    """Test that a clear speed-up is significant and pure noise is not"""
+    rng = random.Random(0)
+    baseline = [rng.gauss(2.0, 0.2) for _ in range(60)]
+    faster = [rng.gauss(1.0, 0.1) for _ in range(60)]
+    same = [rng.gauss(2.0, 0.2) for _ in range(60)]
+    
+    assert compare_samples(baseline, faster)["significant"]
+    assert compare_samples(baseline, faster)["change_percent"] == pytest.approx(-50, abs=5)
+    assert not compare_samples(baseline, same)["significant"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
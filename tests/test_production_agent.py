@@ -0,0 +1,285 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+import time
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from src.backend.ai.production_agent import (
+    CircuitBreaker,
+    CostTracker,
+    ProductionAgent,
+    SessionManager,
+    send_with_retry
+)
+from src.deadline import Deadline, deadline_scope
+
+
+# ===== FAKE GEMINI =====
+
+def make_response(text, prompt_tokens=10, output_tokens=5):
+    """Build an object shaped like a Gemini text response"""
+    part = SimpleNamespace(function_call=None, text=text)
+    return SimpleNamespace(
+        text=text,
+        candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))],
+        usage_metadata=SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=output_tokens
+        )
+    )
+
+
+class FakeChat:
+    """Chat that remembers what it was sent"""
+    
+    def __init__(self):
+        self.history = []
+    
+    def send_message(self, message, request_options=None):
+        self.history.append(message)
+        return make_response(f"reply {len(self.history)}")
+
+
+class FakeModel:
+    def __init__(self):
+        self.chats = []
+    
+    def start_chat(self, history=None):
+        chat = FakeChat()
+        chat.history = list(history or [])
+        self.chats.append(chat)
+        return chat
+
+
+def make_agent(**kwargs):
+    agent = ProductionAgent(**kwargs)
+    agent.model = FakeModel()
+    agent.sessions.model = agent.model
+    return agent
+
+
+# ===== SESSIONS =====
+
+def test_session_manager_is_bounded_lru():
+    """Test that the least recently used session is evicted at capacity"""
+    sessions = SessionManager(FakeModel(), max_sessions=2)
+    
+    sessions.get("a")
+    sessions.get("b")
+    sessions.get("a")
+    sessions.get("c")
+    
+    assert len(sessions) == 2
+    assert "a" in sessions
+    assert "b" not in sessions
+
+
+def test_session_manager_evicts_idle_sessions():
+    """Test that sessions idle past the timeout are dropped and restarted"""
+    model = FakeModel()
+    sessions = SessionManager(model, idle_timeout_seconds=0.05)
+    
+    first = sessions.get("a")
+    time.sleep(0.1)
+    sessions.get("b")
+    
+    assert "a" not in sessions
+    assert sessions.get("a") is not first
+    assert len(model.chats) == 3
+
+
+def test_users_get_separate_chats_and_trackers():
+    """Test that send_message keeps each user's conversation apart"""
+    agent = make_agent(cost_limit=10.0)
+    
+    agent.send_message("hello from one", user_id="user_001")
+    agent.send_message("hello from two", user_id="user_002")
+    result = agent.send_message("again from one", user_id="user_001")
+    
+    assert result["success"]
+    assert result["message"] == "reply 2"
+    assert agent.sessions.get("user_001").chat.history == ["hello from one", "again from one"]
+    assert agent.sessions.get("user_002").chat.history == ["hello from two"]
+    assert result["cost_summary"]["call_count"] == 2
+    assert agent.cost_tracker.get_summary()["call_count"] == 3
+
+
+def test_per_user_cost_limit_does_not_block_other_users():
+    """Test that one user hitting their limit leaves others unaffected"""
+    agent = make_agent(cost_limit=10.0, user_cost_limit=0.5)
+    agent.sessions.get("user_001").cost_tracker.total_cost = 0.5
+    
+    blocked = agent.send_message("spend more", user_id="user_001")
+    other = agent.send_message("hello", user_id="user_002")
+    
+    assert not blocked["success"]
+    assert "Cost limit" in blocked["message"]
+    assert other["success"]
+    assert agent.sessions.get("user_001").chat.history == []
+
+
+def test_concurrent_users_are_served():
+    """Test that many users can call send_message at once"""
+    agent = make_agent(cost_limit=10.0)
+    users = [f"user_{i:03d}" for i in range(20)]
+    
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda u: agent.send_message(f"hi {u}", user_id=u), users * 2))
+    
+    assert all(r["success"] for r in results)
+    assert len(agent.sessions) == 20
+    assert agent.cost_tracker.get_summary()["call_count"] == 40
+    for user in users:
+        assert agent.sessions.get(user).chat.history == [f"hi {user}", f"hi {user}"]
+
+
+# ===== SHARED STATE =====
+
+def test_cost_tracker_is_thread_safe():
+    """Test that concurrent add_cost calls are not lost"""
+    tracker = CostTracker(cost_limit=1e9)
+    
+    def add_many():
+        for _ in range(500):
+            tracker.add_cost(0.001, "test")
+    
+    threads = [threading.Thread(target=add_many) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    
+    assert tracker.get_summary()["call_count"] == 4000
+    assert tracker.total_cost == pytest.approx(4.0)
+
+
+def test_circuit_breaker_allows_one_half_open_trial():
+    """Test that only one caller probes a half-open breaker"""
+    breaker = CircuitBreaker(failure_threshold=1, timeout_seconds=0)
+    
+    def failing():
+        raise RuntimeError("boom")
+    
+    with pytest.raises(RuntimeError):
+        breaker.call(failing)
+    assert breaker.state == "open"
+    
+    started = threading.Event()
+    release = threading.Event()
+    
+    def slow_ok():
+        started.set()
+        release.wait(2)
+        return "ok"
+    
+    time.sleep(0.01)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        trial = pool.submit(breaker.call, slow_ok)
+        started.wait(2)
+        with pytest.raises(Exception, match="HALF_OPEN"):
+            breaker.call(slow_ok)
+        release.set()
+        assert trial.result() == "ok"
+    
+    assert breaker.state == "closed"
+
+
+def test_circuit_breaker_trial_survives_other_failures():
+    """Test that a non-trial call failing during the half-open trial doesn't admit a second trial"""
+    breaker = CircuitBreaker(failure_threshold=1, timeout_seconds=0)
+    straggler_started, fail_straggler = threading.Event(), threading.Event()
+    trial_started, release_trial = threading.Event(), threading.Event()
+    
+    def straggler():
+        straggler_started.set()
+        fail_straggler.wait(2)
+        raise RuntimeError("late failure")
+    
+    def failing():
+        raise RuntimeError("boom")
+    
+    def slow_ok():
+        trial_started.set()
+        release_trial.wait(2)
+        return "ok"
+    
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        late = pool.submit(breaker.call, straggler)  # admitted while still closed
+        straggler_started.wait(2)
+        with pytest.raises(RuntimeError):
+            breaker.call(failing)
+        time.sleep(0.01)
+        trial = pool.submit(breaker.call, slow_ok)
+        trial_started.wait(2)
+        
+        fail_straggler.set()
+        with pytest.raises(RuntimeError):
+            late.result()
+        with pytest.raises(Exception, match="HALF_OPEN"):
+            breaker.call(slow_ok)
+        release_trial.set()
+        assert trial.result() == "ok"
+
+
+# ===== CHAT RETRIES =====
+
+class FlakyChat(FakeChat):
+    """Chat whose first sends fail with `error` (or hang for `hang_seconds`)"""
+    
+    def __init__(self, failures=1, error=ConnectionError, hang_seconds=0.0):
+        super().__init__()
+        self.failures = failures
+        self.error = error
+        self.hang_seconds = hang_seconds
+        self.timeouts = []
+    
+    def send_message(self, message, request_options=None):
+        self.timeouts.append(request_options["timeout"])
+        if len(self.timeouts) <= self.failures:
+            if self.hang_seconds:
+                time.sleep(self.hang_seconds)
+                self.history.append(message)  # the abandoned call still lands
+                return make_response("late")
+            raise self.error("flaky")
+        return super().send_message(message, request_options)
+
+
+def test_chat_send_retries_connection_errors_with_fresh_timeouts():
+    """Test that a failed send is retried and each attempt's timeout reflects the deadline left"""
+    chat = FlakyChat(failures=1)
+    
+    with deadline_scope(Deadline(5)):
+        response = send_with_retry(chat, "hi", timeout_seconds=30)
+    
+    assert response.text == "reply 1"
+    assert len(chat.timeouts) == 2
+    assert chat.timeouts[0] <= 5 and chat.timeouts[1] < chat.timeouts[0] - 0.5
+
+
+def test_timed_out_chat_send_is_not_retried_and_chat_is_rebuilt():
+    """Test that after a timeout the session drops the chat the abandoned call may still write to"""
+    agent = make_agent()
+    session = agent.sessions.get("user_001")
+    flaky = FlakyChat(failures=1, hang_seconds=0.3)
+    flaky.history = ["earlier turn"]
+    session.chat = flaky
+    
+    with deadline_scope(Deadline(0.1)):
+        with pytest.raises(TimeoutError):
+            agent._send(session, "hi")
+    time.sleep(0.4)
+    
+    assert len(flaky.timeouts) == 1
+    assert flaky.history == ["earlier turn", "hi"]
+    assert session.chat is not flaky
+    assert session.chat.history == ["earlier turn"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
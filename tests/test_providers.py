@@ -0,0 +1,580 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import logging
+import threading
+import time
+import pytest
+from src.deadline import Deadline, DeadlineExceeded, current_deadline, timeout_for
+from src.log_utils import SamplingFilter
+from src.providers.base_provider import LLMProvider, ProviderResponse, ProviderError
+from src.providers.metrics import LatencyHistogram, RouterMetrics
+from src.providers.ollama_provider import OllamaProvider
+from src.providers.rate_limiter import RateLimiter
+from src.providers.response_cache import ResponseCache, DiskResponseCache
+from src.providers.router import LLMRouter
+from src.providers.single_flight import SingleFlight
+
+
+class FakeProvider(LLMProvider):
+    """Scripted provider: fails `fail_times` times, then answers"""
+    
+    def __init__(self, name: str, reply: str = "ok", fail_times: int = 0, error: str = "api_error", temperature=None):
+        super().__init__("", "fake-model", name, temperature)
+        self.reply = reply
+        self.fail_times = fail_times
+        self.error = error
+        self.calls = 0
+    
+    def generate(self, prompt: str, max_tokens: int = 500) -> ProviderResponse:
+        self.calls += 1
+        if self.calls <= self.fail_times:
+            raise RuntimeError(self.error)
+        return ProviderResponse(
+            content=f"{self.reply}:{prompt}",
+            model=self.model,
+            provider=self.name,
+            tokens_used=10,
+            cost=0.001,
+            latency_ms=1.0
+        )
+    
+    def classify_error(self, error: Exception) -> ProviderError:
+        return ProviderError(str(error), str(error), provider=self.name)
+
+
+class FakeHTTPResponse:
+    """Minimal stand-in for requests.Response"""
+    
+    def __init__(self, payload):
+        self.payload = payload
+    
+    def raise_for_status(self):
+        pass
+    
+    def json(self):
+        return self.payload
+
+
+# ==================== OllamaProvider ====================
+
+def test_ollama_uses_pooled_session():
+    """Test that the provider owns a session with the configured pool size"""
+    provider = OllamaProvider(pool_connections=2, pool_maxsize=16)
+    adapter = provider.session.get_adapter("http://localhost:11434")
+    
+    assert adapter._pool_connections == 2
+    assert adapter._pool_maxsize == 16
+    assert provider.session.headers["Connection"] == "keep-alive"
+    provider.close()
+
+
+def test_ollama_keep_alive_disabled():
+    """Test that keep-alive can be switched off"""
+    with OllamaProvider(keep_alive=False) as provider:
+        assert provider.session.headers["Connection"] == "close"
+
+
+def test_ollama_split_timeouts():
+    """Test that connect and read timeouts are passed separately"""
+    provider = OllamaProvider(connect_timeout=1.5, read_timeout=45.0)
+    calls = []
+    
+    def fake_post(url, json=None, timeout=None):
+        calls.append((url, timeout))
+        return FakeHTTPResponse({"response": "hi", "prompt_eval_count": 7, "eval_count": 3})
+    
+    provider.session.post = fake_post
+    response = provider.generate("hello", max_tokens=10)
+    
+    assert response.content == "hi"
+    assert response.tokens_used == 10
+    assert calls == [("http://localhost:11434/api/generate", (1.5, 45.0))]
+
+
+# ==================== Streaming ====================
+
+def test_default_generate_stream_yields_content_then_response():
+    """Test that providers without native streaming emit one delta"""
+    chunks = list(FakeProvider("A").generate_stream("hi"))
+    
+    assert chunks[0] == "ok:hi"
+    assert isinstance(chunks[-1], ProviderResponse)
+    assert chunks[-1].ttft_ms == chunks[-1].latency_ms
+
+
+def test_router_stream_falls_back_before_first_token():
+    """Test that a provider failing before any token triggers fallback"""
+    primary = FakeProvider("A", fail_times=1)
+    backup = FakeProvider("B", reply="backup")
+    router = LLMRouter([primary, backup], max_retries=1)
+    
+    chunks = list(router.generate_stream("hi"))
+    
+    assert chunks[0] == "backup:hi"
+    assert chunks[-1].provider == "B"
+    assert router.get_stats()["fallbacks_triggered"] == 1
+
+
+def test_router_stream_does_not_fall_back_after_first_token():
+    """Test that errors after the first token reach the caller"""
+    class BrokenStream(FakeProvider):
+        def generate_stream(self, prompt, max_tokens=500):
+            yield "partial"
+            raise RuntimeError("api_error")
+    
+    backup = FakeProvider("B")
+    router = LLMRouter([BrokenStream("A"), backup], max_retries=1)
+    stream = router.generate_stream("hi")
+    
+    assert next(stream) == "partial"
+    with pytest.raises(RuntimeError):
+        next(stream)
+    assert backup.calls == 0
+
+
+# ==================== Request Coalescing ====================
+
+def test_router_coalesces_identical_in_flight_prompts():
+    """Test that concurrent identical prompts share one provider call"""
+    release = threading.Event()
+    
+    class SlowProvider(FakeProvider):
+        def generate(self, prompt, max_tokens=500):
+            release.wait(timeout=5)
+            return super().generate(prompt, max_tokens)
+    
+    provider = SlowProvider("A")
+    router = LLMRouter([provider])
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(router.generate("What problem should I practice next?")))
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+    while router.single_flight.in_flight() == 0:
+        pass
+    release.set()
+    for t in threads:
+        t.join()
+    
+    stats = router.get_stats()
+    assert len(results) == 5
+    assert provider.calls + stats["coalesced_requests"] == 5
+    assert stats["total_requests"] == 5
+    assert stats["successful_requests"] == 5
+    assert len({id(r) for r in results}) == provider.calls
+
+
+def test_router_does_not_coalesce_sequential_calls():
+    """Test that completed calls are not reused (single-flight is not a cache)"""
+    provider = FakeProvider("A")
+    router = LLMRouter([provider])
+    
+    router.generate("hi")
+    router.generate("hi")
+    
+    assert provider.calls == 2
+    assert router.get_stats()["coalesced_requests"] == 0
+
+
+class WatchedEvent(threading.Event):
+    """Event that records when someone starts waiting on it"""
+    
+    def __init__(self):
+        super().__init__()
+        self.waiting = threading.Event()
+    
+    def wait(self, timeout=None):
+        self.waiting.set()
+        return super().wait(timeout)
+
+
+def run_leader_and_follower(leader_call, follower_call, follower_timeout=None):
+    """Run follower_call as a follower of leader_call, failing the leader only once the follower waits"""
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    outcomes = {}
+    
+    def lead():
+        started.set()
+        release.wait()
+        return leader_call()
+    
+    def call(name, func, timeout=None):
+        try:
+            outcomes[name] = flight.do("k", func, timeout=timeout)
+        except BaseException as e:
+            outcomes[name] = e
+    
+    leader = threading.Thread(target=call, args=("leader", lead))
+    leader.start()
+    started.wait()
+    flight._calls["k"].done = done = WatchedEvent()
+    follower = threading.Thread(target=call, args=("follower", follower_call, follower_timeout))
+    follower.start()
+    done.waiting.wait()
+    release.set()
+    leader.join()
+    follower.join()
+    
+    assert flight.in_flight() == 0
+    return outcomes
+
+
+def test_leader_deadline_miss_does_not_fail_followers():
+    """Test that a follower retries, as the new leader, when the leader's own deadline passes"""
+    def leader_call():
+        raise DeadlineExceeded("leader ran out of time")
+    
+    outcomes = run_leader_and_follower(leader_call, lambda: "follower-result", follower_timeout=5)
+    
+    assert isinstance(outcomes["leader"], DeadlineExceeded)
+    assert outcomes["follower"] == "follower-result"
+
+
+def test_followers_share_other_leader_errors():
+    def leader_call():
+        raise RuntimeError("api_error")
+    
+    outcomes = run_leader_and_follower(leader_call, lambda: "unused")
+    
+    assert isinstance(outcomes["follower"], RuntimeError)
+    assert outcomes["follower"] is outcomes["leader"]
+
+
+def test_followers_reraise_leader_base_exceptions():
+    """Test that a leader interrupted by a BaseException doesn't hand followers a None result"""
+    def leader_call():
+        raise KeyboardInterrupt
+    
+    outcomes = run_leader_and_follower(leader_call, lambda: "unused")
+    
+    assert isinstance(outcomes["follower"], KeyboardInterrupt)
+    assert outcomes["follower"] is outcomes["leader"]
+
+
+# ==================== Batch Generation ====================
+
+def test_generate_batch_preserves_order_and_aggregates():
+    """Test that batch results come back in prompt order with totals"""
+    router = LLMRouter([FakeProvider("A")], coalesce=False)
+    prompts = [f"q{i}" for i in range(10)]
+    
+    result = router.generate_batch(prompts, concurrency=4)
+    
+    assert [r.content for r in result.responses] == [f"ok:q{i}" for i in range(10)]
+    assert result.succeeded == 10 and result.failed == 0
+    assert result.total_cost == pytest.approx(0.01)
+    assert result.total_tokens == 100
+
+
+def test_generate_batch_falls_back_per_item():
+    """Test that items failing on the primary go to the next provider"""
+    class FlakyProvider(FakeProvider):
+        def generate(self, prompt, max_tokens=500):
+            if prompt.endswith("bad"):
+                raise RuntimeError("api_error")
+            return super().generate(prompt, max_tokens)
+    
+    router = LLMRouter([FlakyProvider("A"), FakeProvider("B")], max_retries=1)
+    result = router.generate_batch(["good", "bad", "good2"])
+    
+    assert [r.provider for r in result.responses] == ["A", "B", "A"]
+    assert result.provider_usage == {"A": 2, "B": 1}
+
+
+def test_generate_batch_uses_batch_endpoint():
+    """Test that a provider batch endpoint is used, with fallback for gaps"""
+    class BatchProvider(FakeProvider):
+        supports_batch = True
+        
+        def generate(self, prompt, max_tokens=500):
+            if prompt == "skip":
+                raise RuntimeError("api_error")
+            return super().generate(prompt, max_tokens)
+        
+        def generate_batch(self, prompts, max_tokens=500):
+            return [None if p == "skip" else self.generate(p) for p in prompts]
+    
+    router = LLMRouter([BatchProvider("A"), FakeProvider("B")], max_retries=1)
+    
+    result = router.generate_batch(["a", "skip", "b"])
+    
+    assert [r.provider for r in result.responses] == ["A", "B", "A"]
+    assert router.get_stats()["total_requests"] == 3
+
+
+def test_generate_batch_respects_provider_concurrency():
+    """Test that max_concurrency bounds parallel calls to a provider"""
+    lock = threading.Lock()
+    active = [0, 0]  # current, peak
+    
+    class CountingProvider(FakeProvider):
+        max_concurrency = 2
+        
+        def generate(self, prompt, max_tokens=500):
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            threading.Event().wait(0.01)
+            with lock:
+                active[0] -= 1
+            return super().generate(prompt, max_tokens)
+    
+    router = LLMRouter([CountingProvider("A")], coalesce=False)
+    result = router.generate_batch([f"q{i}" for i in range(12)], concurrency=8)
+    
+    assert result.succeeded == 12
+    assert active[1] <= 2
+
+
+# ==================== Response Cache ====================
+
+def test_router_caches_deterministic_prompts():
+    """Test that temperature=0 responses are served from cache at zero cost"""
+    provider = FakeProvider("A", temperature=0)
+    router = LLMRouter([provider], cache=ResponseCache())
+    
+    first = router.generate("hi")
+    second = router.generate("hi")
+    stats = router.get_stats()
+    
+    assert provider.calls == 1
+    assert not first.cached and first.cost == pytest.approx(0.001)
+    assert second.cached and second.cost == 0.0
+    assert second.content == first.content
+    assert stats["cache_hits"] == 1
+    assert stats["cost_saved"] == pytest.approx(0.001)
+
+
+def test_router_skips_cache_for_sampled_prompts():
+    """Test that non-deterministic providers bypass the cache by default"""
+    provider = FakeProvider("A")
+    router = LLMRouter([provider], cache=ResponseCache())
+    
+    router.generate("hi")
+    router.generate("hi")
+    
+    assert provider.calls == 2
+    assert router.get_stats()["cache_hits"] == 0
+
+
+def test_response_cache_lru_and_ttl():
+    """Test LRU eviction and TTL expiry"""
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    response = FakeProvider("A").generate("x")
+    
+    cache.set("a", response)
+    cache.set("b", response)
+    cache.get("a")  # a is now most recently used
+    cache.set("c", response)
+    
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    
+    cache.ttl = 0
+    assert cache.get("a") is None
+
+
+def test_disk_response_cache_persists(tmp_path):
+    """Test that the on-disk backend survives a new cache instance"""
+    path = str(tmp_path / "cache.db")
+    response = FakeProvider("A").generate("x")
+    key = ResponseCache.make_key("A", "fake-model", "x", 500)
+    
+    cache = DiskResponseCache(path, max_entries=1)
+    cache.set(key, response)
+    cache.set("other", response)  # evicts key
+    assert cache.get(key) is None
+    cache.set(key, response)
+    cache.close()
+    
+    reopened = DiskResponseCache(path)
+    assert reopened.get(key) == response
+    assert len(reopened) == 1
+    reopened.close()
+
+
+# ==================== Metrics ====================
+
+def test_latency_histogram_quantiles():
+    """Test that histogram quantiles stay within bucket precision"""
+    hist = LatencyHistogram()
+    for ms in range(1, 1001):
+        hist.record(float(ms))
+    
+    assert hist.quantile(0.50) == pytest.approx(500, rel=0.03)
+    assert hist.quantile(0.95) == pytest.approx(950, rel=0.03)
+    assert hist.quantile(0.99) == pytest.approx(990, rel=0.03)
+    assert hist.summary()["max_ms"] == 1000
+
+
+def test_router_metrics_counts_across_threads():
+    """Test that per-thread shards add up without lost increments"""
+    metrics = RouterMetrics(["A"])
+    
+    def work():
+        for _ in range(1000):
+            metrics.incr("total_requests")
+            metrics.record_provider("A", 5.0, tokens=2, cost=0.001)
+    
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["total_requests"] == 8000
+    assert snapshot["providers"]["A"]["successes"] == 8000
+    assert snapshot["providers"]["A"]["tokens"] == 16000
+    assert snapshot["providers"]["A"]["latency"]["count"] == 8000
+
+
+def test_router_metrics_fold_shards_of_exited_threads():
+    """Test that short-lived threads don't leave shards behind, and their counts survive"""
+    metrics = RouterMetrics(["A"])
+    
+    for batch in range(5):
+        threads = [threading.Thread(target=metrics.record_provider, args=("A", 5.0)) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    
+    assert len(metrics._shards) == 0
+    assert metrics.snapshot()["providers"]["A"]["successes"] == 100
+    
+    metrics.incr("total_requests")  # this thread is alive: its shard stays live
+    assert len(metrics._shards) == 1
+    assert metrics.snapshot()["counters"]["total_requests"] == 1
+
+
+def test_router_stats_include_provider_latency():
+    """Test that get_stats reports per-provider errors and percentiles"""
+    router = LLMRouter([FakeProvider("A", fail_times=1), FakeProvider("B")], max_retries=1)
+    router.generate("hi")
+    
+    stats = router.get_stats()
+    assert stats["providers"]["A"]["errors"] == 1
+    assert stats["providers"]["B"]["successes"] == 1
+    assert stats["providers"]["B"]["latency"]["p95_ms"] > 0
+    assert stats["provider_usage"] == {"A": 0, "B": 1}
+
+
+# ==================== Deadlines ====================
+
+def test_router_stops_fallback_after_deadline():
+    """Test that no further providers are tried once the deadline passed"""
+    class ExpiringProvider(FakeProvider):
+        def generate(self, prompt, max_tokens=500):
+            self.calls += 1
+            deadline.expires_at = 0  # client gives up while this call runs
+            raise RuntimeError("api_error")
+    
+    deadline = Deadline(10)
+    backup = FakeProvider("B")
+    router = LLMRouter([ExpiringProvider("A"), backup], max_retries=1)
+    
+    with pytest.raises(DeadlineExceeded):
+        router.generate("hi", deadline=deadline)
+    assert backup.calls == 0
+    assert router.get_stats()["deadline_exceeded"] == 1
+
+
+def test_router_skips_rate_limit_wait_that_cannot_fit():
+    """Test that a backoff longer than the time left goes straight to fallback"""
+    primary = FakeProvider("A", fail_times=5, error="rate_limit")
+    backup = FakeProvider("B")
+    router = LLMRouter([primary, backup], max_retries=3)
+    
+    response = router.generate("hi", deadline=Deadline(0.5))
+    
+    assert response.provider == "B"
+    assert primary.calls == 1
+
+
+def test_rate_limiter_refuses_slot_past_deadline():
+    """Test that a wait the deadline cannot cover raises without reserving the slot"""
+    limiter = RateLimiter(requests_per_minute=6)  # one slot per 10s
+    limiter.acquire()
+    reserved = limiter._next_slot
+    
+    with pytest.raises(DeadlineExceeded):
+        limiter.acquire(Deadline(0.5))
+    assert limiter._next_slot == reserved
+
+
+def test_router_falls_back_when_rate_limit_slot_is_past_deadline():
+    """Test that a rate-limited provider is skipped, not slept on, when its slot is too late"""
+    primary = FakeProvider("A")
+    primary.rate_limit_rpm = 6
+    backup = FakeProvider("B")
+    router = LLMRouter([primary, backup], coalesce=False)
+    
+    assert router.generate("first").provider == "A"
+    start = time.monotonic()
+    response = router.generate("second", deadline=Deadline(1))
+    
+    assert response.provider == "B"
+    assert time.monotonic() - start < 0.5
+    assert primary.calls == 1
+
+
+def test_router_stream_makes_explicit_deadline_ambient():
+    """Test that providers see a deadline passed to generate_stream, but the caller doesn't between chunks"""
+    class TimeoutRecorder(FakeProvider):
+        def generate_stream(self, prompt, max_tokens=500):
+            seen.append(timeout_for(60))
+            yield "first"
+            seen.append(timeout_for(60))
+            yield from super().generate_stream(prompt, max_tokens)
+    
+    seen = []
+    router = LLMRouter([TimeoutRecorder("A")], max_retries=1)
+    stream = router.generate_stream("hi", deadline=Deadline(2))
+    
+    assert next(stream) == "first"
+    assert current_deadline() is None
+    chunks = list(stream)
+    
+    assert chunks[-1].provider == "A"
+    assert len(seen) == 2 and all(0 < timeout <= 2 for timeout in seen)
+
+
+# ==================== Logging ====================
+
+def _record(level, msg="event %s"):
+    return logging.LogRecord("test", level, __file__, 1, msg, ("x",), None)
+
+
+def test_sampling_filter_rate_limits_repeats():
+    """Test that a message storm is cut down and the drop count reported"""
+    log_filter = SamplingFilter(max_per_second=3)
+    
+    passed = [log_filter.filter(_record(logging.WARNING)) for _ in range(50)]
+    
+    assert sum(passed) == 3
+    log_filter._sites[("test", "event %s")][0] = 1  # refill one token
+    record = _record(logging.WARNING)
+    assert log_filter.filter(record)
+    assert "47 similar messages suppressed" in record.msg
+
+
+def test_sampling_filter_samples_debug():
+    """Test that only every Nth DEBUG record passes"""
+    log_filter = SamplingFilter(debug_every=10)
+    
+    passed = [log_filter.filter(_record(logging.DEBUG)) for _ in range(100)]
+    
+    assert sum(passed) == 10
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
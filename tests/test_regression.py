@@ -10,19 +10,43 @@ Usage:
     
     Or run standalone:
     python test_regression.py
+    
+    Offline (no API key or network), against the scripted fake Gemini backend:
+    GEMINI_BACKEND=fake python test_regression.py
+    
+    Options:
+    python test_regression.py --workers 8   # cases run concurrently (default 4)
+    python test_regression.py --fresh       # ignore the checkpoint, rerun every case
+
+Each case runs in its own agent session, so no case sees another's chat
+history. Finished cases are appended to regression_checkpoint.jsonl: a
+crashed run resumes where it stopped, and a later run only reruns cases
+whose fingerprint changed (the case itself, the tool it expects, the agent
+module or the Gemini backend), plus any case that errored.
 """
 
+import argparse
+import hashlib
+import inspect
 import json
+import threading
 import time
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Any, Dict, List, Optional
 import statistics
 
 # Add parent directory to path to import agent
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from src.perf_history import PerfHistory, format_verdicts
+from src.perf_stats import elapsed_ms, now_ns, quantile
+from src.backend.functions import tools
+from src.backend.functions.registry import TOOLS
+from src.backend.ai.gemini_backend import active_fake_backend
+
 try:
     from src.backend.ai.optimized_agent import OptimizedCodeMentorAgent
 except ImportError:
@@ -40,15 +64,103 @@ THRESHOLDS = {
     "min_response_length": 50,  # Responses should be substantial
 }
 
+# THRESHOLDS are absolute service levels. Regressions are detected against
+# the performance history instead (src/perf_history.py): each metric is
+# compared with its recent runs, so a drift is caught long before it
+# crosses a threshold.
+HISTORY_GATED = ["accuracy", "avg_latency", "p95_latency", "avg_cost", "error_rate"]
+HISTORY_MIN_MARGINS = {"accuracy": 0.02, "error_rate": 0.02}
+
+CHECKPOINT_FILE = "regression_checkpoint.jsonl"
+
+
+# ==================== CASE FINGERPRINTS ====================
+
+def tool_fingerprint(function_name: Optional[str]) -> str:
+    """
+    Hash of a tool and everything in tools.py it reaches: helper functions,
+    module-level data (MOCK_PROBLEMS, profiles) and the response models,
+    plus its registry entry and the source of its request model (the
+    validators dispatch runs). Editing one tool changes only its own
+    fingerprint.
+    """
+    if not function_name or not hasattr(tools, function_name):
+        return ""
+    
+    digest = hashlib.sha1()
+    spec = TOOLS.get(function_name)
+    if spec is not None:
+        digest.update(repr((spec.description, spec.compact_description, spec.permission,
+                            spec.cacheable, spec.timeout_seconds)).encode())
+        digest.update(inspect.getsource(spec.request_model).encode())
+    seen = set()
+    pending = [function_name]
+    while pending:
+        name = pending.pop()
+        if name in seen or not hasattr(tools, name):
+            continue
+        seen.add(name)
+        obj = getattr(tools, name)
+        
+        if inspect.isfunction(obj) and obj.__module__ == tools.__name__:
+            code = inspect.unwrap(obj).__code__
+            names = set(code.co_names)
+            for const in code.co_consts:
+                if inspect.iscode(const):
+                    names.update(const.co_names)
+            pending.extend(sorted(names))
+            source = inspect.getsource(inspect.unwrap(obj))
+        elif inspect.isclass(obj) and obj.__module__.startswith("src."):
+            source = inspect.getsource(obj)
+        elif isinstance(obj, (dict, list, tuple, str, int, float)):
+            source = repr(obj)
+        else:
+            continue  # stdlib modules and functions
+        digest.update(name.encode())
+        digest.update(source.encode())
+    return digest.hexdigest()
+
+
+def backend_fingerprint() -> str:
+    """"live", or the fake backend's settings: its script, latency and injected errors"""
+    fake = active_fake_backend()
+    if fake is None:
+        return "live"
+    return json.dumps({
+        "script": fake.script, "latency_ms": fake.latency_ms, "jitter_ms": fake.jitter_ms,
+        "error_rate": fake.error_rate, "seed": fake.seed
+    }, sort_keys=True, default=str)
+
+
+def case_fingerprint(test_case: Dict, agent_class: type) -> str:
+    """What a case's result depends on: the case, its tool, the agent module and the backend"""
+    digest = hashlib.sha1(json.dumps(test_case, sort_keys=True).encode())
+    digest.update(tool_fingerprint(test_case.get("expected_function")).encode())
+    digest.update(inspect.getsource(sys.modules[agent_class.__module__]).encode())
+    digest.update(backend_fingerprint().encode())
+    return digest.hexdigest()
+
 
 class RegressionTester:
     """Runs golden set and validates quality metrics"""
     
-    def __init__(self, golden_set_path: str = "golden_set.json"):
-        """Initialize with path to golden set"""
+    def __init__(self, golden_set_path: str = "golden_set.json", workers: int = 4,
+                 checkpoint_path: Optional[str] = CHECKPOINT_FILE,
+                 agent_class: type = OptimizedCodeMentorAgent):
+        """
+        Initialize with path to golden set.
+        
+        workers: cases run concurrently, each in a fresh agent session.
+        checkpoint_path: JSONL of finished cases (relative to tests/); None disables it.
+        """
         self.golden_set_path = Path(__file__).parent / golden_set_path
+        self.workers = max(1, workers)
+        self.checkpoint_path = Path(__file__).parent / checkpoint_path if checkpoint_path else None
+        self.agent_class = agent_class
         self.results = []
+        self.reused = 0
         self.agent = None
+        self._checkpoint_lock = threading.Lock()
         
     def load_golden_set(self) -> List[Dict]:
         """Load test queries from golden set"""
@@ -58,21 +170,27 @@ class RegressionTester:
     
     def initialize_agent(self):
         """Initialize the CodeMentor agent"""
-        self.agent = OptimizedCodeMentorAgent()
-        self.agent.start_conversation()
+        self.agent = self.new_session()
+    
+    def new_session(self):
+        """A fresh agent with its own conversation, so cases can't see each other's history"""
+        agent = self.agent_class()
+        agent.start_conversation()
+        return agent
     
-    def run_single_query(self, test_case: Dict) -> Dict[str, Any]:
-        """Run a single test query and return result"""
-        start_time = time.time()
+    def run_single_query(self, test_case: Dict, agent=None) -> Dict[str, Any]:
+        """Run a single test query (in a new session unless `agent` is given) and return result"""
+        agent = agent or self.agent or self.new_session()
+        start_ns = now_ns()
         
         try:
-            response = self.agent.send_message(test_case['query'])
-            latency = time.time() - start_time
+            response = agent.send_message(test_case['query'])
+            latency = elapsed_ms(start_ns) / 1000
             
-            # Estimate cost (use actual cost tracker if available)
+            # Cost of this session (use actual cost tracker if available)
             cost = 0.0
-            if hasattr(self.agent, 'cost_tracker'):
-                cost = self.agent.cost_tracker.total_cost
+            if hasattr(agent, 'cost_tracker'):
+                cost = agent.cost_tracker.total_cost
             
             return {
                 "id": test_case['id'],
@@ -87,7 +205,7 @@ class RegressionTester:
                 "meets_quality": self._check_quality(test_case, response)
             }
         except Exception as e:
-            latency = time.time() - start_time
+            latency = elapsed_ms(start_ns) / 1000
             return {
                 "id": test_case['id'],
                 "query": test_case['query'][:50] + "...",
@@ -122,8 +240,51 @@ class RegressionTester:
         
         return True
     
-    def run_all_tests(self) -> Dict[str, Any]:
-        """Run all tests in golden set"""
+    # ----- checkpoint -----
+    
+    def load_checkpoint(self) -> Dict[str, Dict[str, Any]]:
+        """Finished results by case id, keyed to the fingerprint they were run under"""
+        done = {}
+        if not self.checkpoint_path or not self.checkpoint_path.exists():
+            return done
+        with open(self.checkpoint_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash
+                done[entry["result"]["id"]] = entry
+        return done
+    
+    def _checkpoint(self, fingerprint: str, result: Dict[str, Any]):
+        if not self.checkpoint_path:
+            return
+        line = json.dumps({"fingerprint": fingerprint, "result": result})
+        with self._checkpoint_lock, open(self.checkpoint_path, "a") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def _compact_checkpoint(self, golden_set: List[Dict], fingerprints: Dict[str, str]):
+        """Rewrite the checkpoint with one entry per current case"""
+        if not self.checkpoint_path:
+            return
+        by_id = {r["id"]: r for r in self.results}
+        tmp = self.checkpoint_path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            for case in golden_set:
+                if case["id"] in by_id:
+                    f.write(json.dumps({"fingerprint": fingerprints[case["id"]], "result": by_id[case["id"]]}) + "\n")
+        os.replace(tmp, self.checkpoint_path)
+    
+    # ----- running -----
+    
+    def run_all_tests(self, fresh: bool = False) -> Dict[str, Any]:
+        """
+        Run all tests in golden set, `workers` at a time. Cases already in
+        the checkpoint with an unchanged fingerprint and no error are reused
+        unless fresh=True.
+        """
         print(f"\n{'='*60}")
         print("CodeMentor AI Regression Test Suite")
         print(f"{'='*60}\n")
@@ -132,19 +293,38 @@ class RegressionTester:
         golden_set = self.load_golden_set()
         print(f"Loaded {len(golden_set)} test queries")
         
-        # Initialize agent
-        print("Initializing agent...")
-        self.initialize_agent()
+        fingerprints = {case['id']: case_fingerprint(case, self.agent_class) for case in golden_set}
+        done = {} if fresh else self.load_checkpoint()
+        if fresh and self.checkpoint_path and self.checkpoint_path.exists():
+            self.checkpoint_path.unlink()
+        
+        results = {}
+        pending = []
+        for case in golden_set:
+            entry = done.get(case['id'])
+            if entry and entry["fingerprint"] == fingerprints[case['id']] and entry["result"]["success"]:
+                results[case['id']] = entry["result"]
+            else:
+                pending.append(case)
+        self.reused = len(results)
+        if self.reused:
+            print(f"Reusing {self.reused} unchanged results from {self.checkpoint_path.name}")
         
         # Run tests
-        print(f"\nRunning tests...\n")
-        for i, test_case in enumerate(golden_set, 1):
-            print(f"[{i}/{len(golden_set)}] Testing: {test_case['id']} ({test_case['difficulty']})...", end=" ")
-            result = self.run_single_query(test_case)
-            self.results.append(result)
-            
-            status = "✅ PASS" if result['success'] and result['meets_quality'] else "❌ FAIL"
-            print(f"{status} ({result['latency']}s)")
+        print(f"\nRunning {len(pending)} tests with {self.workers} workers...\n")
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.run_single_query, case): case for case in pending}
+            for i, future in enumerate(as_completed(futures), 1):
+                case = futures[future]
+                result = future.result()
+                results[case['id']] = result
+                self._checkpoint(fingerprints[case['id']], result)
+                
+                status = "✅ PASS" if result['success'] and result['meets_quality'] else "❌ FAIL"
+                print(f"[{i}/{len(pending)}] {case['id']} ({case['difficulty']}): {status} ({result['latency']}s)")
+        
+        self.results = [results[case['id']] for case in golden_set]
+        self._compact_checkpoint(golden_set, fingerprints)
         
         # Calculate metrics
         return self._calculate_metrics()
@@ -168,8 +348,8 @@ class RegressionTester:
             "error_rate": round((len(self.results) - len(successful)) / len(self.results), 3),
             "avg_latency": round(statistics.mean(latencies), 3) if latencies else 0,
             "median_latency": round(statistics.median(latencies), 3) if latencies else 0,
-            "p95_latency": round(sorted_latencies[int(len(sorted_latencies) * 0.95) - 1], 3) if len(sorted_latencies) > 1 else (sorted_latencies[0] if sorted_latencies else 0),
-            "p99_latency": round(sorted_latencies[int(len(sorted_latencies) * 0.99) - 1], 3) if len(sorted_latencies) > 1 else (sorted_latencies[0] if sorted_latencies else 0),
+            "p95_latency": round(quantile(sorted_latencies, 0.95, is_sorted=True), 3),
+            "p99_latency": round(quantile(sorted_latencies, 0.99, is_sorted=True), 3),
             "avg_cost": round(statistics.mean(costs), 6) if costs else 0,
             "total_cost": round(sum(costs), 6),
         }
@@ -187,6 +367,30 @@ class RegressionTester:
         }
         return validations
     
+    def check_history(self, metrics: Dict[str, Any], history: Optional[PerfHistory] = None,
+                      record: bool = True) -> Dict[str, Dict[str, Any]]:
+        """
+        Gate metrics against recent runs of the same backend, then append this run.
+        
+        Skipped (returns {}) when any result came from the checkpoint: its
+        latency and cost were measured by an earlier run and are already in
+        the history. A history opened here is closed again.
+        """
+        if self.reused:
+            return {}
+        owned = history is None
+        history = history or PerfHistory()
+        try:
+            backend = "fake" if active_fake_backend() is not None else "live"
+            verdicts = history.check("regression", metrics, backend, gated=HISTORY_GATED,
+                                     min_absolute=HISTORY_MIN_MARGINS)
+            if record:
+                history.record_run("regression", metrics, backend)
+        finally:
+            if owned:
+                history.close()
+        return verdicts
+    
     def print_report(self, metrics: Dict[str, Any], validations: Dict[str, bool]):
         """Print test report"""
         print(f"\n{'='*60}")
@@ -242,6 +446,7 @@ class RegressionTester:
             "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
             "metrics": metrics,
             "thresholds": THRESHOLDS,
+            "reused_from_checkpoint": self.reused,
             "detailed_results": self.results
         }
         
@@ -252,12 +457,17 @@ class RegressionTester:
         print(f"Results saved to: {output_path}")
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """Main entry point for regression testing"""
-    tester = RegressionTester()
+    parser = argparse.ArgumentParser(description="Golden-set regression tests")
+    parser.add_argument("--workers", type=int, default=4, help="cases run concurrently")
+    parser.add_argument("--fresh", action="store_true", help="ignore the checkpoint and rerun every case")
+    args = parser.parse_args(argv)
+    
+    tester = RegressionTester(workers=args.workers)
     
     # Run tests
-    metrics = tester.run_all_tests()
+    metrics = tester.run_all_tests(fresh=args.fresh)
     
     # Validate against thresholds
     validations = tester.validate_thresholds(metrics)
@@ -265,6 +475,18 @@ def main():
     # Print report
     all_pass = tester.print_report(metrics, validations)
     
+    # Compare with recent runs and record this one
+    verdicts = tester.check_history(metrics)
+    print("📈 HISTORY GATE (vs recent runs)")
+    if tester.reused:
+        print(f"  skipped: {tester.reused} results reused from the checkpoint (--fresh to measure all)")
+    else:
+        print(format_verdicts(verdicts) if verdicts else "  not enough history yet")
+    if any(v["regressed"] for v in verdicts.values()):
+        print("⚠️  PERFORMANCE REGRESSION against recent runs")
+        all_pass = False
+    print()
+    
     # Save results
     tester.save_results(metrics)
     
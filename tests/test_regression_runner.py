@@ -0,0 +1,192 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import threading
+
+import pytest
+from src.backend.ai.fake_gemini import FakeGeminiBackend
+from src.backend.ai.gemini_backend import use_fake_backend, use_live_backend
+from src.backend.ai.optimized_agent import OptimizedCodeMentorAgent
+from src.backend.functions import tools
+from src.backend.functions.registry import TOOLS
+from src.backend.models.function_models import ProgressTrackingRequest
+from src.perf_history import PerfHistory
+from tests import test_regression as regression
+from tests.test_regression import RegressionTester, case_fingerprint, tool_fingerprint
+
+
+CASES = [
+    {"id": f"case_{i}", "query": query, "category": "test", "difficulty": "easy"}
+    for i, query in enumerate([
+        "What problem should I practice next?",
+        "Recommend me a medium problem",
+        "Analyze this code:\ndef two_sum(nums, target):\n    return []",
+        "hello there",
+    ])
+]
+
+
+class CountingAgent(OptimizedCodeMentorAgent):
+    """Optimized agent that records how many sessions were created"""
+    
+    created = 0
+    lock = threading.Lock()
+    
+    def __init__(self):
+        super().__init__()
+        with CountingAgent.lock:
+            CountingAgent.created += 1
+
+
+@pytest.fixture
+def fake_backend():
+    backend = use_fake_backend(FakeGeminiBackend(latency_ms=1))
+    yield backend
+    use_live_backend()
+
+
+@pytest.fixture
+def golden_set(tmp_path):
+    path = tmp_path / "golden.json"
+    path.write_text(json.dumps({"golden_set": CASES}))
+    return path
+
+
+def make_tester(golden_set, tmp_path, workers=4):
+    return RegressionTester(str(golden_set), workers=workers,
+                            checkpoint_path=str(tmp_path / "checkpoint.jsonl"),
+                            agent_class=CountingAgent)
+
+
+# ===== FINGERPRINTS =====
+
+def test_tool_fingerprints_track_their_own_dependencies(monkeypatch):
+    """Test that changing a helper only changes the fingerprint of the tool that uses it"""
+    analyze = tool_fingerprint("analyze_code_submission")
+    recommend = tool_fingerprint("get_recommended_problem")
+    assert analyze and recommend and analyze != recommend
+    assert tool_fingerprint(None) == ""
+    
+    monkeypatch.setattr(tools, "_estimate_complexity", lambda code: ("O(1)", "O(1)"))
+    
+    assert tool_fingerprint("analyze_code_submission") != analyze
+    assert tool_fingerprint("get_recommended_problem") == recommend
+
+
+def test_fingerprints_track_registry_models_and_fake_backend(monkeypatch):
+    """Test that the tool's registry entry, request model and fake-backend settings all count"""
+    analyze = tool_fingerprint("analyze_code_submission")
+    spec = TOOLS["analyze_code_submission"]
+    
+    monkeypatch.setattr(spec, "timeout_seconds", spec.timeout_seconds + 1)
+    assert tool_fingerprint("analyze_code_submission") != analyze
+    monkeypatch.undo()
+    monkeypatch.setattr(spec, "request_model", ProgressTrackingRequest)
+    assert tool_fingerprint("analyze_code_submission") != analyze
+    monkeypatch.undo()
+    
+    case = CASES[0]
+    try:
+        use_fake_backend(FakeGeminiBackend(latency_ms=1))
+        fast = case_fingerprint(case, CountingAgent)
+        assert case_fingerprint(case, CountingAgent) == fast
+        use_fake_backend(FakeGeminiBackend(latency_ms=1, error_rate=0.5))
+        assert case_fingerprint(case, CountingAgent) != fast
+    finally:
+        use_live_backend()
+
+
+# ===== RUNNER =====
+
+def test_cases_run_in_isolated_sessions(fake_backend, golden_set, tmp_path):
+    """Test that every case gets its own agent session and results keep golden-set order"""
+    CountingAgent.created = 0
+    tester = make_tester(golden_set, tmp_path)
+    
+    metrics = tester.run_all_tests()
+    
+    assert CountingAgent.created == len(CASES)
+    assert [r["id"] for r in tester.results] == [c["id"] for c in CASES]
+    assert metrics["total_tests"] == len(CASES)
+    assert metrics["successful"] == len(CASES)
+
+
+def test_interrupted_run_resumes_from_checkpoint(fake_backend, golden_set, tmp_path):
+    """Test that finished cases are reused and errored or missing ones are rerun"""
+    first = make_tester(golden_set, tmp_path)
+    first.run_all_tests()
+    
+    # Simulate a crash after two cases, one of which had failed
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    lines = checkpoint.read_text().splitlines()[:2]
+    failed = json.loads(lines[1])
+    failed["result"]["success"] = False
+    checkpoint.write_text(lines[0] + "\n" + json.dumps(failed) + "\n" + '{"torn')
+    
+    CountingAgent.created = 0
+    second = make_tester(golden_set, tmp_path)
+    second.run_all_tests()
+    
+    assert second.reused == 1
+    assert CountingAgent.created == len(CASES) - 1
+    assert all(r["success"] for r in second.results)
+    assert len(checkpoint.read_text().splitlines()) == len(CASES)
+
+
+def test_only_cases_of_changed_tools_rerun(fake_backend, golden_set, tmp_path, monkeypatch):
+    """Test that editing a tool reruns just the cases that expect it"""
+    cases = [dict(c, expected_function=f) for c, f in zip(CASES, [
+        "get_recommended_problem", "get_recommended_problem", "analyze_code_submission", None
+    ])]
+    golden_set.write_text(json.dumps({"golden_set": cases}))
+    make_tester(golden_set, tmp_path).run_all_tests()
+    
+    monkeypatch.setattr(tools, "_estimate_complexity", lambda code: ("O(1)", "O(1)"))
+    CountingAgent.created = 0
+    tester = make_tester(golden_set, tmp_path)
+    tester.run_all_tests()
+    
+    assert CountingAgent.created == 1
+    assert tester.reused == 3
+    
+    CountingAgent.created = 0
+    make_tester(golden_set, tmp_path).run_all_tests(fresh=True)
+    assert CountingAgent.created == len(cases)
+
+
+def test_history_gate_skips_runs_with_reused_results(fake_backend, golden_set, tmp_path, monkeypatch):
+    """Test that only fully measured runs are gated and recorded, and the history is closed"""
+    opened = []
+    
+    class TrackedHistory(PerfHistory):
+        def __init__(self, path=None):
+            super().__init__(str(tmp_path / "history.db"))
+            self.closed = False
+            opened.append(self)
+        
+        def close(self):
+            self.closed = True
+            super().close()
+    
+    monkeypatch.setattr(regression, "PerfHistory", TrackedHistory)
+    
+    tester = make_tester(golden_set, tmp_path)
+    tester.check_history(tester.run_all_tests())
+    assert len(opened) == 1 and opened[0].closed
+    
+    tester = make_tester(golden_set, tmp_path)
+    assert tester.check_history(tester.run_all_tests()) == {}
+    assert tester.reused == len(CASES)
+    assert len(opened) == 1
+    
+    history = PerfHistory(str(tmp_path / "history.db"))
+    assert len(history.runs("regression", backend="fake")) == 1
+    history.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
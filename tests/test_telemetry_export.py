@@ -0,0 +1,88 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import gzip
+import json
+import shutil
+
+import pytest
+from src import telemetry_export
+from src.telemetry_export import compact, read_columns, rollup_window
+from tests.test_telemetry_index import NOW, append, traffic
+
+
+def make_segments(tmp_path):
+    """Two closed segments (one gzipped) and an active file"""
+    log = tmp_path / "telemetry.log"
+    first = traffic(NOW - 7200, 300, seed=1)
+    second = traffic(NOW - 3600, 300, seed=2)
+    
+    append(f"{log}.20250301-100000", first)
+    append(tmp_path / "plain", second)
+    with open(tmp_path / "plain", "rb") as src, gzip.open(f"{log}.20250301-110000.gz", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(tmp_path / "plain")
+    append(log, traffic(NOW - 60, 5, seed=3))
+    return str(log), first + second
+
+
+# ===== COMPACTION =====
+
+def test_compact_writes_columns_and_rollups(tmp_path):
+    """Test that each closed segment gets a columnar file and a rollup file"""
+    log, entries = make_segments(tmp_path)
+    out_dir = str(tmp_path / "columnar")
+    
+    assert compact(log, out_dir) == ["telemetry.log.20250301-100000", "telemetry.log.20250301-110000"]
+    assert compact(log, out_dir) == []  # already done
+    
+    suffix = ".parquet" if telemetry_export.pyarrow is not None else ".columns.json.gz"
+    [name] = [n for n in os.listdir(out_dir) if n.startswith("telemetry.log.20250301-100000.") and n.endswith(suffix)]
+    columns = read_columns(os.path.join(out_dir, name))
+    assert len(columns["ts"]) == 300
+    assert columns["latency_ms"] == [e["latency_ms"] for e in entries[:300]]
+    assert set(columns) == set(telemetry_export.COLUMNS)
+
+
+def test_compact_follows_size_rotation(tmp_path):
+    """Test that a reused file.1 is compacted again and a renamed or gzipped segment is not"""
+    log = str(tmp_path / "telemetry.log")
+    out_dir = str(tmp_path / "columnar")
+    append(f"{log}.1", traffic(NOW - 7200, 100, seed=1))
+    assert compact(log, out_dir) == ["telemetry.log.1"]
+    
+    # Rotate: file.1 moves on to file.2 and a new file.1 is closed
+    os.rename(f"{log}.1", f"{log}.2")
+    append(f"{log}.1", traffic(NOW - 3600, 50, seed=2))
+    assert compact(log, out_dir) == ["telemetry.log.1"]
+    
+    with open(f"{log}.2", "rb") as src, gzip.open(f"{log}.2.gz", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(f"{log}.2")
+    assert compact(log, out_dir) == []
+    
+    assert rollup_window(out_dir, group_by=())[()].count == 150
+
+
+def test_rollups_match_raw_entries(tmp_path):
+    """Test that merged rollups agree with the raw entries per query type"""
+    log, entries = make_segments(tmp_path)
+    out_dir = str(tmp_path / "columnar")
+    compact(log, out_dir)
+    
+    groups = rollup_window(out_dir, group_by=("query_type",))
+    for (query_type,), bucket in groups.items():
+        expected = [e for e in entries if e["query_type"] == query_type]
+        assert bucket.count == len(expected)
+        assert bucket.errors == sum(1 for e in expected if not e["success"])
+        assert bucket.cost == pytest.approx(sum(e["cost_usd"] for e in expected))
+    
+    total = rollup_window(out_dir, since=NOW - 3600, group_by=())[()]
+    assert total.count == 300
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,149 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import gzip
+import json
+import random
+import shutil
+from datetime import datetime
+
+import pytest
+from src.telemetry_index import TelemetryIndex
+
+NOW = datetime(2025, 3, 1, 12, 0, 0).timestamp()
+
+
+def entry(ts, latency_ms, success=True, query_type="conversational", cost=0.001):
+    return {
+        "timestamp": datetime.fromtimestamp(ts).isoformat(),
+        "request_id": f"req_{ts}",
+        "user_id": "user_001",
+        "query_type": query_type,
+        "latency_ms": latency_ms,
+        "success": success,
+        "cost_usd": cost,
+        "error_type": None if success else "TimeoutError"
+    }
+
+
+def append(path, entries):
+    with open(path, "a") as f:
+        for e in entries:
+            f.write(json.dumps(e) + "\n")
+
+
+def traffic(start, n, seed=0):
+    rng = random.Random(seed)
+    return [
+        entry(start + i * 7.3, rng.uniform(50, 3000), success=rng.random() > 0.1,
+              query_type=rng.choice(["code_analysis", "recommendation", "conversational"]))
+        for i in range(n)
+    ]
+
+
+# ===== INCREMENTAL INGESTION =====
+
+def test_refresh_parses_only_new_lines(tmp_path):
+    """Test that a second refresh only parses what was appended"""
+    log = tmp_path / "telemetry.log"
+    append(log, traffic(NOW - 3600, 100))
+    index = TelemetryIndex(str(log))
+    
+    assert index.refresh() == 100
+    assert index.refresh() == 0
+    
+    append(log, traffic(NOW - 60, 5, seed=1))
+    assert index.refresh() == 5
+
+
+def test_checkpoint_survives_restart(tmp_path):
+    """Test that a new TelemetryIndex resumes from the saved offset"""
+    log = tmp_path / "telemetry.log"
+    append(log, traffic(NOW - 3600, 50))
+    TelemetryIndex(str(log)).refresh()
+    
+    resumed = TelemetryIndex(str(log))
+    assert resumed.refresh() == 0
+    assert resumed.summary(hours=2, now=NOW)["total_requests"] == 50
+
+
+def test_checkpoint_follows_segment_into_gzip(tmp_path):
+    """Test that closing the active file into a .gz segment keeps its checkpoint"""
+    log = tmp_path / "telemetry.log"
+    append(log, traffic(NOW - 7200, 40))
+    index = TelemetryIndex(str(log))
+    index.refresh()
+    
+    append(log, traffic(NOW - 3700, 10, seed=2))  # written, not yet parsed
+    with open(log, "rb") as src, gzip.open(f"{log}.20250301-100000.gz", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(log)
+    append(log, traffic(NOW - 600, 20, seed=3))
+    
+    assert index.refresh() == 30
+    assert index.summary(hours=3, now=NOW)["total_requests"] == 70
+
+
+def test_partial_last_line_is_left_for_later(tmp_path):
+    """Test that a half-written line is not consumed"""
+    log = tmp_path / "telemetry.log"
+    line = json.dumps(entry(NOW - 10, 100.0))
+    with open(log, "w") as f:
+        f.write(line + "\n" + line[:20])
+    index = TelemetryIndex(str(log))
+    
+    assert index.refresh() == 1
+    with open(log, "a") as f:
+        f.write(line[20:] + "\n")
+    assert index.refresh() == 1
+
+
+# ===== WINDOW QUERIES =====
+
+def test_window_matches_full_scan(tmp_path):
+    """Test that bucketed window counts equal a brute-force filter, including the partial first minute"""
+    log = tmp_path / "telemetry.log"
+    entries = traffic(NOW - 30 * 3600, 15000)
+    append(log, entries)
+    index = TelemetryIndex(str(log), index_every=64)
+    index.refresh()
+    
+    for hours in (0.5, 1.37, 24):
+        cutoff = NOW - hours * 3600
+        expected = [e for e in entries if cutoff <= datetime.fromisoformat(e["timestamp"]).timestamp()]
+        stats = index.window(hours, now=NOW).summary()
+        
+        assert stats["total_requests"] == len(expected)
+        assert stats["failed_requests"] == sum(1 for e in expected if not e["success"])
+        assert stats["total_cost"] == pytest.approx(sum(e["cost_usd"] for e in expected))
+
+
+def test_window_quantiles_are_close(tmp_path):
+    """Test that sketch quantiles are within the histogram's error of exact ones"""
+    log = tmp_path / "telemetry.log"
+    entries = traffic(NOW - 3600, 2000)
+    append(log, entries)
+    
+    stats = TelemetryIndex(str(log)).summary(hours=2, now=NOW)
+    latencies = sorted(e["latency_ms"] for e in entries)
+    exact_p95 = latencies[int(0.95 * len(latencies)) - 1]
+    
+    assert stats["latency"]["p95_ms"] == pytest.approx(exact_p95, rel=0.05)
+
+
+def test_non_telemetry_lines_are_skipped(tmp_path):
+    """Test that audit-style or corrupt lines do not break analysis"""
+    log = tmp_path / "telemetry.log"
+    with open(log, "w") as f:
+        f.write(json.dumps({"timestamp": datetime.fromtimestamp(NOW).isoformat(), "event_type": "x"}) + "\n")
+        f.write("not json\n")
+    append(log, [entry(NOW - 5, 120.0)])
+    
+    assert TelemetryIndex(str(log)).summary(hours=1, now=NOW)["total_requests"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
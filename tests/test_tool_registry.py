@@ -0,0 +1,147 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from types import SimpleNamespace
+
+import pytest
+from pydantic import ValidationError
+from src.backend.ai.fake_gemini import FakeGeminiBackend
+from src.backend.ai.gemini_backend import shared_model, use_fake_backend, use_live_backend
+from src.backend.ai.agent import CodeMentorAgent
+from src.backend.ai.optimized_agent import OptimizedCodeMentorAgent
+from src.backend.ai.production_agent import check_authorization
+from src.backend.functions.registry import (
+    TOOLS, Permission, dispatch, function_declarations, gemini_tool, get_tool, parameters_schema
+)
+from src.backend.models.function_models import CodeSubmissionRequest, ProgressTrackingRequest
+
+
+@pytest.fixture
+def fake_backend():
+    backend = use_fake_backend(FakeGeminiBackend())
+    yield backend
+    use_live_backend()
+
+
+# ===== DECLARATIONS =====
+
+def test_parameters_are_generated_from_request_models():
+    """Test that the declaration schema follows the pydantic model, without pydantic-only keys"""
+    schema = parameters_schema(CodeSubmissionRequest)
+    
+    assert schema["type"] == "object"
+    assert schema["required"] == ["problem_id", "user_code"]
+    assert schema["properties"]["language"]["enum"] == ["python", "javascript"]
+    assert "title" not in schema and "description" not in schema
+    assert all("default" not in prop and "title" not in prop for prop in schema["properties"].values())
+
+
+def test_compact_schema_drops_field_descriptions():
+    full = parameters_schema(ProgressTrackingRequest)
+    compact = parameters_schema(ProgressTrackingRequest, compact=True)
+    
+    assert full["properties"]["problem_id"]["description"] == "Problem that was attempted"
+    assert compact["properties"]["detected_patterns"] == {"type": "array", "items": {"type": "string"}}
+    assert compact["required"] == full["required"]
+
+
+def test_declarations_are_built_once():
+    """Test that every registered tool is declared and the Tool object is shared"""
+    names = [declaration.name for declaration in function_declarations()]
+    
+    assert names == list(TOOLS)
+    assert gemini_tool() is gemini_tool()
+    assert gemini_tool(compact=True) is not gemini_tool()
+
+
+# ===== DISPATCH =====
+
+def test_dispatch_validates_and_coerces_arguments():
+    """Test that Gemini-style arguments (floats for ints, defaults omitted) reach the tool validated"""
+    result = dispatch("track_user_progress", {
+        "user_id": "user_001", "problem_id": "two-sum", "detected_patterns": ["off_by_one"],
+        "time_taken_minutes": 12, "attempts_count": 2.0, "solved_correctly": True
+    })
+    assert result.user_id == "user_001"
+    
+    request = get_tool("analyze_code_submission").validate({"problem_id": " two-sum ", "user_code": "x = 1"})
+    assert request.problem_id == "two-sum"
+    assert request.language == "python"
+    
+    for language, expected in [("Python", "python"), (" JavaScript ", "javascript")]:
+        request = get_tool("analyze_code_submission").validate(
+            {"problem_id": "two-sum", "user_code": "x = 1", "language": language}
+        )
+        assert request.language == expected
+    with pytest.raises(ValidationError):
+        dispatch("analyze_code_submission", {"problem_id": "two-sum", "user_code": "x", "language": "Rust"})
+
+
+def test_dispatch_rejects_unknown_tools_and_invalid_arguments():
+    with pytest.raises(ValueError, match="Unknown function"):
+        dispatch("delete_everything", {})
+    with pytest.raises(ValidationError):
+        dispatch("analyze_code_submission", {"problem_id": "   ", "user_code": "x"})
+    with pytest.raises(ValidationError):
+        dispatch("get_recommended_problem", {"difficulty_level": "impossible"})
+
+
+def test_registry_metadata_drives_authorization():
+    assert get_tool("get_recommended_problem").permission == Permission.READ
+    assert check_authorization("guest", "get_recommended_problem")
+    assert not check_authorization("guest", "track_user_progress")
+    assert not check_authorization("user_001", "unregistered_tool")
+
+
+def test_agent_reports_invalid_arguments_to_the_model():
+    agent = object.__new__(CodeMentorAgent)
+    call = SimpleNamespace(name="analyze_code_submission", args={"problem_id": "two-sum"})
+    
+    assert "user_code" in agent._execute_function_call(call)["error"]
+    assert agent._execute_function_call(SimpleNamespace(name="nope", args={})) == {"error": "Unknown function: nope"}
+
+
+def test_optimized_agent_caches_only_cacheable_tools(fake_backend):
+    agent = OptimizedCodeMentorAgent()
+    recommend = SimpleNamespace(name="get_recommended_problem", args={"user_id": "user_001"})
+    progress = SimpleNamespace(name="track_user_progress", args={
+        "user_id": "user_001", "problem_id": "two-sum", "detected_patterns": [],
+        "time_taken_minutes": 5, "attempts_count": 1, "solved_correctly": True
+    })
+    
+    agent._execute_function_call(recommend)
+    agent._execute_function_call(SimpleNamespace(name=recommend.name, args={"user_id": "user_001", "difficulty_level": "easy"}))
+    agent._execute_function_call(progress)
+    agent._execute_function_call(progress)
+    
+    # The second recommendation is the first with its default spelled out: one key
+    assert len(agent.cache.cache) == 1
+    assert not get_tool("track_user_progress").cacheable
+
+
+# ===== MODEL POOL =====
+
+def test_agents_share_pooled_models(fake_backend):
+    """Test that agent construction reuses the process-wide models"""
+    first, second = OptimizedCodeMentorAgent(), OptimizedCodeMentorAgent()
+    
+    assert first.models["models/gemini-1.5-flash"] is second.models["models/gemini-1.5-flash"]
+    assert CodeMentorAgent().model is CodeMentorAgent().model
+    assert CodeMentorAgent().model is not first.models["models/gemini-2.0-flash-exp"]
+
+
+def test_pool_is_keyed_by_configuration_and_backend(fake_backend):
+    model = shared_model("m", system_instruction="a")
+    
+    assert shared_model("m", system_instruction="a") is model
+    assert shared_model("m", system_instruction="b") is not model
+    
+    use_fake_backend(FakeGeminiBackend())
+    assert shared_model("m", system_instruction="a") is not model
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
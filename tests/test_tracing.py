@@ -0,0 +1,118 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import time
+
+import pytest
+from src.backend.ai.fake_gemini import FakeGeminiBackend
+from src.backend.ai.gemini_backend import use_fake_backend, use_live_backend
+from src.backend.functions.tools import analyze_code_submission
+from src.deadline import run_with_timeout
+from src.tracing import StageStats, Trace, span, trace_scope, write_chrome_trace, write_folded
+
+
+@pytest.fixture
+def fake_backend():
+    backend = use_fake_backend(FakeGeminiBackend(latency_ms=2))
+    yield backend
+    use_live_backend()
+
+
+# ===== SPANS =====
+
+def test_span_is_noop_without_trace():
+    with span("anything") as s:
+        assert s is None
+
+
+def test_spans_nest_and_record_errors():
+    """Test that spans record their parent path and the exception type"""
+    trace = Trace()
+    with trace_scope(trace):
+        with span("outer"):
+            with span("inner", key="v"):
+                time.sleep(0.002)
+        with pytest.raises(ValueError):
+            with span("failing"):
+                raise ValueError("boom")
+    
+    by_name = {s.name: s for s in trace.spans}
+    assert by_name["inner"].path == ("request", "outer", "inner")
+    assert by_name["inner"].attrs == {"key": "v"}
+    assert by_name["failing"].attrs["error"] == "ValueError"
+    assert by_name["outer"].duration_ms >= by_name["inner"].duration_ms >= 2
+    assert by_name["request"].duration_ms >= by_name["outer"].duration_ms
+
+
+def test_spans_follow_work_onto_timeout_threads():
+    """Test that run_with_timeout's worker thread reports into the caller's trace"""
+    def work():
+        with span("worker"):
+            return 1
+    
+    trace = Trace()
+    with trace_scope(trace):
+        run_with_timeout(work, 5)
+    
+    assert [s.path for s in trace.spans if s.name == "worker"] == [("request", "worker")]
+
+
+def test_tool_internals_are_traced():
+    trace = Trace()
+    with trace_scope(trace):
+        analyze_code_submission("two-sum", "def two_sum(nums, target):\n    return []")
+    
+    names = [s.name for s in trace.spans]
+    assert "tool.analyze_code_submission" in names
+    assert {"analyze.run_tests", "analyze.detect_patterns"} <= set(names)
+
+
+# ===== AGGREGATION AND EXPORT =====
+
+def test_agent_stages_are_aggregated(fake_backend):
+    """Test that an optimized-agent request breaks down into LLM, cache and tool stages"""
+    from src.backend.ai.optimized_agent import OptimizedCodeMentorAgent
+    
+    agent = OptimizedCodeMentorAgent()
+    stages = StageStats()
+    for _ in range(2):
+        trace = Trace()
+        with trace_scope(trace):
+            agent.send_message("What problem should I practice next?")
+        stages.add(trace)
+    
+    summary = stages.summary()
+    assert summary["llm.initial"]["calls"] == 2
+    assert summary["llm.function_response"]["calls"] == 2
+    assert summary["cache.get"]["calls"] == 2
+    assert summary["tool.get_recommended_problem"]["calls"] == 1  # second request hits the cache
+    assert summary["llm.initial"]["mean_ms"] >= 2
+    top_level = sum(v["share_percent"] for k, v in summary.items()
+                    if k in ("llm.initial", "llm.function_response", "cache.get", "cache.set",
+                             "serialize", "tool.get_recommended_problem", StageStats.UNATTRIBUTED))
+    assert top_level == pytest.approx(100, abs=1)
+
+
+def test_exports(tmp_path):
+    """Test the Chrome trace-event and folded-stack outputs"""
+    trace = Trace()
+    with trace_scope(trace):
+        with span("llm.initial"):
+            time.sleep(0.002)
+    
+    write_chrome_trace([trace], str(tmp_path / "t.json"))
+    write_folded([trace], str(tmp_path / "t.folded"))
+    
+    events = json.load(open(tmp_path / "t.json"))["traceEvents"]
+    assert [e["name"] for e in events] == ["request", "llm.initial"]
+    assert all(e["ph"] == "X" and e["dur"] > 0 for e in events)
+    folded = dict(line.rsplit(" ", 1) for line in open(tmp_path / "t.folded").read().splitlines())
+    assert int(folded["request;llm.initial"]) >= 2000
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])